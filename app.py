@@ -4,15 +4,20 @@ Virshi AI Visibility Platform
 """
 
 import streamlit as st
-from config import CUSTOM_CSS
+from config import CUSTOM_CSS, DEV_MODE, QUERY_BUDGETS
 from auth import initialize_session_state, check_session, render_login_page, logout
-from database import db, get_user_projects
+from database import db, get_user_projects, DatabaseUnavailable
 from pages.dashboard import render_dashboard
 from pages.keywords import render_keywords_page
 from pages.sources import render_sources_page
 from pages.competitors import render_competitors_page
 from pages.reports import render_reports_page
 from pages.onboarding import render_onboarding
+from pages.admin import render_admin_page
+from pages.portfolio import render_portfolio_page
+from querytrack import install as install_query_tracker, begin_run, end_run
+from n8n.callback import start_callback_server
+from sessions import touch as touch_session, compact_projects
 
 # Config
 st.set_page_config(
@@ -22,12 +27,28 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Database: the data layer connects lazily and raises instead of stopping the script
+try:
+    db.connect()
+except DatabaseUnavailable as e:
+    st.error(f"Database connection failed: {e}")
+    st.stop()
+
+# Dev mode: count every query issued during this rerun
+if DEV_MODE:
+    install_query_tracker(db)
+    begin_run()
+
+# Analysis-complete callbacks from n8n (one receiver per process)
+start_callback_server()
+
 # Apply CSS
 st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 # Initialize
 initialize_session_state()
 check_session()
+touch_session()
 
 # Main Logic
 if not st.session_state.get("user"):
@@ -47,26 +68,26 @@ else:
         st.markdown("---")
 
         # Project selector
-        projects = get_user_projects(user.id)
+        projects = compact_projects(get_user_projects(user.id))
         st.session_state["projects"] = projects
 
+        # Project chosen on another page (e.g. portfolio)
+        pending_id = st.session_state.pop("pending_project_id", None)
+        pending = next((p for p in projects if p['id'] == pending_id), None)
+        if pending:
+            st.session_state["current_project"] = pending
+            st.session_state["project_selector"] = pending['brand_name']
+
         if projects:
             project_names = [p['brand_name'] for p in projects]
             current_p = st.session_state.get("current_project")
 
-            default_index = 0
-            if current_p:
-                try:
-                    default_index = project_names.index(current_p['brand_name'])
-                except:
-                    default_index = 0
+            # The widget's value lives in session state only (no index=), so a pending project
+            # set above and this default never conflict
+            if st.session_state.get("project_selector") not in project_names:
+                st.session_state["project_selector"] = current_p['brand_name'] if current_p and current_p['brand_name'] in project_names else project_names[0]
 
-            selected_project_name = st.selectbox(
-                "Оберіть проект:",
-                project_names,
-                index=default_index,
-                key="project_selector"
-            )
+            selected_project_name = st.selectbox("Оберіть проект:", project_names, key="project_selector")
 
             # Update current project if changed
             new_project = next((p for p in projects if p['brand_name'] == selected_project_name), None)
@@ -97,6 +118,16 @@ else:
             st.session_state["current_page"] = "Звіти"
             st.rerun()
 
+        if len(projects) > 1:
+            if st.button("🗂 Портфель", use_container_width=True):
+                st.session_state["current_page"] = "Портфель"
+                st.rerun()
+
+        if user_role == "admin":
+            if st.button("🛠 Адмін", use_container_width=True):
+                st.session_state["current_page"] = "Адмін"
+                st.rerun()
+
         st.markdown("---")
         st.caption("Потрібна допомога?")
         st.markdown("📧 [hi@virshi.ai](mailto:hi@virshi.ai)")
@@ -122,5 +153,23 @@ else:
             render_competitors_page()
         elif current_page == "Звіти":
             render_reports_page()
+        elif current_page == "Портфель":
+            render_portfolio_page()
+        elif current_page == "Адмін":
+            render_admin_page()
         else:
             render_dashboard()
+
+# Dev mode: report query budget violations for this rerun
+if DEV_MODE:
+    run = end_run()
+    if not st.session_state.get("user"):
+        page_label = "Вхід"
+    elif not st.session_state.get("current_project"):
+        page_label = "Онбординг"
+    else:
+        page_label = st.session_state.get("current_page", "Дашборд")
+    if run:
+        run.label = page_label
+        for problem in run.violations(QUERY_BUDGETS.get(page_label)):
+            st.warning(f"🐢 {problem}")
@@ -7,6 +7,8 @@ import extra_streamlit_components as stx
 from datetime import datetime, timedelta
 from typing import Tuple, Dict, Any
 from database import db, get_user_profile, create_user_profile, get_user_projects, clear_all_caches
+from telemetry import instrument
+from sessions import session_user, compact_projects
 import time
 
 cookie_manager = stx.CookieManager()
@@ -30,8 +32,8 @@ def get_user_role_and_details(user_id: str) -> Tuple[str, Dict[str, Any]]:
 def load_user_project(user_id: str) -> bool:
     projects = get_user_projects(user_id)
     if projects:
-        st.session_state["projects"] = projects
-        st.session_state["current_project"] = projects[0]
+        st.session_state["projects"] = compact_projects(projects)
+        st.session_state["current_project"] = st.session_state["projects"][0]
         return True
     return False
 
@@ -45,7 +47,7 @@ def check_session():
     try:
         res = db.client.auth.get_user(token)
         if getattr(res, "user", None):
-            st.session_state["user"] = res.user
+            st.session_state["user"] = session_user(res.user)
             role, details = get_user_role_and_details(res.user.id)
             st.session_state["role"] = role
             st.session_state["user_details"] = details
@@ -61,7 +63,7 @@ def login_user(email: str, password: str) -> bool:
         if not res.user:
             st.error("❌ Невірний email або пароль")
             return False
-        st.session_state["user"] = res.user
+        st.session_state["user"] = session_user(res.user)
         cookie_manager.set("virshi_auth_token", res.session.access_token, expires_at=datetime.now() + timedelta(days=7))
         role, details = get_user_role_and_details(res.user.id)
         st.session_state["role"] = role
@@ -81,7 +83,7 @@ def register_user(email: str, password: str, first_name: str, last_name: str) ->
             return False
         create_user_profile(user_id=res.user.id, email=email, first_name=first_name, last_name=last_name, role="user")
         if res.session:
-            st.session_state["user"] = res.user
+            st.session_state["user"] = session_user(res.user)
             cookie_manager.set("virshi_auth_token", res.session.access_token, expires_at=datetime.now() + timedelta(days=7))
             role, details = get_user_role_and_details(res.user.id)
             st.session_state["role"] = role
@@ -114,6 +116,7 @@ def logout():
     time.sleep(0.5)
     st.rerun()
 
+@instrument("page")
 def render_login_page():
     col_left, col_center, col_right = st.columns([1, 1.5, 1])
     with col_center:
@@ -0,0 +1,294 @@
+"""
+Local stand-ins for the load test: an in-memory Supabase client and a stub n8n server
+"""
+
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Callable
+
+class Response:
+    def __init__(self, data, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+def _compare(op: Callable[[Any, Any], bool]) -> Callable[[Any, Any], bool]:
+    def check(value, other):
+        if value is None:
+            return False
+        if isinstance(other, str) or isinstance(value, str):
+            return op(str(value), str(other))
+        return op(value, other)
+    return check
+
+_OPS = {
+    "eq": lambda v, o: v == o,
+    "neq": lambda v, o: v != o,
+    "gt": _compare(lambda v, o: v > o),
+    "gte": _compare(lambda v, o: v >= o),
+    "lt": _compare(lambda v, o: v < o),
+    "lte": _compare(lambda v, o: v <= o),
+    "in_": lambda v, o: v in o
+}
+
+class FakeQuery:
+    """The postgrest builder subset the app uses: filters, order, range/limit, writes and one-level joins."""
+
+    def __init__(self, backend: "FakeSupabase", table: str):
+        self.backend = backend
+        self.table = table
+        self.filters: List[tuple] = []
+        self.orders: List[tuple] = []
+        self.window: Optional[tuple] = None
+        self.max_rows: Optional[int] = None
+        self.action = "select"
+        self.payload: Any = None
+        self.columns = "*"
+        self.count: Optional[str] = None
+        self.conflict_keys: List[str] = []
+
+    def select(self, columns: str = "*", count: Optional[str] = None) -> "FakeQuery":
+        self.columns, self.count = columns, count
+        return self
+
+    def __getattr__(self, name: str):
+        if name in _OPS:
+            def add_filter(column, value):
+                self.filters.append((column, _OPS[name], list(value) if name == "in_" else value))
+                return self
+            return add_filter
+        raise AttributeError(name)
+
+    def order(self, column: str, desc: bool = False) -> "FakeQuery":
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, n: int) -> "FakeQuery":
+        self.max_rows = n
+        return self
+
+    def range(self, start: int, end: int) -> "FakeQuery":
+        self.window = (start, end)
+        return self
+
+    def insert(self, rows) -> "FakeQuery":
+        self.action, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict: str = "id") -> "FakeQuery":
+        self.action, self.payload, self.conflict_keys = "upsert", rows, [k.strip() for k in on_conflict.split(",")]
+        return self
+
+    def update(self, values: Dict[str, Any]) -> "FakeQuery":
+        self.action, self.payload = "update", values
+        return self
+
+    def delete(self) -> "FakeQuery":
+        self.action = "delete"
+        return self
+
+    def _matches(self, row: Dict[str, Any]) -> bool:
+        return all(op(row.get(column), value) for column, op, value in self.filters)
+
+    def _project(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for part in [p.strip() for p in self.columns.split(",") if p.strip()]:
+            if part == "*":
+                out.update(row)
+            elif "(" in part:
+                # keywords(keyword_text): to-one join through <relation singular>_id
+                relation, cols = part[:-1].split("(", 1)
+                related = self.backend.find(relation, row.get(f"{relation.rstrip('s')}_id"))
+                out[relation] = {c.strip(): related.get(c.strip()) for c in cols.split(",")} if related else None
+            else:
+                out[part] = row.get(part)
+        return out
+
+    def execute(self) -> Response:
+        self.backend.calls += 1
+        if self.backend.latency:
+            time.sleep(self.backend.latency)
+        with self.backend.lock:
+            rows = self.backend.tables.setdefault(self.table, [])
+            if self.action in ("insert", "upsert"):
+                return Response(self.backend.write(self.table, self.payload, self.conflict_keys if self.action == "upsert" else None))
+            selected = [row for row in rows if self._matches(row)]
+            if self.action == "update":
+                for row in selected:
+                    row.update(self.payload)
+                return Response([dict(row) for row in selected])
+            if self.action == "delete":
+                self.backend.tables[self.table] = [row for row in rows if not self._matches(row)]
+                return Response([dict(row) for row in selected])
+
+            for column, desc in reversed(self.orders):
+                selected.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+            total = len(selected)
+            if self.window:
+                selected = selected[self.window[0]:self.window[1] + 1]
+            if self.max_rows is not None:
+                selected = selected[:self.max_rows]
+            return Response([self._project(row) for row in selected], total if self.count else None)
+
+class FakeRpc:
+    def __init__(self, fn: Callable[[], Any]):
+        self.fn = fn
+
+    def execute(self) -> Response:
+        return Response(self.fn())
+
+class FakeUser:
+    def __init__(self, id: str, email: str):
+        self.id = id
+        self.email = email
+
+class FakeAuthResponse:
+    def __init__(self, user: Optional[FakeUser], token: Optional[str] = None):
+        self.user = user
+        self.session = type("Session", (), {"access_token": token})() if token else None
+
+class FakeAuth:
+    def __init__(self, backend: "FakeSupabase"):
+        self.backend = backend
+        self.tokens: Dict[str, FakeUser] = {}
+
+    def sign_in_with_password(self, credentials: Dict[str, str]) -> FakeAuthResponse:
+        profile = next((p for p in self.backend.tables.get("profiles", []) if p["email"] == credentials["email"]), None)
+        if not profile or credentials.get("password") != self.backend.password:
+            raise ValueError("Invalid login credentials")
+        token = uuid.uuid4().hex
+        self.tokens[token] = FakeUser(profile["id"], profile["email"])
+        return FakeAuthResponse(self.tokens[token], token)
+
+    def get_user(self, token: str) -> FakeAuthResponse:
+        return FakeAuthResponse(self.tokens.get(token))
+
+    def sign_up(self, credentials: Dict[str, Any]) -> FakeAuthResponse:
+        user = FakeUser(str(uuid.uuid4()), credentials["email"])
+        return FakeAuthResponse(user)
+
+    def sign_out(self) -> None:
+        pass
+
+class FakeSupabase:
+    """Thread-safe in-memory tables behind the supabase client API; latency emulates the network round trip."""
+
+    def __init__(self, latency_ms: float = 0.0, password: str = "loadtest"):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.lock = threading.RLock()
+        self.latency = latency_ms / 1000
+        self.password = password
+        self.calls = 0
+        self.auth = FakeAuth(self)
+        self._ids = itertools.count(1)
+        self.rpcs: Dict[str, Callable[[Dict[str, Any]], Any]] = {"portfolio_metrics": self._portfolio_metrics}
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> FakeRpc:
+        return FakeRpc(lambda: self.rpcs[name](params))
+
+    def find(self, table: str, row_id: Any) -> Optional[Dict[str, Any]]:
+        return next((row for row in self.tables.get(table, []) if row.get("id") == row_id), None)
+
+    def write(self, table: str, payload, conflict_keys: Optional[List[str]]) -> List[Dict[str, Any]]:
+        rows = self.tables.setdefault(table, [])
+        written = []
+        for new in payload if isinstance(payload, list) else [payload]:
+            new = dict(new)
+            existing = next((r for r in rows if all(r.get(k) == new.get(k) for k in conflict_keys)), None) if conflict_keys else None
+            if existing is not None:
+                existing.update(new)
+                written.append(dict(existing))
+                continue
+            new.setdefault("id", next(self._ids))
+            new.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+            rows.append(new)
+            written.append(dict(new))
+        return written
+
+    def _portfolio_metrics(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        from metrics import aggregate
+        ids = set(params["project_ids"])
+        out = []
+        for project in self.tables.get("projects", []):
+            if project["id"] in ids:
+                scans = [r for r in self.tables.get("scan_results", []) if r["project_id"] == project["id"]]
+                out.append({"project_id": project["id"], **aggregate(scans, project["brand_name"])})
+        return out
+
+    def seed(self, users: int, projects_per_user: int = 2, keywords_per_project: int = 30, scans_per_keyword: int = 3, days: int = 60, seed: int = 7) -> List[str]:
+        """Users with projects, keywords and scan history; returns the login emails."""
+        from config import MODEL_MAPPING
+        rng = random.Random(seed)
+        providers = list(MODEL_MAPPING.values())
+        sentiments = ["positive", "neutral", "negative"]
+        competitors = ["Monobank", "PrivatBank", "Raiffeisen", "PUMB", "Sense Bank", "A-Bank"]
+        now = datetime.now(timezone.utc)
+        emails = []
+        with self.lock:
+            for u in range(users):
+                user_id, email = str(uuid.uuid4()), f"user{u}@loadtest.local"
+                emails.append(email)
+                self.write("profiles", {"id": user_id, "email": email, "first_name": f"User{u}", "last_name": "Load", "role": "user"}, None)
+                for p in range(projects_per_user):
+                    brand = f"Brand{u}-{p}"
+                    project = self.write("projects", {"id": str(uuid.uuid4()), "user_id": user_id, "brand_name": brand, "domain": f"brand{u}{p}.ua",
+                                                      "region": "Ukraine", "status": rng.choice(["active", "trial"])}, None)[0]
+                    self.write("official_assets", {"project_id": project["id"], "domain_or_url": project["domain"], "type": "website"}, None)
+                    keywords = self.write("keywords", [{"project_id": project["id"], "keyword_text": f"{brand} запит {k} {rng.choice(['кредит', 'депозит', 'картка', 'іпотека'])}",
+                                                        "is_active": True} for k in range(keywords_per_project)], None)
+                    scans = []
+                    for keyword in keywords:
+                        for _ in range(scans_per_keyword):
+                            mentioned = rng.sample(competitors, 3) + ([brand] if rng.random() < 0.4 else [])
+                            scans.append({
+                                "project_id": project["id"], "keyword_id": keyword["id"], "provider": rng.choice(providers),
+                                "created_at": (now - timedelta(days=rng.uniform(0, days))).isoformat(),
+                                "mentioned_brands": ", ".join(mentioned), "links_to_official_site": rng.random() < 0.3,
+                                "sentiment": rng.choice(sentiments), "brand_position": rng.randint(1, 5) if brand in mentioned else None,
+                                "citations": [f"https://{rng.choice([project['domain'], 'minfin.com.ua', 'bank.gov.ua', 'wikipedia.org'])}/{rng.randint(1, 99)}"
+                                              for _ in range(rng.randint(0, 4))]
+                            })
+                    scans.sort(key=lambda s: s["created_at"])
+                    self.write("scan_results", scans, None)
+        return emails
+
+# STUB N8N
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        self.server.requests += 1
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        if "generate" in self.path:
+            body = {"prompts": [f"{payload.get('brand', 'brand')} запит {i}" for i in range(10)]}
+        elif "recommend" in self.path:
+            body = {"html": "<p>ok</p>"}
+        else:
+            body = {"status": "queued"}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_n8n(delay_ms: float = 0.0) -> ThreadingHTTPServer:
+    """Accepts every webhook on 127.0.0.1 (ephemeral port); server.url is the base URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.requests = 0
+    server.delay = delay_ms / 1000
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, name="stub-n8n", daemon=True).start()
+    return server
@@ -0,0 +1,269 @@
+"""
+Concurrent-session load test: N simulated users drive app.py in one process (Streamlit AppTest),
+against the in-memory Supabase stand-in and a stub n8n server. Nothing leaves 127.0.0.1.
+
+    python bench/loadtest.py --levels 1 5 10 25 --iterations 3 [--db-latency-ms 20] [--output loadtest.json]
+
+Each session logs in, then loops: switch project, dashboard, keywords (optionally starts a scan),
+competitors. Every rerun is timed; per level the report has rerun latency p50/p95/p99, reruns/s
+and process RSS.
+
+AppTest is built for one session at a time; three of its limitations are patched for the run:
+- it installs a fresh mock Runtime singleton per run and clears it afterwards, which breaks runs on
+  other threads: one shared runtime is pinned for the process (caches and media are shared across
+  sessions, as in a real server);
+- it compiles app.py on every run, and concurrent compile() is not thread-safe on older CPythons:
+  runs share one script cache, which compiles once under its lock, as the server's runtime does;
+- it cannot map a radio/selectbox value back to its format_func label: such widgets keep their
+  default index (the harness never changes them).
+
+Sidebar navigation sets current_page directly instead of clicking: AppTest keeps a button's trigger
+set across st.rerun(), so a nav button that reruns would loop forever. The measured rerun is the
+one the button's st.rerun() would start.
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+from fake_backend import FakeSupabase, start_stub_n8n
+
+APP = os.path.join(ROOT, "app.py")
+
+class _NoSleep:
+    """auth.time replacement: the login form's fixed UI pauses would otherwise dominate every login rerun."""
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+    @staticmethod
+    def sleep(seconds):
+        pass
+
+def _patch_apptest() -> None:
+    """Process-wide and not undoable: for this script only, never from a pytest run."""
+    if "pytest" in sys.modules:
+        raise RuntimeError("bench/loadtest.py patches Streamlit for the whole process; run it as a script")
+    from unittest.mock import MagicMock
+    from streamlit.runtime import Runtime
+    from streamlit.testing.v1.element_tree import Radio, Selectbox
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import local_script_runner
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+    script_cache = ScriptCache()
+    local_script_runner.ScriptCache = lambda: script_cache
+
+    for widget in (Radio, Selectbox):
+        lookup = widget.index.fget
+
+        def index(self, lookup=lookup):
+            try:
+                return lookup(self)
+            except ValueError:
+                return self.proto.default
+        widget.index = property(index)
+
+def setup(args) -> Dict[str, Any]:
+    import streamlit.config
+    import streamlit.logger
+    import database
+    import n8n.webhooks
+
+    _patch_apptest()
+    # Widget and context warnings repeat on every rerun; app exceptions are counted in the report.
+    # Parse the config first, or its on-parse hook resets the level during the first run.
+    streamlit.config.get_option("logger.level")
+    streamlit.logger.set_log_level("error")
+    backend = FakeSupabase(latency_ms=args.db_latency_ms)
+    emails = backend.seed(args.users, projects_per_user=args.projects, keywords_per_project=args.keywords, scans_per_keyword=args.scans)
+    database.db.client = backend
+    stub = start_stub_n8n(delay_ms=args.n8n_delay_ms)
+    n8n.webhooks.N8N_GEN_URL = f"{stub.url}/webhook/generate-prompts"
+    n8n.webhooks.N8N_ANALYZE_URL = f"{stub.url}/webhook/run-analysis"
+    n8n.webhooks.N8N_RECO_URL = f"{stub.url}/webhook/recommendations"
+    if not args.keep_sleeps:
+        import auth
+        auth.time = _NoSleep()
+    return {"backend": backend, "stub": stub, "emails": emails}
+
+class Session:
+    """One simulated user; every AppTest.run() is one timed rerun."""
+
+    def __init__(self, email: str, password: str, timeout: float):
+        self.email = email
+        self.password = password
+        self.timeout = timeout
+        self.at = AppTest.from_file(APP, default_timeout=timeout)
+        self.latencies: List[float] = []
+        self.errors: List[str] = []
+
+    def _run(self, step: str, action=None) -> None:
+        started = time.perf_counter()
+        try:
+            if action is None:
+                self.at.run()
+            else:
+                action().run()
+        except Exception as e:
+            self.errors.append(f"{step}: {type(e).__name__}: {e}")
+            return
+        self.latencies.append(time.perf_counter() - started)
+        for exc in self.at.exception:
+            self.errors.append(f"{step}: {exc.message}")
+
+    def _button(self, label: str):
+        return next((b for b in self.at.button if b.label == label), None)
+
+    def _navigate(self, page: str) -> None:
+        self.at.session_state["current_page"] = page
+        self._run(page)
+
+    def login(self) -> bool:
+        self._run("open")
+        try:
+            self.at.text_input(key="login_email").input(self.email)
+            self.at.text_input(key="login_password").input(self.password)
+        except KeyError:
+            self.errors.append("login: form not rendered")
+            return False
+        submit = self._button("Увійти")
+        if submit is None:
+            self.errors.append("login: submit not rendered")
+            return False
+        self._run("login", submit.click)
+        return self.at.session_state["user"] is not None
+
+    def iterate(self, n: int, scan: bool) -> None:
+        try:
+            selector = self.at.selectbox(key="project_selector")
+            options = list(selector.options)
+        except KeyError:
+            options = []
+        if len(options) > 1:
+            self._run("switch project", lambda: selector.select(options[(n + 1) % len(options)]))
+        self._navigate("Дашборд")
+        self._navigate("Запити")
+        if scan:
+            try:
+                self._run("select keyword", self.at.checkbox(key=f"kw_sel_{n}").check)
+            except KeyError:
+                self.errors.append("scan: keyword list not rendered")
+            start = self._button("▶️ Запустити аналіз")
+            # Disabled when the planner finds every selected pair fresh: nothing to send
+            if start is not None and not start.disabled:
+                self._run("start analysis", start.click)
+        self._navigate("Конкуренти")
+
+def run_session(session: Session, iterations: int, scan: bool) -> None:
+    if session.login():
+        for n in range(iterations):
+            session.iterate(n, scan)
+
+def run_level(concurrency: int, env: Dict[str, Any], args) -> Dict[str, Any]:
+    from sessions import process_rss
+
+    gc.collect()
+    rss_before = process_rss()
+    sessions = [Session(env["emails"][i % len(env["emails"])], env["backend"].password, args.timeout) for i in range(concurrency)]
+    peak = [rss_before]
+    done = threading.Event()
+
+    def sample_rss():
+        while not done.wait(0.1):
+            peak[0] = max(peak[0], process_rss())
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    calls_before, n8n_before = env["backend"].calls, env["stub"].requests
+    threads = [threading.Thread(target=run_session, args=(s, args.iterations, args.scan), name=f"session-{i}") for i, s in enumerate(sessions)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    done.set()
+    sampler.join()
+    rss_after = process_rss()
+
+    latencies = np.array([x for s in sessions for x in s.latencies]) * 1000
+    errors = [e for s in sessions for e in s.errors]
+    pct = np.percentile(latencies, [50, 95, 99]) if latencies.size else [0.0, 0.0, 0.0]
+    return {
+        "concurrency": concurrency,
+        "reruns": int(latencies.size),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(latencies.size / wall, 2) if wall else 0.0,
+        "p50_ms": round(float(pct[0]), 1),
+        "p95_ms": round(float(pct[1]), 1),
+        "p99_ms": round(float(pct[2]), 1),
+        "max_ms": round(float(latencies.max()), 1) if latencies.size else 0.0,
+        "rss_mb": round(rss_after / 2 ** 20, 1),
+        "peak_rss_mb": round(max(peak[0], rss_after) / 2 ** 20, 1),
+        "rss_delta_mb": round((rss_after - rss_before) / 2 ** 20, 1),
+        "db_queries": env["backend"].calls - calls_before,
+        "n8n_requests": env["stub"].requests - n8n_before,
+        "errors": len(errors),
+        "error_samples": errors[:5]
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for app.py")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 5, 10, 25], help="concurrent sessions per level")
+    parser.add_argument("--iterations", type=int, default=3, help="navigation loops per session after login")
+    parser.add_argument("--users", type=int, default=10, help="distinct seeded users (sessions reuse them round-robin)")
+    parser.add_argument("--projects", type=int, default=2, help="projects per user")
+    parser.add_argument("--keywords", type=int, default=30, help="keywords per project")
+    parser.add_argument("--scans", type=int, default=3, help="scan results per keyword")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="added to every database query")
+    parser.add_argument("--n8n-delay-ms", type=float, default=0.0, help="stub n8n response delay")
+    parser.add_argument("--scan", action="store_true", help="start an analysis on the keywords page each loop")
+    parser.add_argument("--warmup", type=int, choices=[0, 1], default=1, help="run one unmeasured session first")
+    parser.add_argument("--keep-sleeps", action="store_true", help="keep the login form's fixed pauses")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds per rerun before it counts as an error")
+    parser.add_argument("--output", help="JSON report file")
+    args = parser.parse_args(argv)
+
+    # Before any app import: config reads these at import time
+    os.environ.setdefault("VIRSHI_SNAPSHOT_DIR", tempfile.mkdtemp(prefix="virshi-loadtest-"))
+    env = setup(args)
+    if args.warmup:
+        # Unmeasured: first-use imports (plotly's lazy modules) race when several threads trigger them at once
+        run_session(Session(env["emails"][0], env["backend"].password, args.timeout), 1, args.scan)
+    print(f"{'sessions':>8} {'reruns':>7} {'rerun/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'RSS MB':>8} {'peak MB':>8} {'errors':>7}", flush=True)
+    results = []
+    for level in args.levels:
+        r = run_level(level, env, args)
+        results.append(r)
+        print(f"{r['concurrency']:>8} {r['reruns']:>7} {r['throughput_rps']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} "
+              f"{r['rss_mb']:>8} {r['peak_rss_mb']:>8} {r['errors']:>7}", flush=True)
+        for sample in r["error_samples"]:
+            print(f"         ! {sample}", flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "levels": results}, f, ensure_ascii=False, indent=2)
+    return 0 if all(r["errors"] == 0 for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
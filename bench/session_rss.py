@@ -0,0 +1,88 @@
+"""
+RSS per session: builds N logged-in session states in one process, legacy dict rows vs compact records.
+
+    python bench/session_rss.py --sessions 500 --projects 5 --prompts 30
+"""
+
+import argparse
+import gc
+import os
+import subprocess
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sessions import compact_projects, SessionUser, deep_sizeof, process_rss
+
+def fake_user_payload(email: str) -> dict:
+    # Shape of an auth user object as returned by sign-in (metadata, identities, timestamps)
+    now = datetime.now(timezone.utc).isoformat()
+    user_id = str(uuid.uuid4())
+    return {
+        "id": user_id, "email": email, "aud": "authenticated", "role": "authenticated",
+        "app_metadata": {"provider": "email", "providers": ["email"]},
+        "user_metadata": {"first_name": "Test", "last_name": "User"},
+        "identities": [{"id": user_id, "user_id": user_id, "provider": "email", "identity_data": {"email": email, "sub": user_id}, "created_at": now, "updated_at": now}],
+        "created_at": now, "updated_at": now, "last_sign_in_at": now, "confirmed_at": now, "email_confirmed_at": now
+    }
+
+def fake_project_rows(user_id: str, count: int) -> list:
+    now = datetime.now(timezone.utc).isoformat()
+    return [{
+        "id": str(uuid.uuid4()), "user_id": user_id, "brand_name": f"Brand {i}", "domain": f"brand{i}.ua",
+        "region": "Ukraine", "status": "active" if i % 2 else "trial", "created_at": now, "updated_at": now
+    } for i in range(count)]
+
+def build_session(n: int, compact: bool, projects: int, prompts: int) -> dict:
+    user = fake_user_payload(f"user{n}@example.com")
+    rows = fake_project_rows(user["id"], projects)
+    prompt_list = [f"Найкращий сервіс для запиту номер {i} у сесії {n}" for i in range(prompts)]
+    if compact:
+        project_refs = compact_projects(rows)
+        return {"user": SessionUser(user["id"], user["email"]), "projects": project_refs, "current_project": project_refs[0],
+                "generated_prompts": tuple(prompt_list), "selected_kws": prompt_list[:10]}
+    return {"user": user, "projects": rows, "current_project": rows[0],
+            "generated_prompts": prompt_list, "selected_kws": prompt_list[:10]}
+
+def measure(sessions: int, compact: bool, projects: int, prompts: int) -> dict:
+    gc.collect()
+    rss_before = process_rss()
+    tracemalloc.start()
+    states = [build_session(n, compact, projects, prompts) for n in range(sessions)]
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    rss_after = process_rss()
+    return {
+        "mode": "compact" if compact else "legacy",
+        "sessions": sessions,
+        "rss_per_session": (rss_after - rss_before) / sessions,
+        "traced_per_session": traced / sessions,
+        "deep_sizeof_per_session": sum(deep_sizeof(s) for s in states[:50]) / min(50, sessions)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Session state memory benchmark")
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--projects", type=int, default=5)
+    parser.add_argument("--prompts", type=int, default=30)
+    parser.add_argument("--mode", choices=["legacy", "compact"], help="run one mode in this process")
+    args = parser.parse_args()
+
+    if args.mode:
+        result = measure(args.sessions, args.mode == "compact", args.projects, args.prompts)
+        print(f"{result['mode']:<8} {result['sessions']:>8} {result['rss_per_session'] / 1024:>10.1f}KB "
+              f"{result['traced_per_session'] / 1024:>13.1f}KB {result['deep_sizeof_per_session'] / 1024:>13.1f}KB", flush=True)
+        return
+
+    # Each mode in a fresh interpreter, so freed arenas of one run don't hide the RSS growth of the other
+    print(f"{'mode':<8} {'sessions':>8} {'RSS/session':>12} {'traced/session':>15} {'sizeof/session':>15}", flush=True)
+    for mode in ("legacy", "compact"):
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--mode", mode, "--sessions", str(args.sessions),
+                        "--projects", str(args.projects), "--prompts", str(args.prompts)], check=True)
+
+if __name__ == "__main__":
+    main()
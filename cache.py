@@ -0,0 +1,264 @@
+"""
+Shared cache tier for database reads (one backend for all Streamlit replicas)
+
+Keys are versioned by schema and by a per-(namespace, project) generation counter kept in the
+backend itself: invalidation bumps the counter, so every replica stops reading the old entries.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from config import CACHE_URL, CACHE_TTL_SECONDS, CACHE_KEY_VERSION, CACHE_GENERATION_TTL, CACHE_MEMORY_ITEMS, CACHE_MEMORY_MB
+from telemetry import record_error
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# SERIALIZATION: one codec byte, then the payload (zlib-compressed above 1 KB)
+_COMPRESS_FROM = 1024
+
+def dumps(value: Any) -> bytes:
+    if msgpack is not None:
+        codec, payload = b"m", msgpack.packb(value, use_bin_type=True, default=str)
+    else:
+        codec, payload = b"j", json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str).encode()
+    if len(payload) >= _COMPRESS_FROM:
+        return codec.upper() + zlib.compress(payload, 1)
+    return codec + payload
+
+def loads(data: bytes) -> Any:
+    codec, payload = data[:1], data[1:]
+    if codec.isupper():
+        codec, payload = codec.lower(), zlib.decompress(payload)
+    if codec == b"m":
+        if msgpack is None:
+            raise ValueError("msgpack-encoded cache entry, but msgpack is not installed")
+        return msgpack.unpackb(payload, raw=False)
+    return json.loads(payload)
+
+# BACKENDS: the subset of the Redis command set the cache uses (get/set ex/incr/delete)
+class NullBackend:
+    """No shared tier: values are dropped, only the generation counters are kept (in this process)."""
+
+    def __init__(self):
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._counters.get(key)
+        return str(value).encode() if value is not None else None
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> bool:
+        return False
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = self._counters[key] = self._counters.get(key, 0) + 1
+            return value
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(self._counters.pop(key, None) is not None for key in keys)
+
+class MemoryBackend(NullBackend):
+    """In-process stand-in for Redis: single replica and tests. Values are bounded by count and bytes; counters are never evicted."""
+
+    def __init__(self, max_items: int = CACHE_MEMORY_ITEMS, max_bytes: int = CACHE_MEMORY_MB * 1024 * 1024):
+        super().__init__()
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._data: "OrderedDict[str, Tuple[Optional[float], bytes]]" = OrderedDict()
+
+    def _pop(self, key: str) -> bool:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return False
+        self.bytes -= len(entry[1])
+        return True
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                value = self._counters.get(key)
+                return str(value).encode() if value is not None else None
+            if entry[0] is not None and entry[0] < time.time():
+                self._pop(key)
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> bool:
+        value = bytes(value)
+        if len(value) > self.max_bytes:
+            return False
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (time.time() + ex if ex else None, value)
+            self.bytes += len(value)
+            while len(self._data) > self.max_items or self.bytes > self.max_bytes:
+                self._pop(next(iter(self._data)))
+        return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(self._pop(key) or self._counters.pop(key, None) is not None for key in keys)
+
+class SqliteBackend:
+    """Shared on-host store: replicas on one machine open the same file (WAL, one connection per thread)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._conn().execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return bytes(row[0])
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> bool:
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)", (key, sqlite3.Binary(value), time.time() + ex if ex else None))
+        if ex and zlib.crc32(key.encode()) % 64 == 0:
+            # Occasional sweep instead of a background thread
+            conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+        return True
+
+    def incr(self, key: str) -> int:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            value = int(bytes(row[0])) + 1 if row else 1
+            conn.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, NULL)", (key, str(value).encode()))
+            conn.execute("COMMIT")
+            return value
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, *keys: str) -> int:
+        conn = self._conn()
+        return sum(conn.execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount for key in keys)
+
+def create_backend(url: str = CACHE_URL):
+    """
+    '' -> no shared tier (the per-process scan cache already holds the rows), memory:// -> in-process,
+    redis://... -> Redis, sqlite:///path -> shared SQLite file.
+    """
+    if not url:
+        return NullBackend()
+    if url.startswith("memory://"):
+        return MemoryBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        if redis is None:
+            raise RuntimeError("VIRSHI_CACHE_URL points to Redis, but the redis package is not installed")
+        return redis.Redis.from_url(url)
+    if url.startswith("sqlite:///"):
+        return SqliteBackend(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported cache URL: {url}")
+
+# CACHE
+class SharedCache:
+    def __init__(self, backend, ttl: int = CACHE_TTL_SECONDS, version: int = CACHE_KEY_VERSION, generation_ttl: float = CACHE_GENERATION_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.version = version
+        self.generation_ttl = generation_ttl
+        self._generations: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "errors": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def _generation_key(self, namespace: str, project_id: str) -> str:
+        return f"virshi:v{self.version}:gen:{namespace}:{project_id}"
+
+    def key(self, namespace: str, project_id: str, generation: int) -> str:
+        return f"virshi:v{self.version}:{namespace}:{project_id}:g{generation}"
+
+    def generation(self, namespace: str, project_id: str) -> int:
+        """Current generation, re-read from the backend at most every generation_ttl seconds."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._generations.get((namespace, project_id))
+            if cached and now - cached[0] < self.generation_ttl:
+                return cached[1]
+        try:
+            raw = self.backend.get(self._generation_key(namespace, project_id))
+            generation = int(raw) if raw is not None else 0
+        except Exception as e:
+            record_error(e)
+            self._count("errors")
+            return cached[1] if cached else 0
+        with self._lock:
+            self._generations[(namespace, project_id)] = (now, generation)
+        return generation
+
+    def get(self, namespace: str, project_id: str, generation: int) -> Optional[Any]:
+        try:
+            data = self.backend.get(self.key(namespace, project_id, generation))
+            value = loads(data) if data is not None else None
+        except Exception as e:
+            record_error(e)
+            self._count("errors")
+            value = None
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, namespace: str, project_id: str, generation: int, value: Any, ttl: Optional[int] = None) -> None:
+        try:
+            self.backend.set(self.key(namespace, project_id, generation), dumps(value), ex=ttl or self.ttl)
+        except Exception as e:
+            record_error(e)
+            self._count("errors")
+
+    def invalidate(self, namespace: str, project_id: str) -> None:
+        """Bumps the generation in the backend: every replica misses on its next read."""
+        try:
+            generation = int(self.backend.incr(self._generation_key(namespace, project_id)))
+            with self._lock:
+                self._generations[(namespace, project_id)] = (time.monotonic(), generation)
+        except Exception as e:
+            record_error(e)
+            self._count("errors")
+            with self._lock:
+                self._generations.pop((namespace, project_id), None)
+        self._count("invalidations")
+
+    @property
+    def shared(self) -> bool:
+        """Whether other processes see this cache's entries and generations."""
+        return not isinstance(self.backend, NullBackend)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": type(self.backend).__name__, **self.stats}
+
+shared_cache = SharedCache(create_backend())
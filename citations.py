@@ -0,0 +1,195 @@
+"""
+Цитовані джерела: інкрементальний індекс доменів, на які посилаються відповіді ШІ
+"""
+
+import json
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Any, List, Iterable, Optional, Tuple
+import numpy as np
+import pandas as pd
+from database import get_scan_results
+from cache import shared_cache
+from utils import get_domains, is_url_official
+from config import CITATION_FIELDS, CITATION_TEXT_FIELDS, CITATION_INDEX_PROJECTS
+
+URL_RE = re.compile(r"https?://[^\s\"'<>)\]]+", re.IGNORECASE)
+
+def extract_urls(value: Any) -> List[str]:
+    """URLs from a list (of strings or {"url": ...}), a JSON-encoded list or free text."""
+    if not value:
+        return []
+    if isinstance(value, dict):
+        value = value.get("url") or value.get("link") or ""
+        return [value] if value else []
+    if isinstance(value, (list, tuple)):
+        if all(type(item) is str for item in value):
+            return [item for item in value if item]
+        return [url for item in value for url in extract_urls(item)]
+    text = str(value).strip()
+    if text[:1] in "[{":
+        try:
+            return extract_urls(json.loads(text))
+        except ValueError:
+            pass
+    found = URL_RE.findall(text)
+    if found:
+        return [url.rstrip(".,;") for url in found]
+    # A bare domain or a comma-separated list of them
+    return [part.strip() for part in text.split(",") if "." in part and " " not in part.strip()]
+
+def scan_citations(scan: Dict[str, Any]) -> List[str]:
+    for field in CITATION_FIELDS:
+        if scan.get(field):
+            return extract_urls(scan[field])
+    # No structured sources: fall back to links in the answer text
+    for field in CITATION_TEXT_FIELDS:
+        if scan.get(field):
+            return URL_RE.findall(str(scan[field]))
+    return []
+
+class CitationIndex:
+    """
+    Per-project (day, domain) citation counts. A domain counts once per scan. Rows past the
+    watermark are folded in on each update, so a rerun costs only the new scans; an unchanged
+    scan_results generation skips even that.
+    """
+
+    def __init__(self):
+        self.domains: List[str] = []
+        self.domain_ids: Dict[str, int] = {}
+        self.totals: Counter = Counter()
+        self.daily: Dict[str, Counter] = {}
+        self.scans = 0
+        self.scans_with_citations = 0
+        self.watermark = ""
+        self.watermark_ids: set = set()
+        self._generation: Optional[int] = None
+        self._seen = 0
+        self._seen_last_id = None
+        self._official_assets: Optional[tuple] = None
+        self._official: set = set()
+        self._official_checked = 0
+        self.lock = threading.Lock()
+
+    def _domain_id(self, domain: str) -> int:
+        if not domain:
+            return -1
+        domain_id = self.domain_ids.get(domain)
+        if domain_id is None:
+            domain_id = self.domain_ids[domain] = len(self.domains)
+            self.domains.append(domain)
+        return domain_id
+
+    def _new_rows(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Refetched lists normally extend the previous one: only the tail needs the watermark check
+        start = self._seen if 0 < self._seen <= len(rows) and rows[self._seen - 1].get("id") == self._seen_last_id else 0
+        return [row for row in rows[start:]
+                if str(row.get("created_at") or "") > self.watermark
+                or (str(row.get("created_at") or "") == self.watermark and row.get("id") not in self.watermark_ids)]
+
+    def update(self, rows: List[Dict[str, Any]], generation: Optional[int] = None) -> int:
+        """`generation` is the scan_results generation read before fetching rows."""
+        with self.lock:
+            if generation is not None and generation == self._generation:
+                return 0
+            new_rows = self._new_rows(rows)
+            self._generation = generation
+            self._seen, self._seen_last_id = len(rows), rows[-1].get("id") if rows else None
+            if not new_rows:
+                return 0
+
+            cited = [scan_citations(scan) for scan in new_rows]
+            lengths = np.fromiter((len(urls) for urls in cited), dtype=np.int64, count=len(cited))
+            self.scans += len(new_rows)
+            self.scans_with_citations += int(np.count_nonzero(lengths))
+
+            if lengths.any():
+                # Bulk and integer-only: each distinct URL is parsed once, dedup and counting run on int keys
+                day_codes, day_names = pd.factorize(pd.Series([str(scan.get("created_at") or "")[:10] for scan in new_rows], dtype=object))
+                domain_codes, domain_names = pd.factorize(pd.Series(get_domains([url for urls in cited for url in urls]), dtype=object))
+                global_ids = np.array([self._domain_id(name) for name in domain_names] + [-1], dtype=np.int64)
+                domain_ids = global_ids[domain_codes]
+                scan_ids = np.repeat(np.arange(len(new_rows), dtype=np.int64), lengths)
+                days = np.repeat(day_codes.astype(np.int64), lengths)
+
+                keep = domain_ids >= 0
+                scan_ids, days, domain_ids = scan_ids[keep], days[keep], domain_ids[keep]
+                width = len(self.domains)
+                # A domain counts once per scan
+                _, first = np.unique(scan_ids * width + domain_ids, return_index=True)
+                pairs, counts = np.unique(days[first] * width + domain_ids[first], return_counts=True)
+                day_list = day_names.tolist()
+                for pair, count in zip(pairs.tolist(), counts.tolist()):
+                    day = day_list[pair // width]
+                    day_counts = self.daily.get(day)
+                    if day_counts is None:
+                        day_counts = self.daily[day] = Counter()
+                    day_counts[pair % width] += count
+                    self.totals[pair % width] += count
+
+            latest = max(str(row.get("created_at") or "") for row in new_rows)
+            if latest > self.watermark:
+                self.watermark, self.watermark_ids = latest, set()
+            self.watermark_ids.update(row.get("id") for row in new_rows if str(row.get("created_at") or "") == self.watermark)
+            return len(new_rows)
+
+    @property
+    def citations(self) -> int:
+        return sum(self.totals.values())
+
+    def top_domains(self, n: int = 20) -> List[Tuple[str, int]]:
+        with self.lock:
+            return [(self.domains[domain_id], count) for domain_id, count in self.totals.most_common(n)]
+
+    def domain_counts(self) -> Iterable[Tuple[str, int]]:
+        with self.lock:
+            return [(self.domains[domain_id], count) for domain_id, count in self.totals.items()]
+
+    def official_domains(self, official_assets: List[str]) -> frozenset:
+        """Cited domains matching the official assets; only domains added since the last call are checked."""
+        assets = tuple(official_assets)
+        with self.lock:
+            if assets != self._official_assets:
+                self._official_assets, self._official, self._official_checked = assets, set(), 0
+            for domain in self.domains[self._official_checked:]:
+                if is_url_official(domain, list(assets)):
+                    self._official.add(domain)
+            self._official_checked = len(self.domains)
+            return frozenset(self._official)
+
+    def share_over_time(self, domains: List[str], granularity: str = "W") -> pd.DataFrame:
+        """Share of all citations in each period for the given domains (period, domain, citations, share)."""
+        with self.lock:
+            ids = {self.domain_ids[d]: d for d in domains if d in self.domain_ids}
+            rows = []
+            for day, counts in self.daily.items():
+                rows.append({"day": day, "domain": None, "citations": sum(counts.values())})
+                rows.extend({"day": day, "domain": name, "citations": counts[domain_id]} for domain_id, name in ids.items() if counts.get(domain_id))
+        if not rows:
+            return pd.DataFrame(columns=["period", "domain", "citations", "share"])
+
+        df = pd.DataFrame(rows)
+        df["period"] = pd.to_datetime(df["day"], errors="coerce").dt.to_period(granularity).dt.start_time
+        df = df.dropna(subset=["period"])
+        totals = df[df["domain"].isna()].groupby("period")["citations"].sum()
+        df = df[df["domain"].notna()].groupby(["period", "domain"], as_index=False)["citations"].sum()
+        df["share"] = (df["citations"] / df["period"].map(totals) * 100).round(1)
+        return df.sort_values(["period", "domain"])
+
+_indexes: "OrderedDict[str, CitationIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+def get_citation_index(project_id: str) -> CitationIndex:
+    with _indexes_lock:
+        index = _indexes.get(project_id)
+        if index is None:
+            index = _indexes[project_id] = CitationIndex()
+        _indexes.move_to_end(project_id)
+        while len(_indexes) > CITATION_INDEX_PROJECTS:
+            _indexes.popitem(last=False)
+    # Read before the rows: an invalidation in between only causes one extra (watermarked) update
+    generation = shared_cache.generation("scan_results", project_id)
+    index.update(get_scan_results(project_id), generation)
+    return index
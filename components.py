@@ -10,7 +10,21 @@ def render_metric_donut(value: float, color: str = "#00C896", size: int = 80) ->
     value = float(value) if value else 0.0
     remaining = max(0, 100 - value)
     fig = go.Figure(data=[go.Pie(values=[value, remaining], hole=0.75, marker_colors=[color, "#F0F2F6"], textinfo="none", hoverinfo="label+percent")])
-    fig.update_layout(showlegend=False, margin=dict(t=0, b=0, l=0, r=0), height=size, width=size, annotations=[dict(text=f"{int(value)}%", x=0.5, y=0.5, font_size=14, showarrow=False, font_weight="bold", font_color="#333")])
+    fig.update_layout(showlegend=False, margin=dict(t=0, b=0, l=0, r=0), height=size, width=size, annotations=[dict(text=f"<b>{int(value)}%</b>", x=0.5, y=0.5, font_size=14, showarrow=False, font_color="#333")])
+    return fig
+
+def render_trend_chart(trend, metric: str, height: int = 320) -> go.Figure:
+    fig = go.Figure()
+    for provider, rows in trend.groupby("provider"):
+        fig.add_trace(go.Scatter(x=rows["period"], y=rows[metric], mode="lines+markers", name=provider))
+    fig.update_layout(margin=dict(t=10, b=10, l=10, r=10), height=height, legend=dict(orientation="h"), yaxis=dict(autorange="reversed") if metric == "position" else None)
+    return fig
+
+def render_share_chart(share, height: int = 320) -> go.Figure:
+    fig = go.Figure()
+    for domain, rows in share.groupby("domain"):
+        fig.add_trace(go.Scatter(x=rows["period"], y=rows["share"], mode="lines+markers", name=domain))
+    fig.update_layout(margin=dict(t=10, b=10, l=10, r=10), height=height, legend=dict(orientation="h"), yaxis=dict(ticksuffix="%"))
     return fig
 
 def render_status_badge(status: str) -> str:
@@ -2,12 +2,33 @@
 Глобальна конфігурація
 """
 
+import os
+import tempfile
+
 # N8N webhooks
 N8N_GEN_URL = "https://virshi.app.n8n.cloud/webhook/webhook/generate-prompts"
 N8N_ANALYZE_URL = "https://virshi.app.n8n.cloud/webhook/webhook/run-analysis_prod"
 N8N_RECO_URL = "https://virshi.app.n8n.cloud/webhook/recommendations"
 N8N_CHAT_WEBHOOK = "https://virshi.app.n8n.cloud/webhook/webhook/chat-bot"
 
+# Analysis-complete callback receiver (n8n calls CALLBACK_PUBLIC_URL when a scan batch finishes).
+# Off unless both the public URL and the shared secret are set. Cached scan results expire after
+# SCAN_CACHE_TTL_WITHOUT_CALLBACKS unless this process runs the receiver and the cache tier is shared.
+# Binds loopback: publish it through a reverse proxy.
+CALLBACK_HOST = os.environ.get("VIRSHI_CALLBACK_HOST", "127.0.0.1")
+CALLBACK_PORT = int(os.environ.get("VIRSHI_CALLBACK_PORT", "8502"))
+CALLBACK_PATH = "/callbacks/analysis-complete"
+CALLBACK_PUBLIC_URL = os.environ.get("VIRSHI_CALLBACK_PUBLIC_URL", "")
+CALLBACK_SECRET = os.environ.get("VIRSHI_CALLBACK_SECRET", "")
+CALLBACK_SECRET_HEADER = "virshi-callback-secret"
+CALLBACKS_ENABLED = bool(CALLBACK_PUBLIC_URL and CALLBACK_SECRET)
+# Queued/running runs older than this are treated as lost (dropped callback, restarted worker)
+ANALYSIS_RUN_STALE_SECONDS = 2 * 3600
+
+# Generated prompt sets are reused for identical onboarding inputs
+PROMPT_CACHE_TTL = 24 * 3600
+PROMPT_CACHE_SIZE = 256
+
 # Auth header
 AUTH_HEADER = {"virshi-auth": "hi@virshi.ai2025"}
 
@@ -18,6 +39,21 @@ MODEL_MAPPING = {
     "Google Gemini": "gemini-1.5-pro"
 }
 
+# Outbound dispatch: (chunks per second, burst) per provider id from MODEL_MAPPING, for the whole
+# deployment. Each process queues on its own and takes 1/DISPATCH_REPLICAS of these rates.
+PROVIDER_RATE_LIMITS = {
+    "perplexity": (0.5, 2),
+    "gpt-4o": (1.0, 3),
+    "gemini-1.5-pro": (1.0, 3)
+}
+DEFAULT_RATE_LIMIT = (0.5, 1)
+DISPATCH_CHUNK_SIZE = 25
+DISPATCH_REPLICAS = int(os.environ.get("VIRSHI_DISPATCH_REPLICAS", "1"))
+DISPATCH_MAX_QUEUE = 2000
+DISPATCH_MAX_PER_PROJECT = 400
+# Fair-share weights by project status
+PRIORITY_WEIGHTS = {"active": 3, "trial": 1}
+
 PROVIDER_MAPPING = {
     "perplexity": "Perplexity",
     "gpt-4o": "Chat GPT",
@@ -26,6 +62,91 @@ PROVIDER_MAPPING = {
     "gemini": "Gemini"
 }
 
+# Trends: minimum seconds between rollup refreshes per project
+ROLLUP_REFRESH_INTERVAL = 60
+# The scheduler worker refreshes every project's rollups this often, so portfolio_metrics only reads a short raw tail
+ROLLUP_SWEEP_SECONDS = 15 * 60
+
+# Export: rows per page fetched from the DB and written per chunk
+EXPORT_PAGE_SIZE = 1000
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "virshi-exports")
+# Larger exports are not offered as a browser download (Streamlit keeps download data in memory)
+EXPORT_DOWNLOAD_MAX_MB = int(os.environ.get("VIRSHI_EXPORT_DOWNLOAD_MAX_MB", "50"))
+EXPORT_MAX_AGE_SECONDS = 3600
+
+# Local columnar snapshots of scan_results
+SNAPSHOT_DIR = os.environ.get("VIRSHI_SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "virshi-snapshots"))
+SNAPSHOT_BUDGET_MB = int(os.environ.get("VIRSHI_SNAPSHOT_BUDGET_MB", "512"))
+SNAPSHOT_MAX_SEGMENTS = 16
+# Each sync re-reads this far behind its watermark: rows committed late with an earlier created_at
+SNAPSHOT_OVERLAP_SECONDS = 15 * 60
+
+# Delta scans: a (keyword, model) scan younger than this is considered fresh
+DEFAULT_FRESHNESS_HOURS = 24 * 7
+SCAN_FRESHNESS_HOURS = {
+    "Perplexity": 24 * 7,
+    "OpenAI GPT": 24 * 7,
+    "Google Gemini": 24 * 7
+}
+SCAN_FRESHNESS_PRESETS = {"1 день": 24, "3 дні": 72, "7 днів": 24 * 7, "30 днів": 24 * 30, "Сканувати все": 0}
+
+# Cited sources: scan_results columns holding cited URLs (list, JSON or text), then answer text to scan for links
+CITATION_FIELDS = ("citations", "sources", "cited_urls")
+CITATION_TEXT_FIELDS = ("response_text", "raw_response")
+CITATION_INDEX_PROJECTS = 32
+
+# Recurring scans: worker wake-up interval and max per-project start offset
+SCHEDULE_POLL_SECONDS = 60
+SCHEDULE_JITTER_SECONDS = 15 * 60
+# A claimed run that fails to dispatch is retried after this long
+SCHEDULE_RETRY_SECONDS = 10 * 60
+# How long a tick waits for its dispatched chunks to reach n8n; below SCHEDULE_RETRY_SECONDS so the lease outlives it
+SCHEDULE_SEND_TIMEOUT = 5 * 60
+SCHEDULE_PRESETS = {
+    "Щодня о 06:00": "0 6 * * *",
+    "Щопонеділка о 06:00": "0 6 * * 1",
+    "1-го числа щомісяця": "0 6 1 * *"
+}
+
+# Near-duplicate keywords: Jaccard threshold over character shingles, MinHash/LSH shape
+DEDUP_THRESHOLD = 0.8
+DEDUP_NUM_PERM = 64
+DEDUP_BANDS = 16
+DEDUP_STEM_LENGTH = 6
+# Collapsing near-duplicates of a scan batch drops scans the user asked for: opt-in per run
+DEDUP_ON_DISPATCH = False
+
+# Session memory: idle sessions lose derived data; the per-process scan cache is capped in MB
+SESSION_IDLE_SECONDS = 30 * 60
+SESSION_SWEEP_SECONDS = 60
+SCAN_CACHE_BUDGET_MB = int(os.environ.get("VIRSHI_SCAN_CACHE_MB", "256"))
+SCAN_CACHE_TTL_WITHOUT_CALLBACKS = 300
+
+# Shared read cache for all replicas: "" (none, only invalidation generations), memory://, redis://host:6379/0 or sqlite:////path/cache.db
+CACHE_URL = os.environ.get("VIRSHI_CACHE_URL", "")
+CACHE_TTL_SECONDS = int(os.environ.get("VIRSHI_CACHE_TTL", "3600"))
+# Bump when the shape of cached rows changes
+CACHE_KEY_VERSION = 1
+# Seconds a replica trusts its last-seen invalidation generation
+CACHE_GENERATION_TTL = 2.0
+CACHE_MEMORY_ITEMS = 512
+CACHE_MEMORY_MB = int(os.environ.get("VIRSHI_CACHE_MEMORY_MB", "64"))
+
+# Dev mode: per-rerun query budgets and N+1 warnings
+DEV_MODE = os.environ.get("VIRSHI_DEV") == "1"
+N_PLUS_ONE_THRESHOLD = 3
+QUERY_BUDGETS = {
+    "Вхід": 2,
+    "Онбординг": 4,
+    "Дашборд": 12,
+    "Запити": 6,
+    "Джерела": 3,
+    "Конкуренти": 4,
+    "Звіти": 3,
+    "Портфель": 2,
+    "Адмін": 2
+}
+
 # Metric tooltips
 METRIC_TOOLTIPS = {
     "sov": "Частка видимості вашого бренду у відповідях ШІ порівняно з конкурентами.",
@@ -0,0 +1,44 @@
+"""
+Shared pytest fixtures
+"""
+
+import os
+import sys
+import pytest
+
+# Benchmarks patch Streamlit process-wide; they run as scripts, never under pytest
+collect_ignore = ["bench"]
+
+@pytest.fixture
+def query_budget():
+    """
+    Asserts per-page query budgets against db.client (request fake_backend first to count against the stand-in):
+
+        def test_dashboard_budget(query_budget):
+            with query_budget(12, label="dashboard"):
+                render_dashboard()
+    """
+    from database import db
+    from querytrack import install, budget
+
+    # The raw attribute: saving db.client would connect just to put the connection back
+    original = db._client
+    install(db)
+    yield budget
+    db._client = original
+
+@pytest.fixture
+def fake_backend(tmp_path, monkeypatch):
+    """db.client swapped for the load test's in-memory Supabase, seeded with one user and two projects."""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench"))
+    from fake_backend import FakeSupabase
+    import database
+    from snapshots import snapshot_store
+
+    backend = FakeSupabase()
+    backend.seed(1, projects_per_user=2, keywords_per_project=10, scans_per_keyword=3)
+    monkeypatch.setattr(database.db, "_client", backend)
+    monkeypatch.setattr(snapshot_store, "root", str(tmp_path))
+    database.clear_all_caches()
+    yield backend
+    database.clear_all_caches()
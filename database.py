@@ -2,96 +2,490 @@
 Supabase database manager
 """
 
+import os
 import streamlit as st
 from supabase import create_client, Client
-from typing import Dict, Any, List, Optional
-from functools import lru_cache
+from typing import Dict, Any, List, Optional, Callable, Iterator, Tuple
+from collections import OrderedDict
+from datetime import datetime, timezone
+import threading
+import time
+from telemetry import instrument, record_error
+from sessions import deep_sizeof
+from config import SCAN_CACHE_BUDGET_MB, SCAN_CACHE_TTL_WITHOUT_CALLBACKS
+from cache import shared_cache
+
+class DatabaseUnavailable(Exception):
+    """Supabase credentials are missing or the client could not be created."""
 
 class DatabaseManager:
+    """
+    Connects on first use, so importing this module never touches the UI. Credentials come from
+    SUPABASE_URL / SUPABASE_KEY in the environment (workers, CLI) or from Streamlit secrets.
+    """
+
     def __init__(self):
-        try:
-            self.url: str = st.secrets["SUPABASE_URL"]
-            self.key: str = st.secrets["SUPABASE_KEY"]
-            self.client: Client = create_client(self.url, self.key)
-            self.connected = True
-        except Exception as e:
-            st.error(f"Database connection failed: {e}")
-            self.connected = False
-            st.stop()
+        self.url: Optional[str] = None
+        self.key: Optional[str] = None
+        self._client: Optional[Client] = None
+        self._lock = threading.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self._client is not None
+
+    def _credentials(self) -> tuple:
+        url, key = os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY")
+        if not (url and key):
+            try:
+                url, key = url or st.secrets["SUPABASE_URL"], key or st.secrets["SUPABASE_KEY"]
+            except Exception as e:
+                raise DatabaseUnavailable(f"SUPABASE_URL / SUPABASE_KEY are not configured ({e})") from e
+        return url, key
+
+    def connect(self) -> Client:
+        with self._lock:
+            if self._client is None:
+                self.url, self.key = self._credentials()
+                try:
+                    self._client = create_client(self.url, self.key)
+                except Exception as e:
+                    raise DatabaseUnavailable(str(e)) from e
+            return self._client
+
+    @property
+    def client(self) -> Client:
+        return self._client if self._client is not None else self.connect()
+
+    @client.setter
+    def client(self, value) -> None:
+        self._client = value
 
 db = DatabaseManager()
 
+def paginate(build_query: Callable[[], Any], page_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yields pages of rows; build_query must return a fresh query each call, ordered by a unique
+    key (e.g. ...order("created_at").order("id")), or rows move across page boundaries.
+    """
+    start = 0
+    while True:
+        resp = build_query().range(start, start + page_size - 1).execute()
+        rows = resp.data or []
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            break
+        start += page_size
+
+# SINGLE-FLIGHT
+class SharedQueryError(Exception):
+    """Raised in each caller that waited on a shared query that failed; the cause is chained."""
+
+class _Flight:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+_flights: Dict[tuple, _Flight] = {}
+_flights_lock = threading.Lock()
+_flight_stats: Dict[str, Dict[str, int]] = {}
+
+def single_flight(key: tuple, fn: Callable[[], Any]) -> Any:
+    """
+    Concurrent callers with the same (table, filters, projection) key share one in-flight
+    query: the first runs fn, the rest wait for it. Waiters get their own copy of a list or
+    dict result, and a SharedQueryError of their own if it failed.
+    """
+    with _flights_lock:
+        stats = _flight_stats.setdefault(key[0], {"calls": 0, "collapsed": 0})
+        stats["calls"] += 1
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+        else:
+            stats["collapsed"] += 1
+
+    if not leader:
+        flight.event.wait()
+        if flight.error is not None:
+            raise SharedQueryError(f"shared {key[0]} query failed: {flight.error!r}") from flight.error
+        if isinstance(flight.result, (list, dict)):
+            return type(flight.result)(flight.result)
+        return flight.result
+
+    try:
+        flight.result = fn()
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.event.set()
+
+def get_single_flight_stats() -> Dict[str, Dict[str, int]]:
+    with _flights_lock:
+        return {table: dict(stats) for table, stats in _flight_stats.items()}
+
+# SHARED CACHE
+def shared_read(namespace: str, project_id: str, key: tuple, fetch: Callable[[], Any], generation: Optional[int] = None,
+                ttl: Optional[int] = None) -> Any:
+    """
+    Read-through the shared cache tier at the project's current (or the given) generation; `ttl`
+    overrides the tier's entry lifetime. Misses share one fetch per (query key, generation): a
+    reader arriving after an invalidation never joins a flight that started before it.
+    """
+    if generation is None:
+        generation = shared_cache.generation(namespace, project_id)
+
+    def read():
+        value = shared_cache.get(namespace, project_id, generation)
+        if value is None:
+            value = fetch()
+            shared_cache.set(namespace, project_id, generation, value, ttl=ttl)
+        return value
+    return single_flight(key + (generation,), read)
+
 # USER PROFILE
+@instrument("db")
 def get_user_profile(user_id: str) -> Optional[Dict[str, Any]]:
     try:
         resp = db.client.table("profiles").select("*").eq("id", user_id).execute()
         return resp.data[0] if resp.data else None
-    except:
+    except Exception as e:
+        record_error(e)
         return None
 
+@instrument("db")
 def create_user_profile(user_id: str, email: str, first_name: str, last_name: str, role: str = "user") -> bool:
     try:
         db.client.table("profiles").insert({"id": user_id, "email": email, "first_name": first_name, "last_name": last_name, "role": role}).execute()
         return True
-    except:
+    except Exception as e:
+        record_error(e)
         return False
 
+@instrument("db")
 def get_user_projects(user_id: str) -> List[Dict[str, Any]]:
     try:
         resp = db.client.table("projects").select("*").eq("user_id", user_id).execute()
         return resp.data if resp.data else []
-    except:
+    except Exception as e:
+        record_error(e)
         return []
 
 # PROJECTS
+@instrument("db")
+def get_all_projects(columns: str = "id, brand_name") -> List[Dict[str, Any]]:
+    try:
+        build_query = lambda: db.client.table("projects").select(columns).order("id")
+        return [row for page in paginate(build_query) for row in page]
+    except Exception as e:
+        record_error(e)
+        return []
+
+@instrument("db")
 def create_project(user_id: str, brand_name: str, domain: str, region: str = "Ukraine") -> Optional[Dict[str, Any]]:
     try:
         resp = db.client.table("projects").insert({"user_id": user_id, "brand_name": brand_name, "domain": domain, "region": region, "status": "trial"}).execute()
         return resp.data[0] if resp.data else None
-    except:
+    except Exception as e:
+        record_error(e)
+        return None
+
+@instrument("db")
+def get_project(project_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        resp = db.client.table("projects").select("*").eq("id", project_id).execute()
+        return resp.data[0] if resp.data else None
+    except Exception as e:
+        record_error(e)
         return None
 
+@instrument("db")
 def get_project_keywords(project_id: str) -> List[Dict[str, Any]]:
     try:
-        resp = db.client.table("keywords").select("*").eq("project_id", project_id).eq("is_active", True).execute()
-        return resp.data if resp.data else []
-    except:
+        key = ("keywords", (("project_id", project_id), ("is_active", True)), "*")
+        return shared_read("keywords", project_id, key, lambda: db.client.table("keywords").select("*").eq("project_id", project_id).eq("is_active", True).execute().data or [])
+    except Exception as e:
+        record_error(e)
         return []
 
+@instrument("db")
 def create_keywords(project_id: str, keywords_list: List[str]) -> bool:
     try:
         data = [{"project_id": project_id, "keyword_text": kw, "is_active": True} for kw in keywords_list]
         db.client.table("keywords").insert(data).execute()
+        shared_cache.invalidate("keywords", project_id)
         return True
-    except:
+    except Exception as e:
+        record_error(e)
         return False
 
 # SCAN RESULTS
-@lru_cache(maxsize=32)
-def get_scan_results(project_id: str, provider: Optional[str] = None):
+_scan_cache: "OrderedDict[str, Tuple[int, float, List[Dict[str, Any]]]]" = OrderedDict()
+_scan_cache_bytes: Dict[str, int] = {}
+_scan_cache_lock = threading.Lock()
+SCAN_CACHE_SIZE = 32
+
+@instrument("db", "get_scan_results")
+def _fetch_scan_results(project_id: str) -> List[Dict[str, Any]]:
+    # Local snapshot first; imported here because snapshots builds on this module
+    from snapshots import load_scan_table
+    table = load_scan_table(project_id)
+    if table is not None:
+        # Pages and the L1 cache work on row dicts; converting once here is what they share
+        return table.to_pylist()
+    try:
+        build_query = lambda: db.client.table("scan_results").select("*").eq("project_id", project_id).order("created_at").order("id")
+        return [row for page in paginate(build_query) for row in page]
+    except Exception as e:
+        record_error(e)
+        return []
+
+def _estimate_rows_bytes(rows: List[Dict[str, Any]], sample: int = 50) -> int:
+    if not rows:
+        return 0
+    step = max(1, len(rows) // sample)
+    sampled = rows[::step]
+    return deep_sizeof(sampled) * len(rows) // len(sampled)
+
+def _invalidated_by_callbacks() -> bool:
+    """New scans only reach this process as invalidations if it runs the receiver and shares generations."""
+    # Imported here because the receiver builds on this module
+    from n8n.callback import callback_receiver_running
+    return callback_receiver_running() and shared_cache.shared
+
+def _cached_scan_results(project_id: str) -> List[Dict[str, Any]]:
+    # L1: per-process LRU keyed by project, capped by count and estimated bytes, valid for one generation.
+    # L2: shared cache tier, so replicas share fetches and see each other's invalidations.
+    # Unless analysis callbacks invalidate this process, entries in both tiers also expire by age;
+    # an expired entry is refetched by this replica alone, without bumping everyone's generation.
+    generation = shared_cache.generation("scan_results", project_id)
+    ttl = None if _invalidated_by_callbacks() else SCAN_CACHE_TTL_WITHOUT_CALLBACKS
+    with _scan_cache_lock:
+        entry = _scan_cache.get(project_id)
+        if entry is not None and entry[0] == generation and (ttl is None or time.time() - entry[1] < ttl):
+            _scan_cache.move_to_end(project_id)
+            return entry[2]
+    rows = shared_read("scan_results", project_id, ("scan_results", (("project_id", project_id),), "*"), lambda: _fetch_scan_results(project_id), generation, ttl)
+    size = _estimate_rows_bytes(rows)
+    budget = SCAN_CACHE_BUDGET_MB * 1024 * 1024
+    with _scan_cache_lock:
+        current = _scan_cache.get(project_id)
+        if current is not None and current[0] > generation:
+            # A slower read of an older generation finished last: keep the newer rows
+            return rows
+        _scan_cache[project_id] = (generation, time.time(), rows)
+        _scan_cache.move_to_end(project_id)
+        _scan_cache_bytes[project_id] = size
+        while len(_scan_cache) > 1 and (len(_scan_cache) > SCAN_CACHE_SIZE or sum(_scan_cache_bytes.values()) > budget):
+            evicted, _ = _scan_cache.popitem(last=False)
+            _scan_cache_bytes.pop(evicted, None)
+    return rows
+
+def drop_cached_scan_results(project_ids) -> int:
+    """Removes projects from the per-process scan cache; returns the estimated bytes released."""
+    released = 0
+    with _scan_cache_lock:
+        for project_id in project_ids:
+            if _scan_cache.pop(project_id, None) is not None:
+                released += _scan_cache_bytes.pop(project_id, 0)
+    return released
+
+def get_scan_cache_stats() -> Dict[str, int]:
+    with _scan_cache_lock:
+        return {"projects": len(_scan_cache), "rows": sum(len(rows) for _, _, rows in _scan_cache.values()), "bytes": sum(_scan_cache_bytes.values())}
+
+def get_scan_results(project_id: str, provider: Optional[str] = None) -> List[Dict[str, Any]]:
+    # One cached fetch per project; provider filters are applied in memory
+    rows = _cached_scan_results(project_id)
+    if provider:
+        return [row for row in rows if row.get("provider") == provider]
+    return rows
+
+@instrument("db")
+def get_scanned_keyword_ids(project_id: str, keyword_ids: List[Any], batch_size: int = 200) -> Optional[set]:
+    """Which of these keywords have any scan, straight from the database; None if that couldn't be read."""
+    scanned = set()
+    try:
+        for i in range(0, len(keyword_ids), batch_size):
+            batch = list(keyword_ids[i:i + batch_size])
+            build_query = lambda: db.client.table("scan_results").select("keyword_id").eq("project_id", project_id).in_("keyword_id", batch).order("keyword_id").order("id")
+            scanned.update(row["keyword_id"] for page in paginate(build_query) for row in page)
+        return scanned
+    except Exception as e:
+        record_error(e)
+        return None
+
+@instrument("db")
+def get_portfolio_totals(project_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Additive metric totals (see metrics.TOTAL_FIELDS) for many projects from one grouped query."""
+    if not project_ids:
+        return {}
     try:
-        query = db.client.table("scan_results").select("*").eq("project_id", project_id)
-        if provider:
-            query = query.eq("provider", provider)
-        resp = query.execute()
+        resp = db.client.rpc("portfolio_metrics", {"project_ids": list(project_ids)}).execute()
+        return {row["project_id"]: row for row in resp.data} if resp.data else {}
+    except Exception as e:
+        record_error(e)
+        return {}
+
+# SCAN SCHEDULES
+@instrument("db")
+def get_project_schedule(project_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        resp = db.client.table("scan_schedules").select("*").eq("project_id", project_id).execute()
+        return resp.data[0] if resp.data else None
+    except Exception as e:
+        record_error(e)
+        return None
+
+@instrument("db")
+def save_project_schedule(project_id: str, cron: str, providers: List[str], enabled: bool, next_run_at: Optional[str]) -> bool:
+    try:
+        db.client.table("scan_schedules").upsert({"project_id": project_id, "cron": cron, "providers": providers, "enabled": enabled, "next_run_at": next_run_at}, on_conflict="project_id").execute()
+        return True
+    except Exception as e:
+        record_error(e)
+        return False
+
+@instrument("db")
+def get_due_schedules(now: str) -> List[Dict[str, Any]]:
+    try:
+        build_query = lambda: db.client.table("scan_schedules").select("*").eq("enabled", True).lte("next_run_at", now).order("next_run_at").order("id")
+        return [row for page in paginate(build_query) for row in page]
+    except Exception as e:
+        record_error(e)
+        return []
+
+@instrument("db")
+def get_enabled_schedules() -> List[Dict[str, Any]]:
+    try:
+        build_query = lambda: db.client.table("scan_schedules").select("*").eq("enabled", True).order("id")
+        return [row for page in paginate(build_query) for row in page]
+    except Exception as e:
+        record_error(e)
+        return []
+
+@instrument("db")
+def claim_schedule(schedule_id: str, expected_next_run_at: str, next_run_at: str, last_run_at: Optional[str] = None) -> bool:
+    """Compare-and-set on next_run_at, so only one worker takes a due run."""
+    values = {"next_run_at": next_run_at}
+    if last_run_at:
+        values["last_run_at"] = last_run_at
+    try:
+        resp = db.client.table("scan_schedules").update(values).eq("id", schedule_id).eq("next_run_at", expected_next_run_at).execute()
+        return bool(resp.data)
+    except Exception as e:
+        record_error(e)
+        return False
+
+# ANALYSIS RUNS
+@instrument("db")
+def create_analysis_run(project_id: str, provider: str, keywords_count: int, status: str = "running") -> Optional[Dict[str, Any]]:
+    try:
+        resp = db.client.table("analysis_runs").insert({"project_id": project_id, "provider": provider, "keywords_count": keywords_count, "status": status}).execute()
+        return resp.data[0] if resp.data else None
+    except Exception as e:
+        record_error(e)
+        return None
+
+@instrument("db")
+def create_analysis_runs(runs: List[Dict[str, Any]], status: str = "queued") -> List[Dict[str, Any]]:
+    """One insert for many runs (project_id, provider, keywords_count); the rows come back in input order."""
+    try:
+        resp = db.client.table("analysis_runs").insert([{**run, "status": status} for run in runs]).execute()
+        return resp.data or []
+    except Exception as e:
+        record_error(e)
+        return []
+
+@instrument("db")
+def get_analysis_run(run_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        resp = db.client.table("analysis_runs").select("id, project_id, status").eq("id", run_id).limit(1).execute()
+        return resp.data[0] if resp.data else None
+    except Exception as e:
+        record_error(e)
+        return None
+
+@instrument("db")
+def start_analysis_run(run_id: str) -> bool:
+    try:
+        db.client.table("analysis_runs").update({"status": "running"}).eq("id", run_id).execute()
+        return True
+    except Exception as e:
+        record_error(e)
+        return False
+
+@instrument("db")
+def complete_analysis_run(run_id: str, status: str = "done") -> bool:
+    try:
+        db.client.table("analysis_runs").update({"status": status, "completed_at": datetime.now(timezone.utc).isoformat()}).eq("id", run_id).execute()
+        return True
+    except Exception as e:
+        record_error(e)
+        return False
+
+@instrument("db")
+def get_recent_analysis_runs(project_id: str, limit: int = 10, max_age_seconds: Optional[float] = None) -> List[Dict[str, Any]]:
+    try:
+        query = db.client.table("analysis_runs").select("*").eq("project_id", project_id)
+        if max_age_seconds is not None:
+            query = query.gte("created_at", datetime.fromtimestamp(time.time() - max_age_seconds, timezone.utc).isoformat())
+        resp = query.order("created_at", desc=True).limit(limit).execute()
         return resp.data if resp.data else []
-    except:
+    except Exception as e:
+        record_error(e)
         return []
 
 # OFFICIAL ASSETS
+@instrument("db")
 def get_official_assets(project_id: str) -> List[str]:
     try:
-        resp = db.client.table("official_assets").select("domain_or_url").eq("project_id", project_id).execute()
-        return [item["domain_or_url"] for item in resp.data] if resp.data else []
-    except:
+        key = ("official_assets", (("project_id", project_id),), "domain_or_url")
+        rows = shared_read("official_assets", project_id, key, lambda: db.client.table("official_assets").select("domain_or_url").eq("project_id", project_id).execute().data or [])
+        return [item["domain_or_url"] for item in rows]
+    except Exception as e:
+        record_error(e)
         return []
 
+@instrument("db")
 def add_official_asset(project_id: str, domain_or_url: str, asset_type: str = "website") -> bool:
     try:
         db.client.table("official_assets").insert({"project_id": project_id, "domain_or_url": domain_or_url, "type": asset_type}).execute()
+        shared_cache.invalidate("official_assets", project_id)
         return True
-    except:
+    except Exception as e:
+        record_error(e)
         return False
 
+# CACHE INVALIDATION
+_invalidation_listeners: List[Callable[[str], None]] = []
+
+def on_invalidate(listener: Callable[[str], None]) -> None:
+    """Registers a hook for derived per-project data (rollups, indexes) to drop on invalidation."""
+    _invalidation_listeners.append(listener)
+
+def invalidate_project(project_id: str) -> None:
+    # The generation bump reaches every replica; listeners run on this one.
+    # The snapshot is rebuilt in full: new rows may carry a created_at behind its watermark.
+    from snapshots import snapshot_store
+    snapshot_store.resync(project_id)
+    shared_cache.invalidate("scan_results", project_id)
+    with _scan_cache_lock:
+        _scan_cache.pop(project_id, None)
+        _scan_cache_bytes.pop(project_id, None)
+    for listener in _invalidation_listeners:
+        listener(project_id)
+
 def clear_all_caches():
-    get_scan_results.cache_clear()
+    with _scan_cache_lock:
+        _scan_cache.clear()
+        _scan_cache_bytes.clear()
@@ -0,0 +1,142 @@
+"""
+Near-duplicate keyword detection (MinHash + LSH over character shingles)
+"""
+
+import re
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from config import DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_BANDS, DEDUP_STEM_LENGTH
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+def normalize_keyword(text: str) -> str:
+    """Case, punctuation, word order and (crudely) inflection-insensitive form; tokens with digits stay whole."""
+    tokens = re.findall(r"\w+", str(text).lower())
+    return " ".join(sorted(token[:DEDUP_STEM_LENGTH] if token.isalpha() else token for token in tokens))
+
+def numeric_tokens(text: str) -> frozenset:
+    """Amounts, years, model numbers: keywords that differ in these are never duplicates."""
+    return frozenset(token for token in re.findall(r"\w+", str(text).lower()) if any(c.isdigit() for c in token))
+
+def shingles(text: str, k: int = 3) -> set:
+    norm = normalize_keyword(text)
+    if len(norm) <= k:
+        return {norm} if norm else set()
+    return {norm[i:i + k] for i in range(len(norm) - k + 1)}
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class NearDuplicateIndex:
+    """
+    LSH index: signatures are split into bands and only keywords sharing a band bucket
+    are compared, so lookups stay roughly constant as the index grows.
+    """
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, num_perm: int = DEDUP_NUM_PERM, bands: int = DEDUP_BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.RandomState(1)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(bands)]
+        self._shingles: Dict[str, set] = {}
+        self._numbers: Dict[str, frozenset] = {}
+
+    def __len__(self) -> int:
+        return len(self._shingles)
+
+    def signature(self, shingle_set: set) -> np.ndarray:
+        hashes = np.array([zlib.crc32(s.encode()) for s in shingle_set], dtype=np.uint64)
+        # (a*h + b) mod p, truncated to 32 bits, minimised per permutation
+        phv = ((np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME) & _MAX_HASH
+        return phv.min(axis=0)
+
+    def _band_keys(self, sig: np.ndarray) -> List[bytes]:
+        return [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def query(self, text: str) -> List[Tuple[str, float]]:
+        shingle_set = shingles(text)
+        if not shingle_set:
+            return []
+        candidates = set()
+        for band, key in enumerate(self._band_keys(self.signature(shingle_set))):
+            candidates.update(self._buckets[band].get(key, ()))
+        numbers = numeric_tokens(text)
+        matches = [(c, jaccard(shingle_set, self._shingles[c])) for c in candidates if self._numbers[c] == numbers]
+        return sorted([m for m in matches if m[1] >= self.threshold], key=lambda m: -m[1])
+
+    def add(self, text: str) -> None:
+        shingle_set = shingles(text)
+        if not shingle_set or text in self._shingles:
+            return
+        self._shingles[text] = shingle_set
+        self._numbers[text] = numeric_tokens(text)
+        for band, key in enumerate(self._band_keys(self.signature(shingle_set))):
+            self._buckets[band].setdefault(key, []).append(text)
+
+    def match(self, text: str) -> Optional[str]:
+        matches = self.query(text)
+        return matches[0][0] if matches else None
+
+_indexes: Dict[str, NearDuplicateIndex] = {}
+_indexes_lock = threading.Lock()
+stats = {"duplicates_flagged": 0, "scans_avoided": 0}
+
+def project_index(project_id: str, existing_keywords: List[str]) -> NearDuplicateIndex:
+    with _indexes_lock:
+        index = _indexes.get(project_id)
+        if index is None or len(index) < len(set(existing_keywords)):
+            index = _indexes[project_id] = NearDuplicateIndex()
+            for kw in existing_keywords:
+                index.add(kw)
+        return index
+
+def forget_project(project_id: str) -> None:
+    with _indexes_lock:
+        _indexes.pop(project_id, None)
+
+def split_near_duplicates(project_id: str, new_keywords: List[str], existing_keywords: List[str]) -> Tuple[List[str], Dict[str, str]]:
+    """Splits an import into keywords to add and {duplicate: matching keyword} (existing or earlier in the batch)."""
+    index = project_index(project_id, existing_keywords)
+    unique: List[str] = []
+    duplicates: Dict[str, str] = {}
+    with _indexes_lock:
+        batch = NearDuplicateIndex(index.threshold)
+        for kw in new_keywords:
+            match = index.match(kw) or batch.match(kw)
+            if match:
+                duplicates[kw] = match
+                continue
+            unique.append(kw)
+            batch.add(kw)
+        stats["duplicates_flagged"] += len(duplicates)
+    return unique, duplicates
+
+def remember_keywords(project_id: str, keywords: List[str]) -> None:
+    with _indexes_lock:
+        index = _indexes.get(project_id)
+        if index is not None:
+            for kw in keywords:
+                index.add(kw)
+
+def collapse_near_duplicates(keywords: List[str], providers: int = 1) -> Tuple[List[str], Dict[str, str]]:
+    """Keeps one representative per near-duplicate group of a scan batch; counts the scans avoided."""
+    index = NearDuplicateIndex()
+    representatives: List[str] = []
+    skipped: Dict[str, str] = {}
+    for kw in keywords:
+        match = index.match(kw)
+        if match:
+            skipped[kw] = match
+            continue
+        representatives.append(kw)
+        index.add(kw)
+    stats["scans_avoided"] += len(skipped) * providers
+    return representatives, skipped
@@ -0,0 +1,159 @@
+"""
+Потоковий експорт результатів сканування (CSV / Parquet)
+"""
+
+import csv
+import json
+import os
+import tempfile
+import time
+from typing import Dict, Any, List, Iterator, Optional, Callable
+import pyarrow as pa
+import pyarrow.parquet as pq
+from database import db
+from config import EXPORT_PAGE_SIZE, EXPORT_DIR, EXPORT_MAX_AGE_SECONDS
+
+EXPORT_FORMATS = {"csv": "CSV", "parquet": "Parquet"}
+MIME_TYPES = {"csv": "text/csv", "parquet": "application/octet-stream"}
+
+def iter_scan_result_pages(project_id: str, with_keywords: bool = True, page_size: int = EXPORT_PAGE_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Keyset pagination on id: every page costs the same, however deep into the table it is."""
+    columns = "*, keywords(keyword_text)" if with_keywords else "*"
+    last_id = None
+    while True:
+        query = db.client.table("scan_results").select(columns).eq("project_id", project_id)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        resp = query.order("id").limit(page_size).execute()
+        rows = resp.data or []
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+        yield [_flatten(row) for row in rows]
+        if len(rows) < page_size:
+            break
+
+def _flatten(row: Dict[str, Any]) -> Dict[str, Any]:
+    flat = {}
+    for key, value in row.items():
+        if key == "keywords":
+            flat["keyword_text"] = value.get("keyword_text") if isinstance(value, dict) else None
+        elif isinstance(value, (dict, list)):
+            flat[key] = json.dumps(value, ensure_ascii=False)
+        else:
+            flat[key] = value
+    return flat
+
+def write_csv(pages: Iterator[List[Dict[str, Any]]], path: str, on_page: Optional[Callable[[int], None]] = None) -> int:
+    total = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = None
+        for rows in pages:
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()), extrasaction="ignore")
+                writer.writeheader()
+            writer.writerows(rows)
+            total += len(rows)
+            if on_page:
+                on_page(total)
+    return total
+
+# Parquet column types are declared, not inferred from the first page: a column that is all-null
+# there (or int there, float later) must not fix the type for the whole file. Anything not listed is text.
+PARQUET_TYPES = {
+    "links_to_official_site": pa.bool_(),
+    "brand_position": pa.float64()
+}
+
+def _to_text(value: Any) -> Optional[str]:
+    return value if value is None or isinstance(value, str) else str(value)
+
+def _to_bool(value: Any) -> Optional[bool]:
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    if str(value).lower() in ("true", "false", "t", "f", "1", "0"):
+        return str(value).lower() in ("true", "t", "1")
+    raise ValueError(f"not a boolean: {value!r}")
+
+def _to_float(value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    return float(value)
+
+_CONVERTERS = {pa.bool_(): _to_bool, pa.float64(): _to_float}
+
+def parquet_schema(columns: List[str]) -> pa.Schema:
+    return pa.schema([pa.field(name, PARQUET_TYPES.get(name, pa.string())) for name in columns])
+
+def _page_table(rows: List[Dict[str, Any]], schema: pa.Schema) -> pa.Table:
+    arrays = []
+    for field in schema:
+        convert = _CONVERTERS.get(field.type, _to_text)
+        try:
+            arrays.append(pa.array([convert(row.get(field.name)) for row in rows], type=field.type))
+        except (ValueError, TypeError, pa.ArrowInvalid) as e:
+            raise ValueError(f"column {field.name}: {e}") from e
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def write_parquet(pages: Iterator[List[Dict[str, Any]]], path: str, on_page: Optional[Callable[[int], None]] = None) -> int:
+    total = 0
+    writer = None
+    schema = None
+    try:
+        for rows in pages:
+            if writer is None:
+                schema = parquet_schema(list(rows[0].keys()))
+                writer = pq.ParquetWriter(path, schema)
+            writer.write_table(_page_table(rows, schema))
+            total += len(rows)
+            if on_page:
+                on_page(total)
+    finally:
+        if writer is not None:
+            writer.close()
+    return total
+
+def export_scan_results(project_id: str, fmt: str = "csv", with_keywords: bool = True, on_page: Optional[Callable[[int], None]] = None) -> Optional[str]:
+    """
+    Streams the project's scan results into a temp file and returns its path (None if nothing to
+    export). Failures propagate; the partial file is removed. The caller owns the file.
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    sweep_exports()
+    fd, path = tempfile.mkstemp(prefix=f"scan_results_{project_id}_", suffix=f".{fmt}", dir=EXPORT_DIR)
+    os.close(fd)
+
+    writers = {"csv": write_csv, "parquet": write_parquet}
+    try:
+        total = writers[fmt](iter_scan_result_pages(project_id, with_keywords), path, on_page)
+    except BaseException:
+        remove_export(path)
+        raise
+    if not total:
+        remove_export(path)
+        return None
+    return path
+
+def sweep_exports(max_age_seconds: float = EXPORT_MAX_AGE_SECONDS) -> None:
+    """Removes export files left behind by sessions or processes that ended before cleaning up."""
+    cutoff = time.time() - max_age_seconds
+    try:
+        names = os.listdir(EXPORT_DIR)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if name.startswith("scan_results_") and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+def remove_export(path: Optional[str]) -> None:
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,62 @@
+"""
+Розрахунок метрик видимості
+"""
+
+from typing import Dict, Any, Iterable
+
+SENTIMENTS = ("positive", "neutral", "negative")
+
+# Additive counters: can be summed across scans, days and providers
+TOTAL_FIELDS = (
+    "scans", "brand_mentions", "official_links",
+    "sentiment_positive", "sentiment_neutral", "sentiment_negative",
+    "position_sum", "position_count"
+)
+
+def empty_totals() -> Dict[str, Any]:
+    return {field: 0 for field in TOTAL_FIELDS}
+
+def add_scan(totals: Dict[str, Any], scan: Dict[str, Any], brand_name: str) -> None:
+    totals["scans"] += 1
+    if brand_name.lower() in str(scan.get("mentioned_brands", "")).lower():
+        totals["brand_mentions"] += 1
+    if scan.get("links_to_official_site", False):
+        totals["official_links"] += 1
+
+    sentiment = str(scan.get("sentiment") or "neutral").lower()
+    if sentiment not in SENTIMENTS:
+        sentiment = "neutral"
+    totals[f"sentiment_{sentiment}"] += 1
+
+    position = scan.get("brand_position")
+    if position:
+        totals["position_sum"] += position
+        totals["position_count"] += 1
+
+def aggregate(scan_results: Iterable[Dict[str, Any]], brand_name: str) -> Dict[str, Any]:
+    totals = empty_totals()
+    for scan in scan_results:
+        add_scan(totals, scan, brand_name)
+    return totals
+
+def metrics_from_totals(totals: Dict[str, Any]) -> Dict[str, Any]:
+    total_scans = totals.get("scans", 0)
+    if not total_scans:
+        return {"sov": 0, "official": 0, "sentiment": "N/A", "position": 0, "presence": 0, "domain": 0}
+
+    mention_share = round((totals["brand_mentions"] / total_scans) * 100, 1)
+    official_share = round((totals["official_links"] / total_scans) * 100, 1)
+    dominant_sentiment = max(SENTIMENTS, key=lambda s: totals[f"sentiment_{s}"])
+    avg_position = round(totals["position_sum"] / totals["position_count"], 1) if totals["position_count"] else 0
+
+    return {
+        "sov": mention_share,
+        "official": official_share,
+        "sentiment": dominant_sentiment.capitalize(),
+        "position": avg_position,
+        "presence": mention_share,
+        "domain": official_share
+    }
+
+def calculate_metrics(scan_results, brand_name: str) -> Dict[str, Any]:
+    return metrics_from_totals(aggregate(scan_results or [], brand_name))
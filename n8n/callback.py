@@ -0,0 +1,113 @@
+"""
+Analysis-complete callback receiver
+
+n8n calls it when a scan batch has been written to scan_results:
+
+    POST {CALLBACK_PUBLIC_URL}        (served at CALLBACK_PATH on CALLBACK_HOST:CALLBACK_PORT)
+    virshi-callback-secret: <VIRSHI_CALLBACK_SECRET>
+    {"project_id": "...", "analysis_id": "...", "status": "done" | "failed"}
+
+The analysis run must belong to the project; then the project's caches and derived metrics are
+invalidated and the run is closed. With CALLBACK_PUBLIC_URL or VIRSHI_CALLBACK_SECRET unset the
+receiver is not started and no callback_url is sent: cached scan results expire by age instead.
+"""
+
+import hmac
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, Tuple
+import requests
+from config import CALLBACK_HOST, CALLBACK_PORT, CALLBACK_PATH, CALLBACK_SECRET, CALLBACK_SECRET_HEADER, CALLBACKS_ENABLED
+from database import invalidate_project, complete_analysis_run, get_analysis_run
+from telemetry import span, record_error
+
+logger = logging.getLogger(__name__)
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+def handle_callback(payload: Dict[str, Any], headers: Dict[str, str], secret: str = CALLBACK_SECRET) -> Tuple[int, Dict[str, Any]]:
+    if not secret:
+        return 503, {"ok": False, "error": "callbacks are disabled"}
+    if not hmac.compare_digest(headers.get(CALLBACK_SECRET_HEADER, "").encode(), secret.encode()):
+        return 401, {"ok": False, "error": "unauthorized"}
+
+    project_id, analysis_id = payload.get("project_id"), payload.get("analysis_id")
+    if not project_id or not analysis_id:
+        return 400, {"ok": False, "error": "project_id and analysis_id are required"}
+
+    status = payload.get("status", "done")
+    if status not in ("done", "failed"):
+        return 400, {"ok": False, "error": f"unknown status: {status}"}
+
+    run = get_analysis_run(analysis_id)
+    if not run or run.get("project_id") != project_id:
+        return 404, {"ok": False, "error": "unknown analysis for this project"}
+
+    invalidate_project(project_id)
+    complete_analysis_run(analysis_id, status)
+    return 200, {"ok": True}
+
+class CallbackHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        with span("webhook", "analysis_callback"):
+            if self.path.split("?")[0] != CALLBACK_PATH:
+                return self._reply(404, {"ok": False, "error": "not found"})
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError as e:
+                record_error(e)
+                return self._reply(400, {"ok": False, "error": "invalid json"})
+            code, body = handle_callback(payload if isinstance(payload, dict) else {}, {k.lower(): v for k, v in self.headers.items()}, self.server.secret)
+            if code != 200:
+                record_error(f"HTTP {code}")
+            self._reply(code, body)
+
+    def _reply(self, code: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_callback_server(host: str = CALLBACK_HOST, port: int = CALLBACK_PORT, enabled: bool = CALLBACKS_ENABLED,
+                          secret: str = CALLBACK_SECRET) -> Optional[ThreadingHTTPServer]:
+    """
+    Starts the receiver once per process; returns None if callbacks are not configured or the port
+    is taken (e.g. by another replica).
+    """
+    global _server
+    if not enabled:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), CallbackHandler)
+            except OSError as e:
+                logger.warning("analysis callback receiver not started on %s:%s: %s", host, port, e)
+                return None
+            _server.secret = secret
+            threading.Thread(target=_server.serve_forever, name="analysis-callback", daemon=True).start()
+        return _server
+
+def callback_receiver_running() -> bool:
+    return _server is not None
+
+def stop_callback_server() -> None:
+    global _server
+    with _server_lock:
+        if _server is not None:
+            _server.shutdown()
+            _server.server_close()
+            _server = None
+
+def post_callback(url: str, project_id: str, analysis_id: str, status: str = "done", secret: str = CALLBACK_SECRET) -> int:
+    """Local stand-in for n8n's final HTTP node."""
+    payload = {"project_id": project_id, "analysis_id": analysis_id, "status": status}
+    return requests.post(url, json=payload, headers={CALLBACK_SECRET_HEADER: secret}, timeout=10).status_code
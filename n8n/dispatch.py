@@ -0,0 +1,237 @@
+"""
+Outbound analysis dispatch: per-provider rate limits and fair queuing across projects
+"""
+
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Callable, Deque
+from config import PROVIDER_RATE_LIMITS, DEFAULT_RATE_LIMIT, DISPATCH_CHUNK_SIZE, DISPATCH_MAX_QUEUE, DISPATCH_MAX_PER_PROJECT, PRIORITY_WEIGHTS, DISPATCH_REPLICAS
+
+class QueueFull(Exception):
+    """Backpressure: the dispatcher won't take more work right now."""
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self._refill()
+        self.tokens -= 1
+
+class Ticket:
+    """Progress of one submit(): how many of its chunks were sent, failed or are still queued."""
+
+    def __init__(self, ticket_id: int, project_id: str, provider: str, chunks: int):
+        self.id = ticket_id
+        self.project_id = project_id
+        self.provider = provider
+        self.chunks = chunks
+        self.sent = 0
+        self.failed = 0
+
+    @property
+    def done(self) -> bool:
+        return self.sent + self.failed >= self.chunks
+
+class _Job:
+    __slots__ = ("ticket", "provider", "payload")
+
+    def __init__(self, ticket: Ticket, provider: str, payload: Dict[str, Any]):
+        self.ticket = ticket
+        self.provider = provider
+        self.payload = payload
+
+class _ProjectQueue:
+    __slots__ = ("jobs", "weight", "vtime")
+
+    def __init__(self, weight: float, vtime: float):
+        self.jobs: Deque[_Job] = deque()
+        self.weight = weight
+        self.vtime = vtime
+
+class DispatchScheduler:
+    """
+    Weighted fair queuing over projects: each sent chunk advances the project's virtual
+    time by 1/weight and the project with the smallest virtual time goes next, so an
+    `active` project gets PRIORITY_WEIGHTS["active"] chunks for every trial chunk and a
+    huge batch only ever holds one slot in the rotation. A chunk is only sent when its
+    provider's token bucket allows it; other providers keep flowing meanwhile.
+
+    Queues and buckets live in this process: each replica gets 1/replicas of the configured
+    provider rates (VIRSHI_DISPATCH_REPLICAS), and queued work is lost if the process exits.
+    `enqueue` runs once per submit with all of its chunk payloads (outside the lock) and returns
+    the payloads to send, e.g. with the ids of "queued" analysis runs created in one insert.
+    """
+
+    def __init__(self, send: Callable[[Dict[str, Any]], bool], rate_limits: Optional[Dict[str, float]] = None, chunk_size: int = DISPATCH_CHUNK_SIZE,
+                 max_queue: int = DISPATCH_MAX_QUEUE, max_per_project: int = DISPATCH_MAX_PER_PROJECT, clock: Callable[[], float] = time.monotonic,
+                 enqueue: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None, replicas: int = DISPATCH_REPLICAS):
+        self.send = send
+        self.enqueue = enqueue
+        self.replicas = max(1, replicas)
+        self.rate_limits = rate_limits if rate_limits is not None else PROVIDER_RATE_LIMITS
+        self.chunk_size = chunk_size
+        self.max_queue = max_queue
+        self.max_per_project = max_per_project
+        self.clock = clock
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._projects: Dict[str, _ProjectQueue] = {}
+        self._queued = 0
+        self._reserved: Dict[str, int] = {}
+        self._inflight = 0
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+
+    def _rate(self, provider: str) -> float:
+        """This replica's share of the provider's rate."""
+        return self.rate_limits.get(provider, DEFAULT_RATE_LIMIT)[0] / self.replicas
+
+    def _bucket(self, provider: str) -> TokenBucket:
+        if provider not in self._buckets:
+            burst = self.rate_limits.get(provider, DEFAULT_RATE_LIMIT)[1]
+            self._buckets[provider] = TokenBucket(self._rate(provider), max(1.0, burst / self.replicas), self.clock)
+        return self._buckets[provider]
+
+    def submit(self, project_id: str, provider: str, payload: Dict[str, Any], keywords: List[str], priority: str = "trial") -> Ticket:
+        chunks = [keywords[i:i + self.chunk_size] for i in range(0, len(keywords), self.chunk_size)] or [[]]
+        with self._cond:
+            queue = self._projects.get(project_id)
+            queued_for_project = (len(queue.jobs) if queue else 0) + self._reserved.get(project_id, 0)
+            if self._queued + sum(self._reserved.values()) + len(chunks) > self.max_queue or queued_for_project + len(chunks) > self.max_per_project:
+                raise QueueFull(f"{self._queued} chunks queued")
+            self._reserved[project_id] = self._reserved.get(project_id, 0) + len(chunks)
+
+        payloads = [{**payload, "keywords": chunk} for chunk in chunks]
+        try:
+            if self.enqueue is not None:
+                payloads = self.enqueue(payloads)
+        finally:
+            with self._cond:
+                self._reserved[project_id] -= len(chunks)
+                if not self._reserved[project_id]:
+                    del self._reserved[project_id]
+
+        with self._cond:
+            queue = self._projects.get(project_id)
+            if queue is None:
+                # Newcomers start at the current front so they neither jump ahead nor wait behind old debt
+                vtime = min((q.vtime for q in self._projects.values()), default=0.0)
+                queue = self._projects[project_id] = _ProjectQueue(PRIORITY_WEIGHTS.get(priority, 1), vtime)
+            queue.weight = max(queue.weight, PRIORITY_WEIGHTS.get(priority, 1))
+
+            ticket = Ticket(next(self._ids), project_id, provider, len(chunks))
+            for chunk_payload in payloads:
+                queue.jobs.append(_Job(ticket, provider, chunk_payload))
+            self._queued += len(chunks)
+            self._ensure_worker()
+            self._cond.notify_all()
+        return ticket
+
+    def _next_job(self) -> tuple:
+        """Returns (job, 0) or (None, seconds to wait). Caller holds the lock."""
+        wait = None
+        for project_id, queue in sorted(self._projects.items(), key=lambda item: item[1].vtime):
+            blocked = set()
+            for job in queue.jobs:
+                if job.provider in blocked:
+                    continue
+                delay = self._bucket(job.provider).wait_time()
+                if delay == 0:
+                    queue.jobs.remove(job)
+                    self._bucket(job.provider).take()
+                    queue.vtime += 1 / queue.weight
+                    self._queued -= 1
+                    if not queue.jobs:
+                        del self._projects[project_id]
+                    return job, 0.0
+                blocked.add(job.provider)
+                wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    def run_once(self) -> Optional[float]:
+        """Sends at most one chunk; returns seconds until more work could go out (None when idle)."""
+        with self._cond:
+            job, wait = self._next_job()
+            if job is not None:
+                self._inflight += 1
+        if job is None:
+            return wait
+        try:
+            ok = self.send(job.payload)
+        except Exception:
+            ok = False
+        with self._cond:
+            self._inflight -= 1
+            if ok:
+                job.ticket.sent += 1
+            else:
+                job.ticket.failed += 1
+            self._cond.notify_all()
+        return 0.0
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until every queued chunk was sent or failed; headless callers wait here before exiting."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queued or self._inflight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(timeout=remaining)
+        return True
+
+    def wait(self, tickets: List[Ticket], timeout: Optional[float] = None) -> bool:
+        """Blocks until every ticket is done (sent or failed); False if the timeout ran out first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not all(ticket.done for ticket in tickets):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(timeout=remaining)
+        return True
+
+    def _run(self) -> None:
+        while True:
+            wait = self.run_once()
+            if wait == 0.0:
+                continue
+            with self._cond:
+                if not self._queued:
+                    self._cond.wait()
+                elif wait:
+                    self._cond.wait(timeout=wait)
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="analysis-dispatch", daemon=True)
+            self._worker.start()
+
+    def backlog(self, project_id: Optional[str] = None) -> Dict[str, Any]:
+        """Backpressure signal for the UI: queued chunks and a rough wait estimate."""
+        with self._cond:
+            queued = len(self._projects[project_id].jobs) if project_id in self._projects else 0
+            providers = {job.provider for q in self._projects.values() for job in q.jobs}
+            slowest = min((self._rate(p) for p in providers), default=1.0)
+            return {
+                "queued": self._queued,
+                "project_queued": queued,
+                "eta_seconds": round(self._queued / slowest) if self._queued else 0,
+                "saturated": self._queued >= self.max_queue * 0.8
+            }
@@ -2,36 +2,144 @@
 N8N Webhook Integration
 """
 
+import hashlib
+import json
+import re
+import threading
+import time
 import requests
 import streamlit as st
-from typing import List, Optional
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
-from config import N8N_GEN_URL, N8N_ANALYZE_URL, N8N_RECO_URL, AUTH_HEADER, MODEL_MAPPING
-from database import db
+from config import N8N_GEN_URL, N8N_ANALYZE_URL, N8N_RECO_URL, AUTH_HEADER, MODEL_MAPPING, CALLBACK_PUBLIC_URL, CALLBACKS_ENABLED, PROMPT_CACHE_TTL, PROMPT_CACHE_SIZE, DEDUP_ON_DISPATCH
+from database import db, create_analysis_run, create_analysis_runs, start_analysis_run, complete_analysis_run, get_project, get_project_keywords, get_user_profile
+from telemetry import instrument, span, record_error, record_payload
+from n8n.dispatch import DispatchScheduler, QueueFull, Ticket
+from utils import get_domain
+from dedup import collapse_near_duplicates
+from scan_planner import plan_scans, TrialCheckFailed
+from notify import Notifier, ui
 
-def n8n_generate_prompts(brand: str, domain: str, industry: str, products: str) -> List[str]:
+DEFAULT_SENDER = "no-reply@virshi.ai"
+
+_prompt_cache: "OrderedDict[str, Tuple[float, List[str]]]" = OrderedDict()
+_prompt_cache_lock = threading.Lock()
+
+def prompt_fingerprint(brand: str, domain: str, industry: str, products: str) -> str:
+    """Same brand/domain/industry/products up to case, spacing, URL prefix and product order."""
+    norm = lambda v: " ".join(str(v).lower().split())
+    product_items = sorted({norm(p) for p in re.split(r"[,;\n]", str(products)) if norm(p)})
+    key = [norm(brand), get_domain(domain) if str(domain).strip() else "", norm(industry), product_items]
+    return hashlib.sha1(json.dumps(key, ensure_ascii=False).encode()).hexdigest()
+
+def get_cached_prompts(fingerprint: str) -> Optional[List[str]]:
+    with _prompt_cache_lock:
+        entry = _prompt_cache.get(fingerprint)
+        if entry is None:
+            return None
+        if time.time() - entry[0] > PROMPT_CACHE_TTL:
+            del _prompt_cache[fingerprint]
+            return None
+        _prompt_cache.move_to_end(fingerprint)
+        return list(entry[1])
+
+def n8n_generate_prompts(brand: str, domain: str, industry: str, products: str, force: bool = False, notifier: Optional[Notifier] = None) -> List[str]:
+    fingerprint = prompt_fingerprint(brand, domain, industry, products)
+    if not force:
+        cached = get_cached_prompts(fingerprint)
+        if cached:
+            return cached
+
+    prompts = _request_prompts(brand, domain, industry, products, notifier or ui)
+    if prompts:
+        with _prompt_cache_lock:
+            _prompt_cache[fingerprint] = (time.time(), list(prompts))
+            _prompt_cache.move_to_end(fingerprint)
+            while len(_prompt_cache) > PROMPT_CACHE_SIZE:
+                _prompt_cache.popitem(last=False)
+    return prompts
+
+@instrument("webhook", "n8n_generate_prompts")
+def _request_prompts(brand: str, domain: str, industry: str, products: str, notifier: Notifier) -> List[str]:
     payload = {"brand": brand, "domain": domain, "industry": industry, "products": products}
     try:
         response = requests.post(N8N_GEN_URL, json=payload, headers=AUTH_HEADER, timeout=60)
+        record_payload(len(response.request.body or b""))
         if response.status_code == 200:
             data = response.json()
             if isinstance(data, list):
                 return data
             return data.get("prompts", [])
         else:
-            st.error(f"N8N Error: {response.status_code}")
+            record_error(f"HTTP {response.status_code}")
+            notifier.error(f"N8N Error: {response.status_code}")
             return []
     except Exception as e:
-        st.error(f"Connection error: {e}")
+        record_error(e)
+        notifier.error(f"Connection error: {e}")
         return []
 
-def n8n_trigger_analysis(project_id, keywords, brand_name, models=None) -> bool:
+def _queue_analysis_chunks(payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Visible on the keywords page while the chunks wait for their rate-limit slots; one insert per submit
+    runs = create_analysis_runs([{"project_id": p["project_id"], "provider": p["provider"], "keywords_count": len(p["keywords"])} for p in payloads], status="queued")
+    if len(runs) != len(payloads):
+        return payloads
+    return [{**payload, "analysis_id": run["id"]} for payload, run in zip(payloads, runs)]
+
+def _send_analysis_chunk(payload: Dict[str, Any]) -> bool:
+    # Runs on the dispatcher thread: no Streamlit calls here
+    if payload.get("analysis_id"):
+        run = {"id": payload["analysis_id"]}
+        start_analysis_run(run["id"])
+    else:
+        run = create_analysis_run(payload["project_id"], payload["provider"], len(payload["keywords"]))
+        if run:
+            payload = {**payload, "analysis_id": run["id"]}
+
+    ok = False
+    with span("webhook", "n8n_trigger_analysis"):
+        try:
+            response = requests.post(N8N_ANALYZE_URL, json=payload, headers=AUTH_HEADER, timeout=60)
+            record_payload(len(response.request.body or b""))
+            ok = response.status_code == 200
+            if not ok:
+                record_error(f"HTTP {response.status_code}")
+        except Exception as e:
+            record_error(e)
+
+    if run and not ok:
+        complete_analysis_run(run["id"], "failed")
+    elif run and not CALLBACKS_ENABLED:
+        # No callback will ever close it: accepted by n8n is as far as this side can tell
+        complete_analysis_run(run["id"], "done")
+    return ok
+
+dispatcher = DispatchScheduler(send=_send_analysis_chunk, enqueue=_queue_analysis_chunks)
+
+def n8n_trigger_analysis(project_id, keywords, brand_name, models=None, dedupe: bool = DEDUP_ON_DISPATCH,
+                         max_age_hours: Optional[float] = None, budget: Optional[int] = None) -> bool:
+    # UI entry point: project status and sender come from the Streamlit session
     current_proj = st.session_state.get("current_project")
     status = current_proj.get("status", "trial") if current_proj else "trial"
+    user = st.session_state.get("user")
+    user_email = user.email if user else DEFAULT_SENDER
+
+    result = run_analysis(project_id, keywords, brand_name, models, status=status, user_email=user_email, dedupe=dedupe,
+                          max_age_hours=max_age_hours, budget=budget, notifier=ui)
+    return result["ok"]
+
+def run_analysis(project_id: str, keywords, brand_name: str, models: Optional[List[str]] = None, status: str = "trial",
+                 user_email: str = DEFAULT_SENDER, dedupe: bool = DEDUP_ON_DISPATCH, max_age_hours: Optional[float] = None,
+                 budget: Optional[int] = None, notifier: Optional[Notifier] = None) -> Dict[str, Any]:
+    """Plans and queues a scan without touching the UI; messages go to the notifier, counts to the result."""
+    notifier = notifier or Notifier()
+    result: Dict[str, Any] = {"project_id": project_id, "status": status, "ok": False}
 
     if status == "blocked":
-        st.error("⛔ Проект заблоковано.")
-        return False
+        notifier.error("⛔ Проект заблоковано.")
+        result["skipped"] = "blocked"
+        return result
 
     if not models:
         models = ["Perplexity"]
@@ -39,46 +147,76 @@ def n8n_trigger_analysis(project_id, keywords, brand_name, models=None) -> bool:
     if isinstance(keywords, str):
         keywords_list = [keywords]
     else:
-        keywords_list = keywords
+        keywords_list = list(keywords)
 
-    # Trial logic - перевірка на повторне сканування
-    if status == "trial":
-        try:
-            kw_resp = db.client.table("keywords").select("id, keyword_text").eq("project_id", project_id).in_("keyword_text", keywords_list).execute()
-            kw_map = {item['keyword_text']: item['id'] for item in kw_resp.data} if kw_resp.data else {}
-
-            allowed_keywords = []
-            blocked_keywords = []
-
-            for kw_text in keywords_list:
-                kw_id = kw_map.get(kw_text)
-                if kw_id:
-                    existing_scan = db.client.table("scan_results").select("id", count="exact").eq("keyword_id", kw_id).limit(1).execute()
-                    if existing_scan.count and existing_scan.count > 0:
-                        blocked_keywords.append(kw_text)
-                    else:
-                        allowed_keywords.append(kw_text)
-                else:
-                    allowed_keywords.append(kw_text)
-
-            if blocked_keywords:
-                st.warning(f"🔒 Запити вже проскановані (Trial ліміт): {', '.join(blocked_keywords[:3])}...")
-
-            if not allowed_keywords:
-                st.error("⛔ Всі запити вже проскановані.")
-                return False
-
-            keywords_list = allowed_keywords
-        except Exception as e:
-            st.warning("⚠️ Не вдалося перевірити ліміти Trial.")
-            return False
+    # Near-duplicates in one batch would each cost a paid scan per provider
+    if dedupe and len(keywords_list) > 1:
+        keywords_list, skipped = collapse_near_duplicates(keywords_list, len(models))
+        result["duplicates"] = len(skipped)
+        if skipped:
+            notifier.info(f"🔁 Пропущено {len(skipped)} схожих запитів — заощаджено {len(skipped) * len(models)} сканувань")
+
+    # Delta plan: fresh (keyword, model) pairs are skipped; trial projects never rescan
+    try:
+        plan = plan_scans(project_id, keywords_list, models, status=status, max_age_hours=max_age_hours, budget=budget, verify_trial=True)
+    except TrialCheckFailed:
+        notifier.warning("⚠️ Не вдалося перевірити ліміти Trial.")
+        result.update({"skipped": "trial check failed", "error": "trial check failed"})
+        return result
+    result.update({"scans": plan.scans, "skipped_fresh": plan.skipped_fresh, "skipped_budget": plan.skipped_budget})
+
+    if plan.skipped_fresh:
+        if status == "trial":
+            notifier.warning(f"🔒 Запити вже проскановані (Trial ліміт): пропущено {plan.skipped_fresh} сканувань")
+        else:
+            notifier.info(f"⏭ Пропущено {plan.skipped_fresh} свіжих сканувань")
+    if plan.skipped_budget:
+        notifier.info(f"💰 Поза бюджетом: {plan.skipped_budget} сканувань")
+
+    if not plan.scans:
+        notifier.error("⛔ Всі запити вже проскановані.")
+        result["skipped"] = "no stale keywords"
+        return result
 
     try:
-        user = st.session_state.get("user")
-        user_email = user.email if user else "no-reply@virshi.ai"
+        tickets = {}
+        for ui_model_name, model_keywords in plan.by_model.items():
+            tickets.update(submit_analysis(project_id, model_keywords, brand_name, [ui_model_name], user_email, priority=status))
+        rejected = [ui_model_name for ui_model_name, ticket in tickets.items() if ticket is None]
+        for ui_model_name in rejected:
+            notifier.warning(f"⏳ Черга аналізу переповнена ({ui_model_name}). Спробуйте пізніше.")
+
+        success_count = len(tickets) - len(rejected)
+        backlog = dispatcher.backlog(project_id)
+        if success_count and backlog["project_queued"] > len(tickets):
+            notifier.info(f"📬 У черзі: {backlog['project_queued']} пакетів, орієнтовно {backlog['eta_seconds']} с")
 
-        # Отримання whitelist
-        clean_assets = []
+        result.update({"ok": success_count > 0, "tickets": {m: t for m, t in tickets.items() if t is not None}, "rejected": rejected})
+    except Exception as e:
+        record_error(e)
+        notifier.error(f"Critical error: {e}")
+        result["error"] = str(e)
+    return result
+
+def scan_project(project_id: str, models: Optional[List[str]] = None, dedupe: bool = DEDUP_ON_DISPATCH, max_age_hours: Optional[float] = None,
+                 budget: Optional[int] = None, notifier: Optional[Notifier] = None) -> Dict[str, Any]:
+    """Headless scan of all active keywords, with the project's own status and owner (scheduler, batch CLI)."""
+    project = get_project(project_id)
+    if not project:
+        return {"project_id": project_id, "ok": False, "skipped": "missing project"}
+
+    owner = get_user_profile(project["user_id"]) if project.get("user_id") else None
+    keywords = [k["keyword_text"] for k in get_project_keywords(project_id)]
+    if not keywords:
+        return {"project_id": project_id, "ok": False, "skipped": "no keywords"}
+    return run_analysis(project_id, keywords, project.get("brand_name", ""), models, status=project.get("status", "trial"),
+                        user_email=(owner or {}).get("email") or DEFAULT_SENDER, dedupe=dedupe, max_age_hours=max_age_hours,
+                        budget=budget, notifier=notifier)
+
+def get_clean_assets(project_id: str) -> List[str]:
+    # Отримання whitelist
+    clean_assets = []
+    with span("db", "official_assets_whitelist"):
         try:
             assets_resp = db.client.table("official_assets").select("domain_or_url").eq("project_id", project_id).execute()
             if assets_resp.data:
@@ -87,38 +225,36 @@ def n8n_trigger_analysis(project_id, keywords, brand_name, models=None) -> bool:
                     clean = raw_url.replace("https://", "").replace("http://", "").replace("www.", "").rstrip("/")
                     if clean:
                         clean_assets.append(clean)
-        except:
-            pass
+        except Exception as e:
+            record_error(e)
+    return clean_assets
 
-        success_count = 0
+def submit_analysis(project_id: str, keywords_list: List[str], brand_name: str, models: List[str], user_email: str, priority: str = "trial") -> Dict[str, Optional[Ticket]]:
+    """Queues one dispatch per model without touching the UI; the ticket is None for models the queue refused."""
+    clean_assets = get_clean_assets(project_id)
+    tickets: Dict[str, Optional[Ticket]] = {}
 
-        for ui_model_name in models:
-            tech_model_id = MODEL_MAPPING.get(ui_model_name, ui_model_name)
+    for ui_model_name in models:
+        tech_model_id = MODEL_MAPPING.get(ui_model_name, ui_model_name)
 
-            payload = {
-                "project_id": project_id,
-                "keywords": keywords_list,
-                "brand_name": brand_name,
-                "user_email": user_email,
-                "provider": tech_model_id,
-                "models": [tech_model_id],
-                "official_assets": clean_assets
-            }
+        payload = {
+            "project_id": project_id,
+            "brand_name": brand_name,
+            "user_email": user_email,
+            "provider": tech_model_id,
+            "models": [tech_model_id],
+            "official_assets": clean_assets
+        }
+        if CALLBACKS_ENABLED:
+            payload["callback_url"] = CALLBACK_PUBLIC_URL
 
-            try:
-                response = requests.post(N8N_ANALYZE_URL, json=payload, headers=AUTH_HEADER, timeout=60)
-                if response.status_code == 200:
-                    success_count += 1
-                else:
-                    st.error(f"Error ({ui_model_name}): {response.text}")
-            except Exception as inner_e:
-                st.error(f"Failed to start {ui_model_name}: {inner_e}")
-
-        return success_count > 0
-    except Exception as e:
-        st.error(f"Critical error: {e}")
-        return False
+        try:
+            tickets[ui_model_name] = dispatcher.submit(project_id, tech_model_id, payload, keywords_list, priority=priority)
+        except QueueFull:
+            tickets[ui_model_name] = None
+    return tickets
 
+@instrument("webhook")
 def trigger_ai_recommendation(user, project, category, context_text) -> str:
     payload = {
         "timestamp": datetime.now().isoformat(),
@@ -134,6 +270,7 @@ def trigger_ai_recommendation(user, project, category, context_text) -> str:
 
     try:
         response = requests.post(N8N_RECO_URL, json=payload, headers=AUTH_HEADER, timeout=120)
+        record_payload(len(response.request.body or b""))
         if response.status_code == 200:
             try:
                 data = response.json()
@@ -141,6 +278,8 @@ def trigger_ai_recommendation(user, project, category, context_text) -> str:
             except:
                 return response.text
         else:
+            record_error(f"HTTP {response.status_code}")
             return f"<p style='color:red;'>Error: {response.status_code}</p>"
     except Exception as e:
+        record_error(e)
         return f"<p style='color:red;'>Connection Error: {e}</p>"
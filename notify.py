@@ -0,0 +1,52 @@
+"""
+User-facing messages from the data and dispatch layers, independent of the UI that shows them
+"""
+
+import logging
+from typing import List, Tuple
+
+class Notifier:
+    """Base notifier: drops messages. Subclasses route them to the UI, a log or a result."""
+
+    def info(self, message: str) -> None:
+        self.emit("info", message)
+
+    def warning(self, message: str) -> None:
+        self.emit("warning", message)
+
+    def error(self, message: str) -> None:
+        self.emit("error", message)
+
+    def success(self, message: str) -> None:
+        self.emit("success", message)
+
+    def emit(self, level: str, message: str) -> None:
+        pass
+
+class StreamlitNotifier(Notifier):
+    def emit(self, level: str, message: str) -> None:
+        import streamlit as st
+        getattr(st, level)(message)
+
+class LogNotifier(Notifier):
+    LEVELS = {"info": logging.INFO, "success": logging.INFO, "warning": logging.WARNING, "error": logging.ERROR}
+
+    def __init__(self, logger: logging.Logger = logging.getLogger("virshi")):
+        self.logger = logger
+
+    def emit(self, level: str, message: str) -> None:
+        self.logger.log(self.LEVELS.get(level, logging.INFO), message)
+
+class CollectingNotifier(Notifier):
+    """Keeps messages for a structured result (batch CLI, workers)."""
+
+    def __init__(self):
+        self.messages: List[Tuple[str, str]] = []
+
+    def emit(self, level: str, message: str) -> None:
+        self.messages.append((level, message))
+
+    def as_list(self) -> List[dict]:
+        return [{"level": level, "message": message} for level, message in self.messages]
+
+ui = StreamlitNotifier()
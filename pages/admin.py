@@ -0,0 +1,79 @@
+"""
+Admin page: runtime telemetry and memory
+"""
+
+import streamlit as st
+import pandas as pd
+from telemetry import registry, instrument
+from database import get_single_flight_stats, get_scan_cache_stats
+from sessions import session_stats, evict_idle, process_rss
+from cache import shared_cache
+from dedup import stats as dedup_stats
+
+@instrument("page")
+def render_admin_page():
+    st.title("🛠 Адміністрування")
+
+    if st.session_state.get("role") != "admin":
+        st.error("⛔ Доступ лише для адміністраторів")
+        return
+
+    st.markdown("### ⏱ Телеметрія процесу")
+    rows = registry.snapshot()
+
+    if rows:
+        kinds = sorted({r["kind"] for r in rows})
+        selected_kinds = st.multiselect("Тип", kinds, default=kinds)
+        df = pd.DataFrame([r for r in rows if r["kind"] in selected_kinds])
+        df = df.sort_values("p95_ms", ascending=False)
+        st.dataframe(df, use_container_width=True, hide_index=True)
+        st.caption("p50/p95 оцінені з гістограми (інтерполяція в межах бакета); понад 60 с показується 60000 мс")
+    else:
+        st.info("Даних ще немає")
+
+    st.markdown("### 🔀 Об'єднані запити (single-flight)")
+    flight_stats = get_single_flight_stats()
+    if flight_stats:
+        st.dataframe(pd.DataFrame([{"table": t, **v} for t, v in sorted(flight_stats.items())]), use_container_width=True, hide_index=True)
+    else:
+        st.info("Даних ще немає")
+
+    st.markdown("### 🗄 Спільний кеш")
+    cache_stats = shared_cache.get_stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Бекенд", cache_stats["backend"])
+    lookups = cache_stats["hits"] + cache_stats["misses"]
+    col2.metric("Hit rate", f"{100 * cache_stats['hits'] / lookups:.0f}%" if lookups else "—")
+    col3.metric("Інвалідацій", cache_stats["invalidations"])
+    col4.metric("Помилок", cache_stats["errors"])
+
+    st.markdown("### 🔁 Схожі запити")
+    col1, col2 = st.columns(2)
+    col1.metric("Позначено дублікатів", dedup_stats["duplicates_flagged"])
+    col2.metric("Заощаджено сканувань", dedup_stats["scans_avoided"])
+
+    st.markdown("### 🧠 Пам'ять сесій")
+    sessions = session_stats()
+    cache = get_scan_cache_stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("RSS процесу", f"{process_rss() / 2**20:.0f} MB")
+    col2.metric("Активних сесій", len(sessions))
+    col3.metric("Стан сесій", f"{sum(s['bytes'] for s in sessions) / 2**20:.1f} MB")
+    col4.metric("Кеш сканувань", f"{cache['bytes'] / 2**20:.1f} MB", help=f"{cache['projects']} проектів, {cache['rows']} рядків")
+    if sessions:
+        df = pd.DataFrame(sessions).sort_values("bytes", ascending=False)
+        st.dataframe(df, use_container_width=True, hide_index=True)
+    if st.button("Звільнити кеш неактивних сесій"):
+        released = evict_idle()
+        st.success(f"Звільнено ~{released / 1024:.0f} KB")
+
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        if st.button("Скинути лічильники"):
+            registry.reset()
+            st.rerun()
+
+    with st.expander("Prometheus"):
+        metrics_text = registry.prometheus()
+        st.code(metrics_text, language="text")
+        st.download_button("⬇️ metrics.txt", data=metrics_text, file_name="metrics.txt", mime="text/plain")
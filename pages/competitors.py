@@ -5,7 +5,9 @@ Competitors analysis page
 import streamlit as st
 import pandas as pd
 from database import get_scan_results
+from telemetry import instrument
 
+@instrument("page")
 def render_competitors_page():
     st.title("👥 Конкуренти")
 
@@ -5,33 +5,14 @@ Dashboard page
 import streamlit as st
 import pandas as pd
 from database import get_scan_results, get_project_keywords
-from components import render_metric_donut, render_status_badge
-from config import METRIC_TOOLTIPS
-
-def calculate_metrics(scan_results, brand_name: str):
-    if not scan_results:
-        return {"sov": 0, "official": 0, "sentiment": "N/A", "position": 0, "presence": 0, "domain": 0}
-
-    total_scans = len(scan_results)
-    brand_mentions = sum(1 for s in scan_results if brand_name.lower() in str(s.get("mentioned_brands", "")).lower())
-    official_links = sum(1 for s in scan_results if s.get("links_to_official_site", False))
-
-    sentiments = [s.get("sentiment", "neutral") for s in scan_results]
-    sentiment_counts = pd.Series(sentiments).value_counts().to_dict()
-    dominant_sentiment = max(sentiment_counts, key=sentiment_counts.get) if sentiment_counts else "neutral"
-
-    positions = [s.get("brand_position") for s in scan_results if s.get("brand_position")]
-    avg_position = round(sum(positions) / len(positions), 1) if positions else 0
-
-    return {
-        "sov": round((brand_mentions / total_scans) * 100, 1) if total_scans else 0,
-        "official": round((official_links / total_scans) * 100, 1) if total_scans else 0,
-        "sentiment": dominant_sentiment.capitalize(),
-        "position": avg_position,
-        "presence": round((brand_mentions / total_scans) * 100, 1) if total_scans else 0,
-        "domain": round((official_links / total_scans) * 100, 1) if total_scans else 0
-    }
-
+from components import render_metric_donut, render_status_badge, render_trend_chart
+from config import METRIC_TOOLTIPS, PROVIDER_MAPPING
+from metrics import calculate_metrics
+from utils import partition_by_provider
+from trends import refresh_rollups_async, get_trend, GRANULARITIES
+from telemetry import instrument
+
+@instrument("page")
 def render_dashboard():
     st.title("🚀 Дашборд")
 
@@ -78,6 +59,44 @@ def render_dashboard():
 
     st.divider()
 
+    # Provider comparison: partitions of the same fetch
+    st.markdown("### 🤖 Порівняння провайдерів")
+    partitions = partition_by_provider(scan_results)
+    providers = list(dict.fromkeys(PROVIDER_MAPPING.values())) + sorted(p for p in partitions if p not in PROVIDER_MAPPING.values())
+
+    for col, provider in zip(st.columns(len(providers)), providers):
+        provider_metrics = calculate_metrics(partitions.get(provider, []), brand_name)
+        with col:
+            with st.container(border=True):
+                st.markdown(f"**{provider}**")
+                st.caption(f"Сканувань: {len(partitions.get(provider, []))}")
+                st.metric("Share of Voice", f"{provider_metrics['sov']}%")
+                st.metric("Official Links", f"{provider_metrics['official']}%")
+                st.metric("Sentiment", provider_metrics["sentiment"])
+                st.metric("Avg Position", provider_metrics["position"])
+
+    st.divider()
+
+    # Trends
+    st.markdown("### 📈 Динаміка")
+    # Rollups are brought up to date off the render path; this rerun shows what is stored
+    refreshing = refresh_rollups_async(project["id"], brand_name)
+
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        granularity = st.radio("Період", list(GRANULARITIES), format_func=GRANULARITIES.get, horizontal=True, key="trend_granularity")
+    with col2:
+        trend_metrics = {"sov": "Share of Voice", "official": "Official Links", "positive": "Positive Sentiment", "position": "Avg Position"}
+        trend_metric = st.selectbox("Метрика", list(trend_metrics), format_func=trend_metrics.get, key="trend_metric")
+
+    trend = get_trend(project["id"], granularity)
+    if trend.empty:
+        st.info("⏳ Тренд оновлюється, оновіть сторінку за хвилину" if refreshing else "Недостатньо даних для побудови тренду")
+    else:
+        st.plotly_chart(render_trend_chart(trend, trend_metric), use_container_width=True)
+
+    st.divider()
+
     # Keywords table
     st.markdown("### 📝 Останні запити")
     keywords = get_project_keywords(project["id"])
@@ -4,9 +4,18 @@ Keywords management page
 
 import streamlit as st
 import pandas as pd
-from database import get_project_keywords, create_keywords
-from n8n.webhooks import n8n_trigger_analysis
+from datetime import datetime, timezone
+from database import get_project_keywords, create_keywords, get_recent_analysis_runs, get_project_schedule, save_project_schedule
+from n8n.webhooks import n8n_trigger_analysis, dispatcher
+from utils import get_ui_provider
+from dedup import split_near_duplicates, remember_keywords
+from scheduler import next_run_time
+from scan_planner import plan_scans
+from config import MODEL_MAPPING, SCHEDULE_PRESETS, SCAN_FRESHNESS_PRESETS, DEDUP_ON_DISPATCH, ANALYSIS_RUN_STALE_SECONDS
+from telemetry import instrument
+from sessions import compact_keywords
 
+@instrument("page")
 def render_keywords_page():
     st.title("📝 Перелік запитів")
 
@@ -19,13 +28,45 @@ def render_keywords_page():
     with st.expander("➕ Додати нові запити"):
         new_kw = st.text_area("Введіть запити (один на рядок)")
         col1, col2 = st.columns([1, 3])
+        with col2:
+            merge_duplicates = st.checkbox("Пропускати схожі запити", value=True, help="Запити, що відрізняються лише порядком слів, пунктуацією чи відмінком")
         with col1:
             if st.button("Додати", type="primary"):
                 if new_kw:
                     kw_list = [k.strip() for k in new_kw.split("\n") if k.strip()]
-                    if create_keywords(project["id"], kw_list):
-                        st.success(f"Додано {len(kw_list)} запитів")
-                        st.rerun()
+                    existing = [k["keyword_text"] for k in get_project_keywords(project["id"])]
+                    unique, duplicates = split_near_duplicates(project["id"], kw_list, existing)
+                    to_add = unique if merge_duplicates else kw_list
+
+                    if to_add and create_keywords(project["id"], to_add):
+                        remember_keywords(project["id"], to_add)
+                        st.success(f"Додано {len(to_add)} запитів")
+                        if not duplicates:
+                            st.rerun()
+                    if duplicates:
+                        st.warning(f"🔁 Схожі запити ({len(duplicates)}): " + "; ".join(f"{d} ≈ {m}" for d, m in list(duplicates.items())[:5]))
+
+    # Recurring scans
+    with st.expander("⏰ Розклад сканування"):
+        render_schedule_form(project)
+
+    # Analyses waiting in the dispatch queue or for n8n's completion callback; older ones count as lost
+    runs = get_recent_analysis_runs(project["id"], max_age_seconds=ANALYSIS_RUN_STALE_SECONDS)
+    queued = [r for r in runs if r.get("status") == "queued"]
+    running = [r for r in runs if r.get("status") == "running"]
+    failed = [r for r in runs if r.get("status") == "failed"]
+    if queued or running or failed:
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            for run in queued:
+                st.info(f"📬 У черзі: {get_ui_provider(run.get('provider'))} ({run.get('keywords_count', 0)} запитів)")
+            for run in running:
+                st.info(f"⏳ Аналіз виконується: {get_ui_provider(run.get('provider'))} ({run.get('keywords_count', 0)} запитів)")
+            for run in failed:
+                st.error(f"❌ Не вдалося запустити: {get_ui_provider(run.get('provider'))} ({run.get('keywords_count', 0)} запитів)")
+        with col2:
+            if st.button("🔄 Оновити"):
+                st.rerun()
 
     st.divider()
 
@@ -51,24 +92,67 @@ def render_keywords_page():
         with col3:
             st.caption(kw.get("created_at", "")[:10])
 
-        if selected:
-            if "selected_kws" not in st.session_state:
-                st.session_state["selected_kws"] = []
-            if kw['keyword_text'] not in st.session_state["selected_kws"]:
-                st.session_state["selected_kws"].append(kw['keyword_text'])
+        if selected and kw['keyword_text'] not in st.session_state.get("selected_kws", ()):
+            st.session_state["selected_kws"] = compact_keywords((*st.session_state.get("selected_kws", ()), kw['keyword_text']))
 
     if "selected_kws" in st.session_state and st.session_state["selected_kws"]:
         st.divider()
         st.markdown(f"**Обрано:** {len(st.session_state['selected_kws'])}")
 
-        if st.button("▶️ Запустити аналіз", type="primary"):
+        if dispatcher.backlog()["saturated"]:
+            st.warning("⏳ Черга аналізу майже заповнена — запуск може бути відкладено.")
+
+        models = ["Google Gemini"]
+        col1, col2 = st.columns(2)
+        with col1:
+            freshness = st.selectbox("Пропускати скановані за останні", list(SCAN_FRESHNESS_PRESETS), index=2, key="scan_freshness")
+        with col2:
+            budget = st.number_input("Ліміт сканувань (0 — без ліміту)", min_value=0, value=0, step=10, key="scan_budget")
+        max_age_hours = SCAN_FRESHNESS_PRESETS[freshness]
+        dedupe = st.checkbox("Не сканувати схожі запити (залишити один із групи)", value=DEDUP_ON_DISPATCH, key="scan_dedupe")
+
+        plan = plan_scans(project["id"], st.session_state["selected_kws"], models, status=project.get("status", "trial"),
+                          max_age_hours=max_age_hours, budget=budget or None)
+        st.caption(f"Буде виконано {plan.scans} сканувань, пропущено свіжих: {plan.skipped_fresh}, поза лімітом: {plan.skipped_budget}")
+
+        if st.button("▶️ Запустити аналіз", type="primary", disabled=not plan.scans):
             with st.spinner("Запуск..."):
                 success = n8n_trigger_analysis(
                     project["id"],
                     st.session_state["selected_kws"],
                     project["brand_name"],
-                    ["Google Gemini"]
+                    models,
+                    dedupe=dedupe,
+                    max_age_hours=max_age_hours,
+                    budget=budget or None
                 )
                 if success:
                     st.success("Аналіз запущено!")
-                    st.session_state["selected_kws"] = []
+                    st.session_state["selected_kws"] = ()
+
+def render_schedule_form(project):
+    schedule = get_project_schedule(project["id"]) or {}
+    if project.get("status") == "trial":
+        st.caption("🔒 Trial: за розкладом скануються лише нові запити.")
+
+    presets = {**SCHEDULE_PRESETS, "Власний cron": ""}
+    current_cron = schedule.get("cron", SCHEDULE_PRESETS["Щопонеділка о 06:00"])
+    preset_names = list(presets)
+    preset_index = next((i for i, name in enumerate(preset_names) if presets[name] == current_cron), len(preset_names) - 1)
+
+    enabled = st.checkbox("Увімкнено", value=schedule.get("enabled", False), key="schedule_enabled")
+    preset = st.selectbox("Періодичність", preset_names, index=preset_index, key="schedule_preset")
+    cron = presets[preset] or st.text_input("Cron (UTC)", value=current_cron, key="schedule_cron")
+    providers = st.multiselect("Моделі", list(MODEL_MAPPING), default=schedule.get("providers") or ["Perplexity"], key="schedule_providers")
+
+    if schedule.get("next_run_at") and schedule.get("enabled"):
+        st.caption(f"Наступний запуск: {str(schedule['next_run_at'])[:16].replace('T', ' ')} UTC")
+
+    if st.button("Зберегти розклад"):
+        try:
+            next_run = next_run_time(cron, project["id"], datetime.now(timezone.utc)).isoformat() if enabled else None
+        except ValueError as e:
+            st.error(f"Невірний cron: {e}")
+            return
+        if save_project_schedule(project["id"], cron, providers or ["Perplexity"], enabled, next_run):
+            st.success("Розклад збережено")
@@ -6,7 +6,10 @@ import streamlit as st
 import time
 from database import create_project, create_keywords, add_official_asset
 from n8n.webhooks import n8n_generate_prompts, n8n_trigger_analysis
+from sessions import compact_project
+from telemetry import instrument
 
+@instrument("page")
 def render_onboarding():
     st.markdown("## 🚀 Налаштування Проекту")
 
@@ -49,7 +52,7 @@ def render_onboarding():
                     with st.spinner("Генерація запитів..."):
                         prompts = n8n_generate_prompts(brand, domain, industry, products)
                         if prompts:
-                            st.session_state["generated_prompts"] = prompts
+                            st.session_state["generated_prompts"] = tuple(prompts)
                             st.session_state["onboarding_step"] = 2
                             st.rerun()
                         else:
@@ -61,7 +64,7 @@ def render_onboarding():
         elif step == 2:
             st.subheader("Крок 2: Перевірка та запуск")
 
-            prompts = st.session_state.get("generated_prompts", [])
+            prompts = st.session_state.get("generated_prompts", ())
 
             if not prompts:
                 st.warning("Список порожній")
@@ -70,7 +73,23 @@ def render_onboarding():
                     st.rerun()
                 return
 
-            st.markdown("Оберіть запити для аналізу:")
+            col_hint, col_regen = st.columns([3, 1])
+            with col_hint:
+                st.markdown("Оберіть запити для аналізу:")
+            with col_regen:
+                # Identical inputs are served from the prompt cache; regeneration is explicit
+                if st.button("🔄 Згенерувати заново", use_container_width=True):
+                    with st.spinner("Генерація запитів..."):
+                        new_prompts = n8n_generate_prompts(
+                            st.session_state.get("temp_brand", ""),
+                            st.session_state.get("temp_domain", ""),
+                            st.session_state.get("temp_industry", ""),
+                            st.session_state.get("temp_products", ""),
+                            force=True
+                        )
+                    if new_prompts:
+                        st.session_state["generated_prompts"] = tuple(new_prompts)
+                        st.rerun()
             st.markdown("---")
 
             selected_kws = []
@@ -106,7 +125,7 @@ def render_onboarding():
                             new_project = create_project(user_id, brand_name, domain_name, region_val)
 
                             if new_project:
-                                st.session_state["current_project"] = new_project
+                                st.session_state["current_project"] = compact_project(new_project)
                                 proj_id = new_project["id"]
 
                                 # Add official domain
@@ -119,17 +138,14 @@ def render_onboarding():
                                 # Add keywords
                                 create_keywords(proj_id, selected_kws)
 
-                                # Trigger analysis
+                                # Trigger analysis: the dispatcher chunks and paces the batch
                                 progress = st.progress(0, text="Ініціалізація...")
-                                for i, kw in enumerate(selected_kws):
-                                    progress.progress((i + 1) / len(selected_kws), text=f"Аналіз: {kw[:30]}...")
-                                    n8n_trigger_analysis(
-                                        proj_id,
-                                        [kw],
-                                        brand_name,
-                                        ["Google Gemini"]
-                                    )
-                                    time.sleep(0.5)
+                                n8n_trigger_analysis(
+                                    proj_id,
+                                    selected_kws,
+                                    brand_name,
+                                    ["Google Gemini"]
+                                )
 
                                 progress.progress(1.0, text="✅ Готово!")
                                 time.sleep(1)
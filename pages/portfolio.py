@@ -0,0 +1,59 @@
+"""
+Portfolio page: headline metrics for every project
+"""
+
+import streamlit as st
+import pandas as pd
+from database import get_portfolio_totals
+from metrics import metrics_from_totals, empty_totals
+from telemetry import instrument
+
+@instrument("page")
+def render_portfolio_page():
+    st.title("🗂 Портфель проектів")
+
+    projects = st.session_state.get("projects", [])
+    if not projects:
+        st.info("Проекти відсутні")
+        return
+
+    # One grouped query for all projects
+    totals = get_portfolio_totals([p["id"] for p in projects])
+
+    rows = []
+    for p in projects:
+        project_totals = totals.get(p["id"], empty_totals())
+        m = metrics_from_totals(project_totals)
+        rows.append({
+            "Бренд": p.get("brand_name"),
+            "Статус": str(p.get("status", "trial")).upper(),
+            "Сканувань": project_totals.get("scans", 0),
+            "SoV, %": m["sov"],
+            "Official, %": m["official"],
+            "Sentiment": m["sentiment"],
+            "Avg Position": m["position"]
+        })
+
+    df = pd.DataFrame(rows).sort_values("SoV, %", ascending=False)
+    st.dataframe(
+        df,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "SoV, %": st.column_config.ProgressColumn("SoV, %", min_value=0, max_value=100, format="%.1f"),
+            "Official, %": st.column_config.ProgressColumn("Official, %", min_value=0, max_value=100, format="%.1f")
+        }
+    )
+
+    st.divider()
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        names = [p["brand_name"] for p in projects]
+        selected = st.selectbox("Відкрити проект", names, key="portfolio_open")
+    with col2:
+        st.markdown("<br>", unsafe_allow_html=True)
+        if st.button("Відкрити", use_container_width=True):
+            # Applied by the sidebar before its project selector is drawn
+            st.session_state["pending_project_id"] = next(p["id"] for p in projects if p["brand_name"] == selected)
+            st.session_state["current_page"] = "Дашборд"
+            st.rerun()
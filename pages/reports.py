@@ -3,8 +3,13 @@ AI Reports page
 """
 
 import streamlit as st
+import os
 from n8n.webhooks import trigger_ai_recommendation
+from export import export_scan_results, remove_export, EXPORT_FORMATS, MIME_TYPES
+from telemetry import instrument, record_error
+from config import EXPORT_DOWNLOAD_MAX_MB
 
+@instrument("page")
 def render_reports_page():
     st.title("📊 AI Звіти")
 
@@ -39,3 +44,47 @@ def render_reports_page():
             st.divider()
             st.markdown("### 📄 Результат")
             st.markdown(html_report, unsafe_allow_html=True)
+
+    st.divider()
+    render_export_section(project)
+
+def render_export_section(project):
+    st.markdown("### 📥 Експорт результатів")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        fmt = st.radio("Формат", list(EXPORT_FORMATS), format_func=EXPORT_FORMATS.get, horizontal=True, key="export_format")
+    with col2:
+        with_keywords = st.checkbox("Додати текст запиту", value=True, key="export_with_keywords")
+
+    # The file is built on click and read into the download button once, in that same rerun; the
+    # temp file is deleted right away and the bytes are dropped with the button on the next rerun.
+    if st.button("Підготувати експорт"):
+        progress = st.empty()
+        try:
+            path = export_scan_results(project["id"], fmt, with_keywords, on_page=lambda n: progress.caption(f"Експортовано рядків: {n}"))
+        except Exception as e:
+            record_error(e)
+            progress.empty()
+            st.error(f"❌ Не вдалося підготувати експорт: {e}")
+            return
+        progress.empty()
+        if not path:
+            st.info("Дані для експорту відсутні")
+            return
+        try:
+            size = os.path.getsize(path)
+            if size > EXPORT_DOWNLOAD_MAX_MB * 1024 * 1024:
+                st.warning(f"Файл завеликий для завантаження з браузера ({size / 2 ** 20:.0f} MB). "
+                           f"Скористайтеся CLI: python -m virshi batch export --projects {project['id']} --format {fmt}")
+                return
+            with open(path, "rb") as f:
+                data = f.read()
+        finally:
+            remove_export(path)
+        st.download_button(
+            "⬇️ Завантажити",
+            data=data,
+            file_name=f"{project.get('brand_name', 'project')}_scan_results.{fmt}",
+            mime=MIME_TYPES.get(fmt, "application/octet-stream")
+        )
@@ -1,10 +1,16 @@
 """
-Official sources page
+Official and cited sources page
 """
 
 import streamlit as st
+import pandas as pd
 from database import get_official_assets, add_official_asset
+from citations import get_citation_index
+from components import render_share_chart
+from trends import GRANULARITIES
+from telemetry import instrument
 
+@instrument("page")
 def render_sources_page():
     st.title("🔗 Офіційні джерела")
 
@@ -32,3 +38,51 @@ def render_sources_page():
             st.markdown(f"{i+1}. `{asset}`")
     else:
         st.info("Джерела відсутні")
+
+    st.divider()
+    render_cited_sources(project, assets)
+
+def render_cited_sources(project, assets):
+    st.markdown("### 📚 Цитовані джерела")
+    index = get_citation_index(project["id"])
+    if not index.citations:
+        st.info("У відповідях ШІ ще немає посилань на джерела")
+        return
+
+    counts = index.domain_counts()
+    official = index.official_domains(assets)
+    official_citations = sum(count for domain, count in counts if domain in official)
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Цитувань", index.citations)
+    col2.metric("Доменів", len(counts))
+    col3.metric("Відповідей з джерелами", f"{round(index.scans_with_citations / index.scans * 100, 1) if index.scans else 0}%")
+    col4.metric("Офіційні", f"{round(official_citations / index.citations * 100, 1)}%")
+
+    top_n = st.slider("Топ доменів", 5, 100, 20, step=5, key="sources_top_n")
+    top = index.top_domains(top_n)
+    df = pd.DataFrame([{
+        "Домен": domain,
+        "Цитувань": count,
+        "Частка, %": round(count / index.citations * 100, 1),
+        "Офіційний": "✅" if domain in official else ""
+    } for domain, count in top])
+    st.dataframe(
+        df,
+        use_container_width=True,
+        hide_index=True,
+        column_config={"Частка, %": st.column_config.ProgressColumn("Частка, %", min_value=0, max_value=100, format="%.1f")}
+    )
+
+    st.markdown("#### 📈 Частка у часі")
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        granularity = st.radio("Період", list(GRANULARITIES), index=1, format_func=GRANULARITIES.get, horizontal=True, key="sources_granularity")
+    with col2:
+        names = [domain for domain, _ in top]
+        selected = st.multiselect("Домени", names, default=names[:5], key="sources_domains")
+    share = index.share_over_time(selected, granularity)
+    if share.empty:
+        st.info("Оберіть домени")
+    else:
+        st.plotly_chart(render_share_chart(share), use_container_width=True)
@@ -0,0 +1,113 @@
+"""
+Dev-mode query tracker: per-rerun query budgets and N+1 detection
+"""
+
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, List, Optional
+from config import N_PLUS_ONE_THRESHOLD
+
+# Builder methods whose first argument is a column name (part of the query shape, unlike values)
+COLUMN_METHODS = {"select", "eq", "neq", "gt", "gte", "lt", "lte", "like", "ilike", "is_", "in_", "contains", "order", "upsert"}
+# Attribute values that are data, not a next step of the query
+PLAIN_VALUES = (str, bytes, int, float, bool, type(None), dict, list, tuple, set)
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+class RunStats:
+    def __init__(self, label: str):
+        self.label = label
+        self.shapes: Counter = Counter()
+
+    @property
+    def queries(self) -> int:
+        return sum(self.shapes.values())
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[tuple]:
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+    def violations(self, budget: Optional[int] = None, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[str]:
+        problems = []
+        if budget is not None and self.queries > budget:
+            problems.append(f"{self.label}: {self.queries} queries, budget {budget}")
+        for shape, n in self.repeated(threshold):
+            problems.append(f"{self.label}: possible N+1, {n}× {shape}")
+        return problems
+
+_local = threading.local()
+
+def begin_run(label: str = "") -> RunStats:
+    _local.run = RunStats(label)
+    return _local.run
+
+def current_run() -> Optional[RunStats]:
+    return getattr(_local, "run", None)
+
+def end_run() -> Optional[RunStats]:
+    run = current_run()
+    _local.run = None
+    return run
+
+def _record(shape: str) -> None:
+    run = current_run()
+    if run is not None:
+        run.shapes[shape] += 1
+
+class _TrackedQuery:
+    def __init__(self, builder: Any, parts: List[str]):
+        self._builder = builder
+        self._parts = parts
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._builder, name)
+        if isinstance(attr, PLAIN_VALUES):
+            return attr
+        if not callable(attr):
+            # Builder properties such as .not_ return the next builder: keep tracking through them
+            return _TrackedQuery(attr, self._parts + [name])
+
+        def call(*args, **kwargs):
+            if name == "execute":
+                _record(".".join(self._parts))
+                return attr(*args, **kwargs)
+            if name in COLUMN_METHODS and args and isinstance(args[0], str):
+                part = f"{name}({args[0]})"
+            elif name == "range" and args:
+                # Pages of one paginated read are distinct queries, not an N+1
+                part = f"range({args[0]})"
+            else:
+                part = name
+            return _TrackedQuery(attr(*args, **kwargs), self._parts + [part])
+        return call
+
+class TrackedClient:
+    def __init__(self, client: Any):
+        self._client = client
+
+    def table(self, name: str) -> _TrackedQuery:
+        return _TrackedQuery(self._client.table(name), [name])
+
+    def rpc(self, fn: str, params: dict) -> _TrackedQuery:
+        return _TrackedQuery(self._client.rpc(fn, params), [f"rpc:{fn}"])
+
+    def __getattr__(self, name: str):
+        return getattr(self._client, name)
+
+def install(db) -> None:
+    if not isinstance(db.client, TrackedClient):
+        db.client = TrackedClient(db.client)
+
+@contextmanager
+def budget(max_queries: Optional[int] = None, label: str = "test", threshold: int = N_PLUS_ONE_THRESHOLD):
+    """Fails the block if it issues more than max_queries queries or repeats a query shape."""
+    previous = current_run()
+    run = begin_run(label)
+    try:
+        yield run
+    finally:
+        _local.run = previous
+    problems = run.violations(max_queries, threshold)
+    if problems:
+        raise QueryBudgetExceeded("; ".join(problems))
@@ -0,0 +1,107 @@
+"""
+Delta scan planner: only stale (keyword, provider) pairs are dispatched
+"""
+
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Tuple
+from database import get_scan_results, get_project_keywords, get_scanned_keyword_ids
+from cache import shared_cache
+from utils import get_ui_provider
+from config import MODEL_MAPPING, SCAN_FRESHNESS_HOURS, DEFAULT_FRESHNESS_HOURS
+
+_index_cache: Dict[str, Tuple[int, Dict[Tuple[Any, str], str]]] = {}
+_index_lock = threading.Lock()
+
+class TrialCheckFailed(Exception):
+    """The scans of a trial project's keywords could not be read; nothing may be dispatched."""
+
+def last_scanned_index(project_id: str) -> Dict[Tuple[Any, str], str]:
+    """(keyword_id, UI provider) -> latest created_at; rebuilt when the project's scan_results generation changes."""
+    # Read before the rows: an invalidation in between leaves the index under the older generation
+    generation = shared_cache.generation("scan_results", project_id)
+    with _index_lock:
+        cached = _index_cache.get(project_id)
+        if cached and cached[0] == generation:
+            return cached[1]
+
+    index: Dict[Tuple[Any, str], str] = {}
+    for row in get_scan_results(project_id):
+        if row.get("keyword_id") is None:
+            continue
+        key = (row["keyword_id"], get_ui_provider(row.get("provider")))
+        created_at = str(row.get("created_at") or "")
+        if created_at > index.get(key, ""):
+            index[key] = created_at
+
+    with _index_lock:
+        _index_cache[project_id] = (generation, index)
+    return index
+
+def _parse_ts(value: str) -> Optional[datetime]:
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+class ScanPlan:
+    def __init__(self):
+        self.by_model: Dict[str, List[str]] = {}
+        self.skipped_fresh = 0
+        self.skipped_budget = 0
+
+    @property
+    def scans(self) -> int:
+        return sum(len(kws) for kws in self.by_model.values())
+
+    @property
+    def keywords(self) -> List[str]:
+        return list(dict.fromkeys(kw for kws in self.by_model.values() for kw in kws))
+
+def plan_scans(project_id: str, keywords: List[str], models: List[str], status: str = "active", max_age_hours: Optional[float] = None,
+               budget: Optional[int] = None, now: Optional[datetime] = None, verify_trial: bool = False) -> ScanPlan:
+    """
+    Trial projects never rescan a keyword (on any provider). Otherwise a pair is stale when it was
+    never scanned or its last scan is older than the model's freshness window. The budget keeps
+    the stalest pairs, never-scanned first. verify_trial (set before dispatching) checks the trial
+    rule against the database instead of the cache alone, and raises TrialCheckFailed if it can't.
+    """
+    now = now or datetime.now(timezone.utc)
+    index = last_scanned_index(project_id)
+    ids = {kw["keyword_text"]: kw["id"] for kw in get_project_keywords(project_id)}
+    scanned_keyword_ids = {kw_id for kw_id, _ in index} if status == "trial" else set()
+    if status == "trial" and verify_trial:
+        scanned = get_scanned_keyword_ids(project_id, [ids[kw] for kw in keywords if kw in ids])
+        if scanned is None:
+            raise TrialCheckFailed(project_id)
+        scanned_keyword_ids |= scanned
+
+    candidates = []
+    plan = ScanPlan()
+    for model in models:
+        provider = get_ui_provider(MODEL_MAPPING.get(model, model))
+        hours = max_age_hours if max_age_hours is not None else SCAN_FRESHNESS_HOURS.get(model, DEFAULT_FRESHNESS_HOURS)
+        for kw in keywords:
+            kw_id = ids.get(kw)
+            if status == "trial":
+                if kw_id in scanned_keyword_ids:
+                    plan.skipped_fresh += 1
+                    continue
+                candidates.append((datetime.min.replace(tzinfo=timezone.utc), model, kw))
+                continue
+
+            last = _parse_ts(index.get((kw_id, provider), "")) if kw_id is not None else None
+            if last and now - last < timedelta(hours=hours):
+                plan.skipped_fresh += 1
+                continue
+            candidates.append((last or datetime.min.replace(tzinfo=timezone.utc), model, kw))
+
+    candidates.sort(key=lambda c: c[0])
+    if budget is not None and len(candidates) > budget:
+        plan.skipped_budget = len(candidates) - budget
+        candidates = candidates[:budget]
+
+    for _, model, kw in candidates:
+        plan.by_model.setdefault(model, []).append(kw)
+    return plan
@@ -0,0 +1,276 @@
+"""
+Recurring scan scheduler
+
+    python scheduler.py                      # worker: wake up, dispatch due schedules, sleep
+    python scheduler.py --simulate --days 14 # dry run of the stored schedules on a simulated clock
+"""
+
+import argparse
+import logging
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Callable
+from config import SCHEDULE_POLL_SECONDS, SCHEDULE_JITTER_SECONDS, SCHEDULE_RETRY_SECONDS, SCHEDULE_SEND_TIMEOUT, ROLLUP_SWEEP_SECONDS
+from database import get_due_schedules, get_enabled_schedules, claim_schedule
+from n8n.webhooks import scan_project, dispatcher
+from notify import LogNotifier
+from trends import refresh_all_rollups
+
+logger = logging.getLogger(__name__)
+
+# CRON
+def _parse_field(field: str, lo: int, hi: int) -> set:
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_str = part.split("/", 1)
+            step = int(step_str)
+        if part == "*":
+            start, end = lo, hi
+        elif "-" in part:
+            start, end = (int(x) for x in part.split("-", 1))
+        else:
+            start = int(part)
+            end = hi if step > 1 else start
+        if step < 1 or start < lo or end > hi or start > end:
+            raise ValueError(f"invalid cron field: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+class CronSchedule:
+    """Standard 5-field cron (minute hour day-of-month month day-of-week), evaluated in UTC."""
+
+    def __init__(self, expr: str):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron needs 5 fields: {expr}")
+        self.expr = expr
+        self.minutes = sorted(_parse_field(fields[0], 0, 59))
+        self.hours = sorted(_parse_field(fields[1], 0, 23))
+        self.days = _parse_field(fields[2], 1, 31)
+        self.months = _parse_field(fields[3], 1, 12)
+        # cron: 0 and 7 are Sunday; Python: Monday is 0
+        self.weekdays = {(d + 6) % 7 for d in _parse_field(fields[4], 0, 7)}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _day_matches(self, d: datetime) -> bool:
+        if d.month not in self.months:
+            return False
+        day_ok = d.day in self.days
+        weekday_ok = d.weekday() in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        t = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        for _ in range(366 * 5):
+            if self._day_matches(t):
+                for hour in self.hours:
+                    if hour < t.hour:
+                        continue
+                    for minute in self.minutes:
+                        if hour > t.hour or minute >= t.minute:
+                            return t.replace(hour=hour, minute=minute)
+            t = (t + timedelta(days=1)).replace(hour=0, minute=0)
+        raise ValueError(f"cron never fires: {self.expr}")
+
+def jitter(project_id: str) -> timedelta:
+    # Stable per project, so a project's runs stay evenly spaced while projects spread out
+    return timedelta(seconds=zlib.crc32(str(project_id).encode()) % max(SCHEDULE_JITTER_SECONDS, 1))
+
+def next_run_time(cron: str, project_id: str, after: datetime) -> datetime:
+    return CronSchedule(cron).next_after(after) + jitter(project_id)
+
+def _parse_ts(value: str) -> datetime:
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+# CLOCKS
+class SystemClock:
+    def now(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+class SimulatedClock:
+    def __init__(self, start: datetime):
+        self.current = start
+
+    def now(self) -> datetime:
+        return self.current
+
+    def sleep(self, seconds: float) -> None:
+        self.current += timedelta(seconds=seconds)
+
+# STORES
+class DbScheduleStore:
+    def due(self, now: datetime) -> List[Dict[str, Any]]:
+        return get_due_schedules(now.isoformat())
+
+    def claim(self, schedule_id: str, expected_next_run_at: str, next_run_at: str, last_run_at: Optional[str] = None) -> bool:
+        return claim_schedule(schedule_id, expected_next_run_at, next_run_at, last_run_at)
+
+class MemoryScheduleStore:
+    def __init__(self, schedules: List[Dict[str, Any]]):
+        self.schedules = [dict(s) for s in schedules]
+
+    def due(self, now: datetime) -> List[Dict[str, Any]]:
+        return [dict(s) for s in self.schedules if s.get("enabled") and s.get("next_run_at") and _parse_ts(s["next_run_at"]) <= now]
+
+    def claim(self, schedule_id: str, expected_next_run_at: str, next_run_at: str, last_run_at: Optional[str] = None) -> bool:
+        for s in self.schedules:
+            if s["id"] == schedule_id and s["next_run_at"] == expected_next_run_at:
+                s["next_run_at"] = next_run_at
+                if last_run_at:
+                    s["last_run_at"] = last_run_at
+                return True
+        return False
+
+# DISPATCH
+class ScheduledScanFailed(Exception):
+    """A due run was not (fully) delivered to n8n; the scheduler retries it."""
+
+def dispatch_scheduled_scan(schedule: Dict[str, Any]) -> Dict[str, Any]:
+    """Applies the same rules as a manual run: blocked never scans, trial only scans new keywords, fresh pairs are skipped."""
+    result = scan_project(schedule["project_id"], schedule.get("providers") or ["Perplexity"], dedupe=False, notifier=LogNotifier())
+    tickets = result.get("tickets") or {}
+    result["models"] = list(tickets)
+    if result.get("error") or (result.get("rejected") and not tickets):
+        raise ScheduledScanFailed(result.get("error") or f"dispatch queue full: {', '.join(result['rejected'])}")
+    return result
+
+def settle_scheduled_scan(result: Dict[str, Any], timeout: float) -> None:
+    """Waits for the run's queued chunks to be sent; raises unless n8n accepted every one of them."""
+    tickets = list((result.pop("tickets", None) or {}).values())
+    if not dispatcher.wait(tickets, timeout):
+        raise ScheduledScanFailed(f"chunks still queued after {timeout:.0f} s")
+    failed = sum(ticket.failed for ticket in tickets)
+    if failed:
+        raise ScheduledScanFailed(f"{failed} of {sum(ticket.chunks for ticket in tickets)} chunks not accepted by n8n")
+
+# SCHEDULER
+class ScanScheduler:
+    """
+    Dispatches due schedules; `maintain` (e.g. refresh_all_rollups) runs every maintain_seconds between ticks.
+    A due run is first leased (next_run_at moved retry_seconds ahead, compare-and-set) and
+    dispatched; once every run of the tick is dispatched, `settle` waits (up to send_timeout in
+    total) until each run's chunks were sent, and only a run that settled is moved to the next
+    cron time. A failed dispatch or send, or a worker that dies before that, leaves the lease to
+    expire, so the run is retried. `settle` defaults to settle_scheduled_scan with the default
+    dispatch, and to nothing with a custom one.
+    """
+
+    def __init__(self, store=None, clock=None, dispatch: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+                 maintain: Optional[Callable[[], Any]] = None, maintain_seconds: float = ROLLUP_SWEEP_SECONDS,
+                 retry_seconds: float = SCHEDULE_RETRY_SECONDS, settle: Optional[Callable[[Dict[str, Any], float], None]] = None,
+                 send_timeout: float = SCHEDULE_SEND_TIMEOUT):
+        self.store = store or DbScheduleStore()
+        self.retry_seconds = retry_seconds
+        self.clock = clock or SystemClock()
+        self.dispatch = dispatch or dispatch_scheduled_scan
+        self.settle = settle if settle is not None or dispatch is not None else settle_scheduled_scan
+        self.send_timeout = send_timeout
+        self.maintain = maintain
+        self.maintain_seconds = maintain_seconds
+        self._maintained_at: Optional[datetime] = None
+
+    def _maybe_maintain(self) -> None:
+        now = self.clock.now()
+        if self.maintain is None or (self._maintained_at and (now - self._maintained_at).total_seconds() < self.maintain_seconds):
+            return
+        self._maintained_at = now
+        try:
+            self.maintain()
+        except Exception:
+            logger.exception("scheduler maintenance failed")
+
+    def tick(self) -> List[Dict[str, Any]]:
+        now = self.clock.now()
+        results = []
+        dispatched = []
+        for schedule in self.store.due(now):
+            try:
+                next_run_at = next_run_time(schedule["cron"], schedule["project_id"], now)
+            except ValueError as e:
+                logger.warning("schedule %s skipped: %s", schedule["id"], e)
+                continue
+            # Missed runs (worker down) collapse into this one run; the next run is computed from now
+            missed = self._missed_runs(schedule, now)
+            lease = (now + timedelta(seconds=self.retry_seconds)).isoformat()
+            if not self.store.claim(schedule["id"], schedule["next_run_at"], lease):
+                continue
+            try:
+                result = self.dispatch(schedule)
+            except Exception as e:
+                self._failed(results, schedule, now, lease, e)
+                continue
+            dispatched.append((schedule, lease, missed, next_run_at, result))
+
+        # All runs are queued before waiting on any, so the dispatcher interleaves their projects
+        deadline = time.monotonic() + self.send_timeout
+        for schedule, lease, missed, next_run_at, result in dispatched:
+            if self.settle is not None:
+                try:
+                    self.settle(result, max(0.0, deadline - time.monotonic()))
+                except Exception as e:
+                    self._failed(results, schedule, now, lease, e)
+                    continue
+            # An edit of the schedule meanwhile changed next_run_at: the edit wins
+            self.store.claim(schedule["id"], lease, next_run_at.isoformat(), now.isoformat())
+            result.update({"at": now.isoformat(), "missed": missed, "next_run_at": next_run_at.isoformat()})
+            results.append(result)
+        return results
+
+    @staticmethod
+    def _failed(results: List[Dict[str, Any]], schedule: Dict[str, Any], now: datetime, lease: str, error: Exception) -> None:
+        logger.exception("scheduled scan failed for project %s, retrying at %s", schedule["project_id"], lease)
+        results.append({"project_id": schedule["project_id"], "at": now.isoformat(), "error": str(error), "retry_at": lease})
+
+    @staticmethod
+    def _missed_runs(schedule: Dict[str, Any], now: datetime) -> int:
+        cron = CronSchedule(schedule["cron"])
+        t = _parse_ts(schedule["next_run_at"]) - jitter(schedule["project_id"])
+        missed = 0
+        while missed < 1000:
+            t = cron.next_after(t)
+            if t + jitter(schedule["project_id"]) > now:
+                break
+            missed += 1
+        return missed
+
+    def run(self, until: Optional[datetime] = None, poll_seconds: float = SCHEDULE_POLL_SECONDS, on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> None:
+        while until is None or self.clock.now() < until:
+            for result in self.tick():
+                if on_result:
+                    on_result(result)
+            self._maybe_maintain()
+            self.clock.sleep(poll_seconds)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Virshi recurring scan scheduler")
+    parser.add_argument("--simulate", action="store_true", help="dry run on a simulated clock; nothing is dispatched or written")
+    parser.add_argument("--start", help="simulation start (ISO, UTC); defaults to now")
+    parser.add_argument("--days", type=float, default=7, help="simulated days")
+    parser.add_argument("--poll", type=float, default=SCHEDULE_POLL_SECONDS, help="seconds between wake-ups")
+    args = parser.parse_args(argv)
+
+    print_result = lambda result: print(result, flush=True)
+
+    if not args.simulate:
+        ScanScheduler(maintain=refresh_all_rollups).run(poll_seconds=args.poll, on_result=print_result)
+        return
+
+    start = _parse_ts(args.start) if args.start else datetime.now(timezone.utc)
+    scheduler = ScanScheduler(
+        store=MemoryScheduleStore(get_enabled_schedules()),
+        clock=SimulatedClock(start),
+        dispatch=lambda schedule: {"project_id": schedule["project_id"], "providers": schedule.get("providers"), "dry_run": True}
+    )
+    scheduler.run(until=start + timedelta(days=args.days), poll_seconds=args.poll, on_result=print_result)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Per-session state: compact records, memory accounting and idle eviction
+"""
+
+import os
+import sys
+import threading
+import time
+import types
+import weakref
+from typing import Dict, Any, List, Optional
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from config import SESSION_IDLE_SECONDS, SESSION_SWEEP_SECONDS
+
+PROJECT_FIELDS = ("id", "user_id", "brand_name", "domain", "region", "status", "created_at")
+
+class ProjectRef:
+    """Slotted copy of a projects row with dict-style access, so pages keep using project["id"] / project.get()."""
+    __slots__ = PROJECT_FIELDS
+
+    def __init__(self, row: Dict[str, Any]):
+        for field in PROJECT_FIELDS:
+            if field in row:
+                value = row[field]
+                setattr(self, field, sys.intern(value) if field in ("status", "region") and isinstance(value, str) else value)
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in PROJECT_FIELDS else default
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ProjectRef) and self.get("id") == other.get("id")
+
+    def __hash__(self) -> int:
+        return hash(self.get("id"))
+
+    def __repr__(self) -> str:
+        return f"ProjectRef({self.get('id')!r}, {self.get('brand_name')!r})"
+
+class SessionUser:
+    """The two auth fields the app reads, instead of the full auth response object."""
+    __slots__ = ("id", "email")
+
+    def __init__(self, id: str, email: Optional[str]):
+        self.id = id
+        self.email = email
+
+def session_user(user) -> Optional[SessionUser]:
+    return SessionUser(user.id, user.email) if user is not None else None
+
+def compact_project(row) -> Optional[ProjectRef]:
+    if row is None or isinstance(row, ProjectRef):
+        return row
+    return ProjectRef(row)
+
+def compact_projects(rows: List[Dict[str, Any]]) -> tuple:
+    return tuple(compact_project(row) for row in rows)
+
+def compact_keywords(keywords) -> tuple:
+    """Selected keyword texts as a tuple of interned strings (shared with the keyword rows), without repeats."""
+    return tuple(dict.fromkeys(sys.intern(str(kw)) for kw in keywords))
+
+# MEMORY ACCOUNTING
+def deep_sizeof(obj: Any, _seen: Optional[set] = None) -> int:
+    """Approximate retained size; objects shared between sessions are counted in each."""
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen or isinstance(obj, (type, types.ModuleType, types.FunctionType, types.MethodType)):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj, 0)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif type(obj).__sizeof__ is object.__sizeof__:
+        # Containers with their own __sizeof__ (DataFrames, arrays) already report their payload
+        if hasattr(obj, "__dict__"):
+            size += deep_sizeof(vars(obj), seen)
+        for klass in type(obj).__mro__:
+            for slot in getattr(klass, "__slots__", ()):
+                if hasattr(obj, slot):
+                    size += deep_sizeof(getattr(obj, slot), seen)
+    return size
+
+def process_rss() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            return 0
+
+# SESSION REGISTRY
+class _SessionEntry:
+    __slots__ = ("state", "user", "project_id", "last_seen", "evicted")
+
+    def __init__(self, state):
+        self.state = weakref.ref(state)
+        self.user: Optional[str] = None
+        self.project_id: Optional[str] = None
+        self.last_seen = 0.0
+        self.evicted = False
+
+_sessions: Dict[str, _SessionEntry] = {}
+_sessions_lock = threading.Lock()
+_last_sweep = [0.0]
+
+def touch() -> None:
+    """Marks the current session as active; call once per rerun."""
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return
+    now = time.time()
+    user = st.session_state.get("user")
+    project = st.session_state.get("current_project")
+    with _sessions_lock:
+        entry = _sessions.get(ctx.session_id)
+        if entry is None or entry.state() is not ctx.session_state:
+            entry = _sessions[ctx.session_id] = _SessionEntry(ctx.session_state)
+        entry.user = getattr(user, "email", None)
+        entry.project_id = project.get("id") if project else None
+        entry.last_seen = now
+        entry.evicted = False
+        due = now - _last_sweep[0] >= SESSION_SWEEP_SECONDS
+        if due:
+            _last_sweep[0] = now
+    if due:
+        evict_idle()
+
+def _live_sessions() -> List[tuple]:
+    with _sessions_lock:
+        for session_id in [sid for sid, entry in _sessions.items() if entry.state() is None]:
+            del _sessions[session_id]
+        return [(sid, entry, entry.state()) for sid, entry in _sessions.items()]
+
+def evict_idle(max_idle: float = SESSION_IDLE_SECONDS) -> int:
+    """
+    Drops cached scan results of projects that only sessions idle longer than max_idle have open;
+    returns the approximate bytes released. Session state is never changed from here: it belongs
+    to the session's own script thread, and what it holds can't all be rebuilt (e.g. prompts).
+    """
+    # Imported here because database builds on this module
+    from database import drop_cached_scan_results
+
+    now = time.time()
+    active, idle = set(), set()
+    with _sessions_lock:
+        for entry in _sessions.values():
+            if entry.state() is None:
+                continue
+            if now - entry.last_seen < max_idle:
+                active.add(entry.project_id)
+            elif not entry.evicted:
+                idle.add(entry.project_id)
+                entry.evicted = True
+    return drop_cached_scan_results(idle - active - {None})
+
+def session_stats() -> List[Dict[str, Any]]:
+    now = time.time()
+    rows = []
+    for session_id, entry, state in _live_sessions():
+        if state is None:
+            continue
+        values = state.filtered_state
+        sizes = {key: deep_sizeof(value) for key, value in values.items()}
+        largest = max(sizes, key=sizes.get) if sizes else ""
+        rows.append({
+            "session": session_id[:8],
+            "user": entry.user or "—",
+            "idle_s": int(now - entry.last_seen),
+            "keys": len(values),
+            "bytes": sum(sizes.values()),
+            "largest_key": largest,
+            "evicted": entry.evicted
+        })
+    return rows
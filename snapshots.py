@@ -0,0 +1,321 @@
+"""
+Локальні колонкові знімки scan_results (Arrow IPC, memory-mapped)
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Iterator
+import pyarrow as pa
+import pyarrow.compute as pc
+from database import db, paginate
+from telemetry import instrument
+from config import SNAPSHOT_DIR, SNAPSHOT_BUDGET_MB, SNAPSHOT_MAX_SEGMENTS, SNAPSHOT_OVERLAP_SECONDS
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Files no manifest points to are left alone this long: another process may be about to commit them
+_ORPHAN_GRACE_SECONDS = 300
+_VERIFIED_MAX = 4096
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _as_text(value: Any) -> Any:
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+def _overlap_start(watermark: Optional[str], overlap: float) -> Optional[str]:
+    """The watermark moved back by `overlap` seconds; None (read everything) if it can't be parsed."""
+    if not watermark:
+        return None
+    try:
+        return (datetime.fromisoformat(watermark.replace("Z", "+00:00")) - timedelta(seconds=overlap)).isoformat()
+    except ValueError:
+        return None
+
+def _to_table(rows: List[Dict[str, Any]]) -> pa.Table:
+    try:
+        return pa.Table.from_pylist(rows)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Columns holding mixed JSON types (e.g. list vs string) are stored as text
+        kinds: Dict[str, set] = {}
+        for row in rows:
+            for key, value in row.items():
+                if value is not None:
+                    kinds.setdefault(key, set()).add(float if isinstance(value, (int, float)) and not isinstance(value, bool) else type(value))
+        mixed = {key for key, types in kinds.items() if len(types) > 1}
+        return pa.Table.from_pylist([{k: (_as_text(v) if k in mixed else v) for k, v in row.items()} for row in rows])
+
+class SnapshotStore:
+    """
+    Per project: a JSON manifest listing append-only Arrow segment files. A sync re-reads from
+    SNAPSHOT_OVERLAP_SECONDS before the created_at watermark, keeps the rows whose id the snapshot
+    doesn't hold yet and writes them as one more segment; past SNAPSHOT_MAX_SEGMENTS the segments
+    are compacted into one. Rows committed later than the overlap are picked up by resync().
+    The manifest is the commit point (written under a fresh name, then atomically replaced), and
+    writers on the same host are serialized by a lock file, so readers never see a half-written
+    snapshot and two replicas never write the same project at once.
+    """
+
+    def __init__(self, root: str, budget_bytes: int, max_segments: int = SNAPSHOT_MAX_SEGMENTS, overlap: float = SNAPSHOT_OVERLAP_SECONDS):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.max_segments = max_segments
+        self.overlap = overlap
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+        self._verified: "OrderedDict[tuple, None]" = OrderedDict()
+
+    def _lock(self, project_id: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(project_id, threading.Lock())
+
+    @contextmanager
+    def _write_lock(self, project_id: str) -> Iterator[None]:
+        """Thread lock within the process, lock file across processes."""
+        with self._lock(project_id):
+            os.makedirs(self.root, exist_ok=True)
+            path = os.path.join(self.root, f"{project_id}.lock")
+            if fcntl is not None:
+                fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                    yield
+                finally:
+                    os.close(fd)
+                return
+            # No flock (Windows): exclusive create, taking over a lock older than the orphan grace
+            while True:
+                try:
+                    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+                    break
+                except FileExistsError:
+                    try:
+                        if time.time() - os.path.getmtime(path) > _ORPHAN_GRACE_SECONDS:
+                            os.remove(path)
+                    except OSError:
+                        pass
+                    time.sleep(0.05)
+            try:
+                yield
+            finally:
+                os.close(fd)
+                self._remove(path)
+
+    def _manifest_path(self, project_id: str) -> str:
+        return os.path.join(self.root, f"{project_id}.json")
+
+    def _read_manifest(self, project_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._manifest_path(project_id), encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return manifest if isinstance(manifest.get("segments"), list) else None
+
+    def _verify(self, path: str, segment: Dict[str, Any]) -> bool:
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with self._guard:
+            if key in self._verified:
+                self._verified.move_to_end(key)
+                return True
+        if stat.st_size != segment.get("size") or _sha256(path) != segment.get("sha256"):
+            return False
+        with self._guard:
+            self._verified[key] = None
+            while len(self._verified) > _VERIFIED_MAX:
+                self._verified.popitem(last=False)
+        return True
+
+    def load(self, project_id: str) -> Optional[pa.Table]:
+        manifest = self._read_manifest(project_id)
+        if not manifest or not manifest["segments"]:
+            return None
+        tables = []
+        for segment in manifest["segments"]:
+            path = os.path.join(self.root, segment["file"])
+            try:
+                if not self._verify(path, segment):
+                    self.drop(project_id)
+                    return None
+                tables.append(pa.ipc.open_file(pa.memory_map(path)).read_all())
+            except FileNotFoundError:
+                # Compacted away by another process after we read the manifest: read from the DB this time
+                return None
+            except (OSError, pa.ArrowInvalid):
+                self.drop(project_id)
+                return None
+        try:
+            table = tables[0] if len(tables) == 1 else pa.concat_tables(tables, promote_options="permissive")
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            self.drop(project_id)
+            return None
+        try:
+            os.utime(self._manifest_path(project_id))
+        except OSError:
+            pass
+        return table
+
+    def sync(self, project_id: str) -> Optional[pa.Table]:
+        """Pulls rows from the overlap window before the created_at watermark into a new segment; None means "read from the DB"."""
+        with self._write_lock(project_id):
+            manifest = self._read_manifest(project_id)
+            table = self.load(project_id) if manifest else None
+            if table is None:
+                manifest = {"segments": []}
+
+            try:
+                new_rows = self._fetch_since(project_id, _overlap_start(manifest.get("watermark"), self.overlap))
+            except Exception:
+                return table
+            if table is not None and new_rows:
+                # The overlap re-reads rows the snapshot already has: its own id column decides
+                known = set(table["id"].to_pylist()) if "id" in table.column_names else set()
+                new_rows = [row for row in new_rows if row.get("id") not in known]
+
+            if not new_rows:
+                return table
+
+            new_table = _to_table(new_rows)
+            segments = list(manifest["segments"])
+            try:
+                combined = new_table if table is None else pa.concat_tables([table, new_table], promote_options="permissive")
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # The new rows changed a column's type: rewrite everything under one reconciled schema
+                try:
+                    combined = _to_table(table.to_pylist() + new_rows)
+                except (pa.ArrowInvalid, pa.ArrowTypeError):
+                    self.drop(project_id)
+                    return None
+                segments = []
+                new_table = combined
+
+            if len(segments) + 1 > self.max_segments:
+                segments, new_table = [], combined
+
+            watermark = max([str(manifest.get("watermark") or "")] + [str(row.get("created_at") or "") for row in new_rows])
+            replaced = [s["file"] for s in manifest["segments"]] if not segments else []
+            self._commit(project_id, segments + [self._write_segment(project_id, new_table)], watermark, combined.num_rows)
+            for name in replaced:
+                self._remove(os.path.join(self.root, name))
+        self.evict()
+        return combined
+
+    def resync(self, project_id: str) -> None:
+        """Drops the project's snapshot, so the next sync rebuilds it from the database."""
+        with self._write_lock(project_id):
+            self.drop(project_id)
+
+    @instrument("db", "snapshot_fetch_since")
+    def _fetch_since(self, project_id: str, watermark: Optional[str]) -> List[Dict[str, Any]]:
+        def build_query():
+            query = db.client.table("scan_results").select("*").eq("project_id", project_id)
+            if watermark:
+                query = query.gte("created_at", watermark)
+            return query.order("created_at").order("id")
+        return [row for page in paginate(build_query) for row in page]
+
+    def _write_segment(self, project_id: str, table: pa.Table) -> Dict[str, Any]:
+        file_name = f"{project_id}-{uuid.uuid4().hex[:8]}.arrow"
+        path = os.path.join(self.root, file_name)
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        return {"file": file_name, "size": os.path.getsize(path), "sha256": _sha256(path), "rows": table.num_rows}
+
+    def _commit(self, project_id: str, segments: List[Dict[str, Any]], watermark: str, rows: int) -> None:
+        manifest = {"segments": segments, "watermark": watermark, "rows": rows}
+        tmp_path = f"{self._manifest_path(project_id)}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path(project_id))
+
+    def drop(self, project_id: str) -> None:
+        manifest = self._read_manifest(project_id)
+        self._remove(self._manifest_path(project_id))
+        for segment in (manifest or {}).get("segments", []):
+            self._remove(os.path.join(self.root, segment["file"]))
+
+    def evict(self) -> None:
+        """
+        Drops least recently read snapshots until the files on disk fit the budget. Every file in
+        the store counts, and segment files no manifest refers to (a writer died) are removed.
+        """
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return
+
+        sizes: Dict[str, int] = {}
+        mtimes: Dict[str, float] = {}
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(self.root, name))
+            except OSError:
+                continue
+            sizes[name], mtimes[name] = stat.st_size, stat.st_mtime
+
+        entries = []
+        referenced = set()
+        for name in sizes:
+            if not name.endswith(".json"):
+                continue
+            project_id = name[:-len(".json")]
+            manifest = self._read_manifest(project_id)
+            files = [segment["file"] for segment in (manifest or {}).get("segments", [])]
+            referenced.update(files)
+            entries.append((mtimes[name], project_id, sizes[name] + sum(sizes.get(f, 0) for f in files)))
+
+        now = time.time()
+        total = 0
+        for name, size in sizes.items():
+            orphan = name.endswith((".arrow", ".tmp")) and name not in referenced
+            if orphan and now - mtimes[name] > _ORPHAN_GRACE_SECONDS:
+                self._remove(os.path.join(self.root, name))
+            else:
+                total += size
+
+        for _, project_id, size in sorted(entries):
+            if total <= self.budget_bytes:
+                break
+            self.drop(project_id)
+            total -= size
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+snapshot_store = SnapshotStore(SNAPSHOT_DIR, SNAPSHOT_BUDGET_MB * 1024 * 1024)
+
+def load_scan_table(project_id: str, since: Optional[str] = None, columns: Optional[List[str]] = None) -> Optional[pa.Table]:
+    """
+    The project's scan rows as a memory-mapped Arrow table (optionally created_at >= since and only
+    the given columns); None if there is no usable snapshot. Callers convert only what they need.
+    """
+    table = snapshot_store.sync(project_id)
+    if table is None:
+        return None
+    if since and "created_at" in table.column_names:
+        table = table.filter(pc.greater_equal(table["created_at"].cast(pa.string()), since))
+    if columns:
+        table = table.select([c for c in columns if c in table.column_names])
+    return table
@@ -0,0 +1,22 @@
+-- Daily per-provider aggregates of dashboard metrics (see trends.py)
+create table if not exists scan_daily_rollups (
+    project_id uuid not null references projects(id) on delete cascade,
+    provider text not null,
+    day date not null,
+    scans integer not null default 0,
+    brand_mentions integer not null default 0,
+    official_links integer not null default 0,
+    sentiment_positive integer not null default 0,
+    sentiment_neutral integer not null default 0,
+    sentiment_negative integer not null default 0,
+    position_sum double precision not null default 0,
+    position_count integer not null default 0,
+    last_scan_at timestamptz,
+    primary key (project_id, provider, day)
+);
+
+create index if not exists scan_daily_rollups_watermark_idx
+    on scan_daily_rollups (project_id, last_scan_at desc);
+
+create index if not exists scan_results_project_created_idx
+    on scan_results (project_id, created_at);
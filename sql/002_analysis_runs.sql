@@ -0,0 +1,14 @@
+-- One row per analysis chunk (project x provider): queued when accepted by the dispatcher,
+-- running once sent to n8n, done or failed by n8n's completion callback
+create table if not exists analysis_runs (
+    id uuid primary key default gen_random_uuid(),
+    project_id uuid not null references projects(id) on delete cascade,
+    provider text not null,
+    keywords_count integer not null default 0,
+    status text not null default 'running' check (status in ('queued', 'running', 'done', 'failed')),
+    created_at timestamptz not null default now(),
+    completed_at timestamptz
+);
+
+create index if not exists analysis_runs_project_created_idx
+    on analysis_runs (project_id, created_at desc);
@@ -0,0 +1,62 @@
+-- Headline totals for many projects in one call (see database.get_portfolio_totals).
+-- Reads the daily rollups and only scans raw rows newer than each project's rollup watermark, so the
+-- cost is the project count plus that raw tail. The scheduler worker (scheduler.py) refreshes every
+-- project's rollups each ROLLUP_SWEEP_SECONDS; without it the tail grows with every unviewed scan.
+-- Counting rules mirror metrics.add_scan.
+create or replace function portfolio_metrics(project_ids uuid[])
+returns table (
+    project_id uuid,
+    scans bigint,
+    brand_mentions bigint,
+    official_links bigint,
+    sentiment_positive bigint,
+    sentiment_neutral bigint,
+    sentiment_negative bigint,
+    position_sum double precision,
+    position_count bigint
+)
+language sql stable as $$
+    with rolled as (
+        select r.project_id,
+               sum(r.scans) as scans,
+               sum(r.brand_mentions) as brand_mentions,
+               sum(r.official_links) as official_links,
+               sum(r.sentiment_positive) as sentiment_positive,
+               sum(r.sentiment_neutral) as sentiment_neutral,
+               sum(r.sentiment_negative) as sentiment_negative,
+               sum(r.position_sum) as position_sum,
+               sum(r.position_count) as position_count,
+               max(r.last_scan_at) as watermark
+        from scan_daily_rollups r
+        where r.project_id = any(project_ids)
+        group by r.project_id
+    ),
+    tail as (
+        select s.project_id,
+               count(*) as scans,
+               count(*) filter (where position(lower(p.brand_name) in lower(coalesce(s.mentioned_brands::text, ''))) > 0) as brand_mentions,
+               count(*) filter (where s.links_to_official_site) as official_links,
+               count(*) filter (where lower(coalesce(s.sentiment, 'neutral')) = 'positive') as sentiment_positive,
+               count(*) filter (where lower(coalesce(s.sentiment, 'neutral')) not in ('positive', 'negative')) as sentiment_neutral,
+               count(*) filter (where lower(coalesce(s.sentiment, 'neutral')) = 'negative') as sentiment_negative,
+               coalesce(sum(s.brand_position) filter (where coalesce(s.brand_position, 0) <> 0), 0) as position_sum,
+               count(*) filter (where coalesce(s.brand_position, 0) <> 0) as position_count
+        from scan_results s
+        join projects p on p.id = s.project_id
+        left join rolled on rolled.project_id = s.project_id
+        where s.project_id = any(project_ids)
+          and (rolled.watermark is null or s.created_at > rolled.watermark)
+        group by s.project_id
+    )
+    select coalesce(rolled.project_id, tail.project_id),
+           coalesce(rolled.scans, 0) + coalesce(tail.scans, 0),
+           coalesce(rolled.brand_mentions, 0) + coalesce(tail.brand_mentions, 0),
+           coalesce(rolled.official_links, 0) + coalesce(tail.official_links, 0),
+           coalesce(rolled.sentiment_positive, 0) + coalesce(tail.sentiment_positive, 0),
+           coalesce(rolled.sentiment_neutral, 0) + coalesce(tail.sentiment_neutral, 0),
+           coalesce(rolled.sentiment_negative, 0) + coalesce(tail.sentiment_negative, 0),
+           coalesce(rolled.position_sum, 0) + coalesce(tail.position_sum, 0),
+           coalesce(rolled.position_count, 0) + coalesce(tail.position_count, 0)
+    from rolled
+    full outer join tail on tail.project_id = rolled.project_id
+$$;
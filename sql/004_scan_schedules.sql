@@ -0,0 +1,14 @@
+-- Per-project recurring scans, executed by scheduler.py
+create table if not exists scan_schedules (
+    id uuid primary key default gen_random_uuid(),
+    project_id uuid not null unique references projects(id) on delete cascade,
+    cron text not null default '0 6 * * 1',
+    providers text[] not null default '{Perplexity}',
+    enabled boolean not null default false,
+    next_run_at timestamptz,
+    last_run_at timestamptz,
+    created_at timestamptz not null default now()
+);
+
+create index if not exists scan_schedules_due_idx
+    on scan_schedules (next_run_at) where enabled;
@@ -0,0 +1,174 @@
+"""
+Телеметрія: таймінги запитів до БД, вебхуків та рендеру сторінок
+"""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Streamlit's st.rerun()/st.stop() unwind the script with exceptions; they are not failures
+CONTROL_FLOW_ERRORS = ("RerunException", "StopException")
+
+class Series:
+    __slots__ = ("bucket_counts", "count", "total_seconds", "rows", "payload_bytes", "errors")
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.total_seconds = 0.0
+        self.rows = 0
+        self.payload_bytes = 0
+        self.errors: Dict[str, int] = {}
+
+    def quantile(self, q: float) -> float:
+        """Linear interpolation inside the bucket holding the rank, as Prometheus' histogram_quantile does."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        lower, below = 0.0, 0
+        for upper, seen in zip(LATENCY_BUCKETS, self.bucket_counts):
+            if seen >= rank:
+                if seen == below:
+                    return upper
+                return lower + (upper - lower) * (rank - below) / (seen - below)
+            lower, below = upper, seen
+        # Past the last bucket there is no upper bound to interpolate towards
+        return LATENCY_BUCKETS[-1]
+
+class Registry:
+    def __init__(self):
+        self._series: Dict[Tuple[str, str], Series] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, kind: str, name: str, seconds: float, rows: Optional[int] = None, payload_bytes: Optional[int] = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            series = self._series.get((kind, name))
+            if series is None:
+                series = self._series[(kind, name)] = Series()
+            series.count += 1
+            series.total_seconds += seconds
+            for i, upper in enumerate(LATENCY_BUCKETS):
+                if seconds <= upper:
+                    series.bucket_counts[i] += 1
+            if rows:
+                series.rows += rows
+            if payload_bytes:
+                series.payload_bytes += payload_bytes
+            if error:
+                series.errors[error] = series.errors.get(error, 0) + 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    "kind": kind,
+                    "name": name,
+                    "calls": s.count,
+                    "errors": sum(s.errors.values()),
+                    "error_classes": ", ".join(f"{cls}×{n}" for cls, n in sorted(s.errors.items())),
+                    "avg_ms": round(s.total_seconds / s.count * 1000, 1) if s.count else 0.0,
+                    "p50_ms": round(s.quantile(0.5) * 1000, 1),
+                    "p95_ms": round(s.quantile(0.95) * 1000, 1),
+                    "rows": s.rows,
+                    "payload_bytes": s.payload_bytes,
+                }
+                for (kind, name), s in sorted(self._series.items())
+            ]
+
+    def prometheus(self) -> str:
+        lines = [
+            "# HELP virshi_call_duration_seconds Latency of DB queries, webhook calls and page renders.",
+            "# TYPE virshi_call_duration_seconds histogram",
+        ]
+        with self._lock:
+            items = sorted(self._series.items())
+            for (kind, name), s in items:
+                labels = f'kind="{kind}",name="{name}"'
+                for upper, seen in zip(LATENCY_BUCKETS, s.bucket_counts):
+                    lines.append(f'virshi_call_duration_seconds_bucket{{{labels},le="{upper}"}} {seen}')
+                lines.append(f'virshi_call_duration_seconds_bucket{{{labels},le="+Inf"}} {s.count}')
+                lines.append(f"virshi_call_duration_seconds_sum{{{labels}}} {s.total_seconds:.6f}")
+                lines.append(f"virshi_call_duration_seconds_count{{{labels}}} {s.count}")
+
+            lines += ["# HELP virshi_call_rows_total Rows returned.", "# TYPE virshi_call_rows_total counter"]
+            lines += [f'virshi_call_rows_total{{kind="{kind}",name="{name}"}} {s.rows}' for (kind, name), s in items]
+            lines += ["# HELP virshi_call_payload_bytes_total Webhook request body bytes.", "# TYPE virshi_call_payload_bytes_total counter"]
+            lines += [f'virshi_call_payload_bytes_total{{kind="{kind}",name="{name}"}} {s.payload_bytes}' for (kind, name), s in items]
+            lines += ["# HELP virshi_call_errors_total Failed calls by error class.", "# TYPE virshi_call_errors_total counter"]
+            for (kind, name), s in items:
+                for cls, n in sorted(s.errors.items()):
+                    lines.append(f'virshi_call_errors_total{{kind="{kind}",name="{name}",error="{cls}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+class Span:
+    __slots__ = ("kind", "name", "rows", "payload_bytes", "error")
+
+    def __init__(self, kind: str, name: str):
+        self.kind = kind
+        self.name = name
+        self.rows: Optional[int] = None
+        self.payload_bytes = 0
+        self.error: Optional[str] = None
+
+_local = threading.local()
+
+def _stack() -> List[Span]:
+    if not hasattr(_local, "spans"):
+        _local.spans = []
+    return _local.spans
+
+def current_span() -> Optional[Span]:
+    stack = _stack()
+    return stack[-1] if stack else None
+
+@contextmanager
+def span(kind: str, name: str):
+    sp = Span(kind, name)
+    stack = _stack()
+    stack.append(sp)
+    start = time.perf_counter()
+    try:
+        yield sp
+    except BaseException as e:
+        if type(e).__name__ not in CONTROL_FLOW_ERRORS:
+            sp.error = type(e).__name__
+        raise
+    finally:
+        stack.pop()
+        registry.observe(kind, name, time.perf_counter() - start, sp.rows, sp.payload_bytes, sp.error)
+
+def instrument(kind: str, name: Optional[str] = None):
+    """Times every call; list results are counted as rows."""
+    def decorator(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(kind, label) as sp:
+                result = fn(*args, **kwargs)
+                if sp.rows is None and isinstance(result, list):
+                    sp.rows = len(result)
+                return result
+        return wrapper
+    return decorator
+
+def record_error(error: Union[BaseException, str]) -> None:
+    """Marks the current span as failed; for functions that swallow their exceptions."""
+    sp = current_span()
+    if sp is not None:
+        sp.error = error if isinstance(error, str) else type(error).__name__
+
+def record_payload(nbytes: int) -> None:
+    sp = current_span()
+    if sp is not None:
+        sp.payload_bytes += nbytes
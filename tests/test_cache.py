@@ -0,0 +1,59 @@
+"""
+Shared cache tier: backends, serialization and invalidation seen across instances
+"""
+
+import pytest
+from cache import SharedCache, MemoryBackend, NullBackend, SqliteBackend, dumps, loads
+
+ROWS = [{"id": i, "provider": "perplexity", "mentioned_brands": ["a", "b"], "score": 0.5} for i in range(200)]
+
+def _replicas(make_backend):
+    """Two cache instances (replicas) over one store; generations are re-read on every call."""
+    return SharedCache(make_backend(), generation_ttl=0), SharedCache(make_backend(), generation_ttl=0)
+
+@pytest.fixture(params=["memory", "sqlite"])
+def replicas(request, tmp_path):
+    if request.param == "memory":
+        backend = MemoryBackend()
+        return _replicas(lambda: backend)
+    path = str(tmp_path / "cache.db")
+    return _replicas(lambda: SqliteBackend(path))
+
+def test_round_trip_compresses_large_values():
+    data = dumps(ROWS)
+    assert data[:1].isupper() and loads(data) == ROWS
+    assert loads(dumps({"a": 1})) == {"a": 1}
+
+def test_invalidation_reaches_the_other_instance(replicas):
+    a, b = replicas
+    generation = a.generation("scan_results", "p1")
+    a.set("scan_results", "p1", generation, ROWS)
+    assert b.get("scan_results", "p1", b.generation("scan_results", "p1")) == ROWS
+
+    b.invalidate("scan_results", "p1")
+    assert a.generation("scan_results", "p1") == generation + 1
+    assert a.get("scan_results", "p1", a.generation("scan_results", "p1")) is None
+    # Other projects and namespaces keep their entries
+    assert a.generation("keywords", "p1") == 0 and a.generation("scan_results", "p2") == 0
+
+def test_memory_backend_keeps_to_its_byte_budget_but_not_at_the_counters_expense():
+    backend = MemoryBackend(max_items=100, max_bytes=2000)
+    cache = SharedCache(backend, generation_ttl=0)
+    cache.invalidate("scan_results", "p1")
+    for i in range(20):
+        cache.set("scan_results", f"p{i}", 0, "x" * 400)
+    assert backend.bytes <= 2000
+    assert cache.generation("scan_results", "p1") == 1
+    assert backend.set("big", b"x" * 3000) is False
+
+def test_null_backend_keeps_generations_only():
+    cache = SharedCache(NullBackend(), generation_ttl=0)
+    cache.set("scan_results", "p1", 0, ROWS)
+    assert cache.get("scan_results", "p1", 0) is None
+    cache.invalidate("scan_results", "p1")
+    assert cache.generation("scan_results", "p1") == 1
+
+def test_only_cross_process_backends_count_as_shared(tmp_path):
+    assert not SharedCache(NullBackend()).shared
+    assert not SharedCache(MemoryBackend()).shared
+    assert SharedCache(SqliteBackend(str(tmp_path / "cache.db"))).shared
@@ -0,0 +1,43 @@
+"""
+Analysis-complete callbacks through the local receiver
+"""
+
+import pytest
+import database
+from config import CALLBACK_PATH
+from n8n.callback import start_callback_server, stop_callback_server, post_callback, handle_callback
+
+SECRET = "test-secret"
+
+@pytest.fixture
+def receiver(fake_backend):
+    server = start_callback_server("127.0.0.1", 0, enabled=True, secret=SECRET)
+    yield f"http://127.0.0.1:{server.server_address[1]}{CALLBACK_PATH}"
+    stop_callback_server()
+
+def _run(backend, project_index=0):
+    project_id = backend.tables["projects"][project_index]["id"]
+    return project_id, database.create_analysis_run(project_id, "perplexity", 5)
+
+def test_callback_closes_run_and_invalidates(receiver, fake_backend):
+    project_id, run = _run(fake_backend)
+    before = len(database.get_scan_results(project_id))
+    fake_backend.write("scan_results", [{"project_id": project_id, "provider": "perplexity"}], None)
+    assert len(database.get_scan_results(project_id)) == before
+
+    assert post_callback(receiver, project_id, run["id"], secret=SECRET) == 200
+    assert database.get_analysis_run(run["id"])["status"] == "done"
+    assert len(database.get_scan_results(project_id)) == before + 1
+
+def test_callback_rejects_wrong_secret_and_foreign_run(receiver, fake_backend):
+    project_id, run = _run(fake_backend)
+    other_project_id = fake_backend.tables["projects"][1]["id"]
+    assert post_callback(receiver, project_id, run["id"], secret="wrong") == 401
+    assert post_callback(receiver, other_project_id, run["id"], secret=SECRET) == 404
+    assert post_callback(receiver, project_id, run["id"], status="bogus", secret=SECRET) == 400
+    assert database.get_analysis_run(run["id"])["status"] == "running"
+
+def test_callbacks_disabled_without_secret(fake_backend):
+    project_id, run = _run(fake_backend)
+    assert handle_callback({"project_id": project_id, "analysis_id": run["id"]}, {}, secret="")[0] == 503
+    assert start_callback_server("127.0.0.1", 0, enabled=False) is None
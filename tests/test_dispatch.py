@@ -0,0 +1,86 @@
+"""
+Dispatch scheduler on a manual clock: rate limits, weighted fairness, backpressure
+"""
+
+from collections import Counter
+import pytest
+from n8n.dispatch import DispatchScheduler, QueueFull
+from config import PRIORITY_WEIGHTS
+
+class ManualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def _scheduler(rate_limits, **kwargs):
+    sent = []
+    clock = ManualClock()
+    scheduler = DispatchScheduler(send=lambda payload: sent.append(payload) or True, rate_limits=rate_limits, chunk_size=1, clock=clock, **kwargs)
+    # Driven by run_once here, not by the background worker
+    scheduler._ensure_worker = lambda: None
+    return scheduler, clock, sent
+
+def _keywords(n):
+    return [f"kw{i}" for i in range(n)]
+
+def test_token_bucket_limits_each_provider():
+    scheduler, clock, sent = _scheduler({"slow": (2.0, 2)})
+    scheduler.submit("p1", "slow", {}, _keywords(5))
+    assert [scheduler.run_once() for _ in range(3)] == [0.0, 0.0, 0.5]
+    assert len(sent) == 2
+
+    clock.now += 0.5
+    assert scheduler.run_once() == 0.0 and scheduler.run_once() == 0.5
+    assert len(sent) == 3
+
+def test_replicas_share_the_rate_and_the_eta_reflects_it():
+    scheduler, clock, sent = _scheduler({"slow": (2.0, 2)}, replicas=2)
+    scheduler.submit("p1", "slow", {}, _keywords(4))
+    assert [scheduler.run_once() for _ in range(2)] == [0.0, 1.0]
+    # 3 chunks left at this replica's 1 chunk/s
+    assert scheduler.backlog()["eta_seconds"] == 3
+
+def test_blocked_provider_does_not_hold_back_others():
+    scheduler, clock, sent = _scheduler({"slow": (1.0, 1), "fast": (100.0, 100)})
+    scheduler.submit("p1", "slow", {"provider": "slow"}, _keywords(3))
+    scheduler.submit("p1", "fast", {"provider": "fast"}, _keywords(3))
+    while scheduler.run_once() == 0.0:
+        pass
+    assert Counter(payload["provider"] for payload in sent) == {"slow": 1, "fast": 3}
+
+def test_active_projects_get_weighted_share():
+    scheduler, clock, sent = _scheduler({"fast": (1000.0, 1000)})
+    scheduler.submit("trial", "fast", {"project": "trial"}, _keywords(40), priority="trial")
+    scheduler.submit("active", "fast", {"project": "active"}, _keywords(40), priority="active")
+    for _ in range(20):
+        scheduler.run_once()
+    counts = Counter(payload["project"] for payload in sent)
+    ratio = PRIORITY_WEIGHTS["active"] / PRIORITY_WEIGHTS["trial"]
+    assert abs(counts["active"] / counts["trial"] - ratio) <= 1
+
+def test_queue_full_applies_backpressure():
+    scheduler, clock, sent = _scheduler({"fast": (1.0, 1)}, max_queue=5, max_per_project=3)
+    scheduler.submit("p1", "fast", {}, _keywords(3))
+    with pytest.raises(QueueFull):
+        scheduler.submit("p1", "fast", {}, _keywords(1))
+    scheduler.submit("p2", "fast", {}, _keywords(2))
+    with pytest.raises(QueueFull):
+        scheduler.submit("p3", "fast", {}, _keywords(1))
+    assert scheduler.backlog()["queued"] == 5
+
+def test_enqueue_sees_all_chunks_of_a_submit_at_once():
+    batches = []
+
+    def enqueue(payloads):
+        batches.append(len(payloads))
+        return [{**payload, "analysis_id": i} for i, payload in enumerate(payloads)]
+
+    scheduler, clock, sent = _scheduler({"fast": (1000.0, 1000)}, enqueue=enqueue)
+    ticket = scheduler.submit("p1", "fast", {}, _keywords(4))
+    while scheduler.run_once() == 0.0:
+        pass
+    assert batches == [4]
+    assert [payload["analysis_id"] for payload in sent] == [0, 1, 2, 3]
+    assert ticket.done and ticket.sent == 4
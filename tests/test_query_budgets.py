@@ -0,0 +1,84 @@
+"""
+Per-page query budgets (config.QUERY_BUDGETS) against the in-memory Supabase stand-in
+"""
+
+import pytest
+from streamlit.testing.v1 import AppTest
+from config import QUERY_BUDGETS
+from querytrack import budget, install, QueryBudgetExceeded
+from pages.dashboard import render_dashboard
+from pages.keywords import render_keywords_page
+from pages.sources import render_sources_page
+from pages.competitors import render_competitors_page
+from pages.reports import render_reports_page
+from pages.portfolio import render_portfolio_page
+from pages.admin import render_admin_page
+
+PAGES = {
+    "Дашборд": render_dashboard,
+    "Запити": render_keywords_page,
+    "Джерела": render_sources_page,
+    "Конкуренти": render_competitors_page,
+    "Звіти": render_reports_page,
+    "Портфель": render_portfolio_page,
+    "Адмін": render_admin_page
+}
+
+def _render_page(query_budget, render, max_queries, label):
+    # Runs as the AppTest script, on its thread: the budget has to be opened there
+    with query_budget(max_queries, label=label):
+        render()
+
+@pytest.mark.parametrize("label", list(PAGES))
+def test_page_budget(label, fake_backend, query_budget):
+    from database import get_user_projects
+    from sessions import compact_projects, SessionUser
+
+    profile = fake_backend.tables["profiles"][0]
+    projects = compact_projects(get_user_projects(profile["id"]))
+    at = AppTest.from_function(_render_page, args=(query_budget, PAGES[label], QUERY_BUDGETS[label], label), default_timeout=30)
+    for key, value in {
+        "user": SessionUser(profile["id"], profile["email"]), "role": "admin", "user_details": {},
+        "projects": projects, "current_project": projects[0], "current_page": label,
+        "generated_prompts": (), "onboarding_step": 1, "focus_keyword_id": None
+    }.items():
+        at.session_state[key] = value
+    at.run()
+    assert [e.message for e in at.exception] == []
+
+class _NotBuilder:
+    """postgrest-style builder whose .not_ is a property, not a method."""
+
+    @property
+    def not_(self):
+        return self
+
+    def select(self, *args):
+        return self
+
+    def is_(self, *args):
+        return self
+
+    def execute(self):
+        return None
+
+class _NotClient:
+    def table(self, name):
+        return _NotBuilder()
+
+def test_not_chains_are_counted():
+    from querytrack import TrackedClient
+
+    client = TrackedClient(_NotClient())
+    with budget(label="not_") as run:
+        client.table("keywords").select("id").not_.is_("keyword_text", "null").execute()
+    assert dict(run.shapes) == {"keywords.select(id).not_.is_(keyword_text)": 1}
+
+def test_budget_exceeded(fake_backend):
+    from database import db
+
+    install(db)
+    with pytest.raises(QueryBudgetExceeded, match="possible N\\+1"):
+        with budget(label="loop"):
+            for _ in range(3):
+                db.client.table("keywords").select("id").eq("project_id", "p").execute()
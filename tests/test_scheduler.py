@@ -0,0 +1,100 @@
+"""
+Scan scheduler on a simulated clock
+"""
+
+from datetime import datetime, timedelta, timezone
+import pytest
+from scheduler import ScanScheduler, MemoryScheduleStore, SimulatedClock, CronSchedule, ScheduledScanFailed, next_run_time, jitter, settle_scheduled_scan
+from n8n.dispatch import Ticket
+
+START = datetime(2026, 1, 5, 0, 0, tzinfo=timezone.utc)  # a Monday
+
+def _schedule(cron="0 6 * * 1", next_run_at=None, **extra):
+    project_id = extra.pop("project_id", "p1")
+    return {"id": f"s-{project_id}", "project_id": project_id, "cron": cron, "providers": ["Perplexity"], "enabled": True,
+            "next_run_at": (next_run_at or next_run_time(cron, project_id, START)).isoformat(), **extra}
+
+def _run(schedules, days, dispatch=None, **kwargs):
+    store = MemoryScheduleStore(schedules)
+    clock = SimulatedClock(START)
+    results = []
+    scheduler = ScanScheduler(store=store, clock=clock, dispatch=dispatch or (lambda s: {"project_id": s["project_id"]}), **kwargs)
+    scheduler.run(until=START + timedelta(days=days), poll_seconds=60, on_result=results.append)
+    return results, store
+
+def test_cron_next_after():
+    cron = CronSchedule("30 6 * * 1-5")
+    assert cron.next_after(datetime(2026, 1, 9, 7, 0, tzinfo=timezone.utc)) == datetime(2026, 1, 12, 6, 30, tzinfo=timezone.utc)
+    with pytest.raises(ValueError):
+        CronSchedule("61 * * * *")
+
+def test_weekly_schedule_fires_once_a_week():
+    results, store = _run([_schedule()], days=21)
+    assert [r["at"][:10] for r in results] == ["2026-01-05", "2026-01-12", "2026-01-19"]
+    assert all(r["missed"] == 0 for r in results)
+    assert store.schedules[0]["last_run_at"] == results[-1]["at"]
+
+def test_disabled_schedule_never_fires():
+    results, _ = _run([_schedule(enabled=False)], days=14)
+    assert results == []
+
+def test_missed_runs_collapse_into_one():
+    # Worker was down over three weekly runs: one catch-up run, two counted as missed
+    late = _schedule(next_run_at=datetime(2025, 12, 15, 6, 0, tzinfo=timezone.utc) + jitter("p1"))
+    results, _ = _run([late], days=0.2)
+    assert len(results) == 1 and results[0]["missed"] == 2
+    assert results[0]["next_run_at"] == next_run_time("0 6 * * 1", "p1", START).isoformat()
+
+def test_failed_dispatch_is_retried_after_the_lease():
+    calls = []
+
+    def flaky(schedule):
+        calls.append(schedule["next_run_at"])
+        if len(calls) == 1:
+            raise RuntimeError("n8n down")
+        return {"project_id": schedule["project_id"]}
+
+    results, store = _run([_schedule()], days=1, dispatch=flaky, retry_seconds=600)
+    assert [("error" in r) for r in results] == [True, False]
+    failed_at, retried_at = (datetime.fromisoformat(r["at"]) for r in results)
+    assert timedelta(seconds=600) <= retried_at - failed_at < timedelta(seconds=660)
+    # Only the successful run moved the schedule to next week
+    assert store.schedules[0]["next_run_at"] == results[1]["next_run_at"]
+    assert store.schedules[0]["last_run_at"] == results[1]["at"]
+
+def test_a_claimed_run_is_not_taken_twice():
+    store = MemoryScheduleStore([_schedule(next_run_at=START)])
+    due = store.due(START)[0]
+    assert store.claim(due["id"], due["next_run_at"], (START + timedelta(minutes=10)).isoformat())
+    assert not store.claim(due["id"], due["next_run_at"], (START + timedelta(minutes=10)).isoformat())
+
+def test_maintenance_runs_on_its_own_interval():
+    sweeps = []
+    _run([], days=1, maintain=lambda: sweeps.append(1), maintain_seconds=3600)
+    assert len(sweeps) == 24
+
+def test_run_is_only_confirmed_once_its_chunks_were_sent():
+    attempts = []
+
+    def settle(result, timeout):
+        attempts.append(timeout)
+        if len(attempts) == 1:
+            raise ScheduledScanFailed("1 of 2 chunks not accepted by n8n")
+
+    results, store = _run([_schedule()], days=1, settle=settle, retry_seconds=600)
+    assert [("error" in r) for r in results] == [True, False]
+    assert store.schedules[0]["next_run_at"] == results[1]["next_run_at"]
+
+def test_settle_fails_on_rejected_or_unsent_chunks():
+    rejected = Ticket(1, "p1", "perplexity", 2)
+    rejected.sent, rejected.failed = 1, 1
+    with pytest.raises(ScheduledScanFailed, match="1 of 2"):
+        settle_scheduled_scan({"tickets": {"Perplexity": rejected}}, timeout=1)
+    with pytest.raises(ScheduledScanFailed, match="still queued"):
+        settle_scheduled_scan({"tickets": {"Perplexity": Ticket(2, "p1", "perplexity", 1)}}, timeout=0.05)
+
+    sent = Ticket(3, "p1", "perplexity", 1)
+    sent.sent = 1
+    result = {"tickets": {"Perplexity": sent}}
+    settle_scheduled_scan(result, timeout=1)
+    assert "tickets" not in result
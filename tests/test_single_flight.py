@@ -0,0 +1,99 @@
+"""
+Single-flight collapsing of concurrent identical reads
+"""
+
+import threading
+import pytest
+import database
+from database import single_flight, SharedQueryError
+
+def _gate():
+    """A fetch that blocks until released; returns (fetch, started, release, calls)."""
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return [{"id": 1}]
+    return fetch, started, release, calls
+
+def _spawn(fn, results, errors):
+    def run():
+        try:
+            results.append(fn())
+        except Exception as e:
+            errors.append(e)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+def test_concurrent_callers_share_one_call_and_get_own_copies():
+    fetch, started, release, calls = _gate()
+    results, errors = [], []
+    key = ("test_collapse", (("project_id", "p"),), "*")
+    leader = _spawn(lambda: single_flight(key, fetch), results, errors)
+    started.wait(5)
+    waiters = [_spawn(lambda: single_flight(key, fetch), results, errors) for _ in range(3)]
+    while database.get_single_flight_stats()["test_collapse"]["collapsed"] < 3:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in [leader] + waiters:
+        thread.join(5)
+
+    assert calls == [1] and not errors
+    assert all(r == [{"id": 1}] for r in results)
+    assert len({id(r) for r in results}) == 4
+    results[1].append({"id": 2})
+    assert results[0] == [{"id": 1}]
+
+def test_failure_reaches_every_waiter():
+    started, release = threading.Event(), threading.Event()
+
+    def fetch():
+        started.set()
+        release.wait(5)
+        raise ValueError("db down")
+
+    results, errors = [], []
+    key = ("test_error", (), "*")
+    leader = _spawn(lambda: single_flight(key, fetch), results, errors)
+    started.wait(5)
+    waiters = [_spawn(lambda: single_flight(key, fetch), results, errors) for _ in range(2)]
+    while database.get_single_flight_stats()["test_error"]["collapsed"] < 2:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in [leader] + waiters:
+        thread.join(5)
+
+    assert not results
+    assert sorted(type(e).__name__ for e in errors) == ["SharedQueryError", "SharedQueryError", "ValueError"]
+    shared = [e for e in errors if isinstance(e, SharedQueryError)]
+    assert all(isinstance(e.__cause__, ValueError) for e in shared)
+    assert shared[0] is not shared[1]
+
+def test_reader_after_invalidation_does_not_join_older_flight(fake_backend, monkeypatch):
+    project_id = "p-race"
+    started, release = threading.Event(), threading.Event()
+    versions = iter([[{"id": 1}], [{"id": 1}, {"id": 2}]])
+
+    def fetch(pid):
+        rows = next(versions)
+        if len(rows) == 1:
+            started.set()
+            release.wait(5)
+        return rows
+    monkeypatch.setattr(database, "_fetch_scan_results", fetch)
+
+    results, errors = [], []
+    slow = _spawn(lambda: database.get_scan_results(project_id), results, errors)
+    started.wait(5)
+    # The new row landed after the slow read began
+    database.invalidate_project(project_id)
+    assert database.get_scan_results(project_id) == [{"id": 1}, {"id": 2}]
+    release.set()
+    slow.join(5)
+
+    assert results == [[{"id": 1}]] and not errors
+    assert database.get_scan_results(project_id) == [{"id": 1}, {"id": 2}]
@@ -0,0 +1,32 @@
+"""
+Scan snapshots against the in-memory Supabase stand-in
+"""
+
+from datetime import datetime, timedelta, timezone
+import database
+from snapshots import load_scan_table
+
+def _project_rows(backend, project_id):
+    return [row for row in backend.tables["scan_results"] if row["project_id"] == project_id]
+
+def test_resync_is_incremental_without_duplicates(fake_backend):
+    project_id = fake_backend.tables["projects"][0]["id"]
+    assert load_scan_table(project_id).num_rows == len(_project_rows(fake_backend, project_id))
+    # The overlap window re-reads known rows: they must not be appended again
+    assert load_scan_table(project_id).num_rows == len(_project_rows(fake_backend, project_id))
+
+    fake_backend.write("scan_results", [{"project_id": project_id, "provider": "perplexity", "created_at": datetime.now(timezone.utc).isoformat()}], None)
+    table = load_scan_table(project_id)
+    assert table.num_rows == len(_project_rows(fake_backend, project_id))
+    assert len(set(table["id"].to_pylist())) == table.num_rows
+
+def test_late_row_behind_watermark_appears_after_invalidation(fake_backend):
+    project_id = fake_backend.tables["projects"][0]["id"]
+    before = len(database.get_scan_results(project_id))
+
+    early = (datetime.now(timezone.utc) - timedelta(days=400)).isoformat()
+    fake_backend.write("scan_results", [{"project_id": project_id, "provider": "perplexity", "created_at": early}], None)
+    database.invalidate_project(project_id)
+
+    assert load_scan_table(project_id).num_rows == before + 1
+    assert len(database.get_scan_results(project_id)) == before + 1
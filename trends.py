@@ -0,0 +1,136 @@
+"""
+Історичні тренди: денні ролапи метрик по проекту та провайдеру
+"""
+
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, Any, List
+import pandas as pd
+from database import db, paginate, on_invalidate, get_all_projects
+from metrics import TOTAL_FIELDS, empty_totals, add_scan
+from utils import get_ui_provider
+from snapshots import load_scan_table
+from telemetry import instrument, record_error
+from config import ROLLUP_REFRESH_INTERVAL
+
+ROLLUP_TABLE = "scan_daily_rollups"
+ROLLUP_COLUMNS = "project_id, provider, day, last_scan_at, " + ", ".join(TOTAL_FIELDS)
+SCAN_COLUMNS = "provider, created_at, mentioned_brands, links_to_official_site, sentiment, brand_position"
+GRANULARITIES = {"D": "День", "W": "Тиждень", "M": "Місяць"}
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+_last_refresh: Dict[str, float] = {}
+_refreshing: set = set()
+
+# New scans landed: skip the refresh throttle on the next read
+on_invalidate(lambda project_id: _last_refresh.pop(project_id, None))
+
+def _project_lock(project_id: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(project_id, threading.Lock())
+
+def build_daily_rollups(project_id: str, scan_results: List[Dict[str, Any]], brand_name: str) -> List[Dict[str, Any]]:
+    buckets: Dict[tuple, Dict[str, Any]] = {}
+    for scan in scan_results:
+        created_at = str(scan.get("created_at") or "")
+        if len(created_at) < 10:
+            continue
+        key = (str(scan.get("provider") or ""), created_at[:10])
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = {"project_id": project_id, "provider": key[0], "day": key[1], "last_scan_at": created_at, **empty_totals()}
+        add_scan(bucket, scan, brand_name)
+        bucket["last_scan_at"] = max(bucket["last_scan_at"], created_at)
+    return list(buckets.values())
+
+@instrument("db")
+def refresh_rollups(project_id: str, brand_name: str, force: bool = False) -> int:
+    """
+    Incrementally brings the project's daily rollups up to date.
+    Days touched by scans newer than the watermark are re-aggregated from scratch,
+    so the upsert is idempotent and safe to repeat.
+    """
+    if not force and time.time() - _last_refresh.get(project_id, 0) < ROLLUP_REFRESH_INTERVAL:
+        return 0
+
+    with _project_lock(project_id):
+        try:
+            wm_resp = db.client.table(ROLLUP_TABLE).select("last_scan_at").eq("project_id", project_id).order("last_scan_at", desc=True).limit(1).execute()
+            watermark = wm_resp.data[0]["last_scan_at"] if wm_resp.data else None
+
+            first_query = db.client.table("scan_results").select("created_at").eq("project_id", project_id)
+            if watermark:
+                first_query = first_query.gt("created_at", watermark)
+            first_resp = first_query.order("created_at").limit(1).execute()
+            _last_refresh[project_id] = time.time()
+            if not first_resp.data:
+                return 0
+
+            day_start = str(first_resp.data[0]["created_at"])[:10]
+            table = load_scan_table(project_id, since=day_start, columns=[c.strip() for c in SCAN_COLUMNS.split(",")])
+            scans = table.to_pylist() if table is not None else None
+            if scans is None:
+                build_query = lambda: db.client.table("scan_results").select(SCAN_COLUMNS).eq("project_id", project_id).gte("created_at", day_start).order("created_at").order("id")
+                scans = [row for page in paginate(build_query) for row in page]
+
+            rollups = build_daily_rollups(project_id, scans, brand_name)
+            for i in range(0, len(rollups), 500):
+                db.client.table(ROLLUP_TABLE).upsert(rollups[i:i + 500], on_conflict="project_id,provider,day").execute()
+            return len(rollups)
+        except Exception as e:
+            record_error(e)
+            return 0
+
+def refresh_all_rollups() -> int:
+    """Brings every project's rollups up to date; the scheduler worker runs it every ROLLUP_SWEEP_SECONDS."""
+    return sum(refresh_rollups(p["id"], p.get("brand_name") or "", force=True) for p in get_all_projects())
+
+def refresh_rollups_async(project_id: str, brand_name: str) -> bool:
+    """Runs refresh_rollups on a background thread (one per project), so page renders only read rollups."""
+    if time.time() - _last_refresh.get(project_id, 0) < ROLLUP_REFRESH_INTERVAL:
+        return False
+    with _locks_guard:
+        if project_id in _refreshing:
+            return False
+        _refreshing.add(project_id)
+
+    def run():
+        try:
+            refresh_rollups(project_id, brand_name)
+        finally:
+            with _locks_guard:
+                _refreshing.discard(project_id)
+
+    threading.Thread(target=run, name=f"rollups-{project_id}", daemon=True).start()
+    return True
+
+@instrument("db")
+def get_trend(project_id: str, granularity: str = "D", days: int = 365) -> pd.DataFrame:
+    """Reads rollups only: at most `days` rows per provider, whatever the raw scan count."""
+    since = (date.today() - timedelta(days=days)).isoformat()
+    try:
+        build_query = lambda: db.client.table(ROLLUP_TABLE).select(ROLLUP_COLUMNS).eq("project_id", project_id).gte("day", since).order("day").order("provider")
+        rows = [row for page in paginate(build_query) for row in page]
+    except Exception as e:
+        record_error(e)
+        rows = []
+    return downsample(rows, granularity)
+
+def downsample(rollups: List[Dict[str, Any]], granularity: str = "D") -> pd.DataFrame:
+    if not rollups:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(rollups)
+    df["provider"] = df["provider"].map(get_ui_provider)
+    df["period"] = pd.to_datetime(df["day"]).dt.to_period(granularity).dt.start_time
+    df = df.groupby(["period", "provider"], as_index=False)[list(TOTAL_FIELDS)].sum()
+
+    scans = df["scans"].where(df["scans"] > 0)
+    df["sov"] = (df["brand_mentions"] / scans * 100).round(1).fillna(0)
+    df["official"] = (df["official_links"] / scans * 100).round(1).fillna(0)
+    df["positive"] = (df["sentiment_positive"] / scans * 100).round(1).fillna(0)
+    df["negative"] = (df["sentiment_negative"] / scans * 100).round(1).fillna(0)
+    df["position"] = (df["position_sum"] / df["position_count"].where(df["position_count"] > 0)).round(1)
+    return df.sort_values(["provider", "period"])
@@ -4,9 +4,14 @@
 
 import re
 import urllib.parse
+from functools import lru_cache
+from typing import Dict, List, Any
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 from config import PROVIDER_MAPPING, MODEL_MAPPING
 
+@lru_cache(maxsize=None)
 def get_ui_provider(p: str) -> str:
     pstr = str(p).lower()
     for k, v in PROVIDER_MAPPING.items():
@@ -14,6 +19,12 @@ def get_ui_provider(p: str) -> str:
             return v
     return str(p).capitalize()
 
+def partition_by_provider(scan_results: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    partitions: Dict[str, List[Dict[str, Any]]] = {}
+    for scan in scan_results:
+        partitions.setdefault(get_ui_provider(scan.get("provider")), []).append(scan)
+    return partitions
+
 def get_ui_model_name(db_name: str) -> str:
     for ui, db in MODEL_MAPPING.items():
         if db == db_name:
@@ -34,6 +45,7 @@ def normalize_url(u: str) -> str:
         return f"https://{u}"
     return u
 
+@lru_cache(maxsize=65536)
 def get_domain(url: str) -> str:
     url = normalize_url(url)
     parsed = urllib.parse.urlparse(url)
@@ -42,6 +54,19 @@ def get_domain(url: str) -> str:
         domain = domain[4:]
     return domain.lower()
 
+_HOST_RE = re.compile(r"\s*(?:https?://)?([^/?#]*?)\s*(?:[/?#]|$)")
+
+def get_domains(urls: List[str]) -> List[str]:
+    """Bulk get_domain: each distinct URL is matched once with a precompiled host pattern."""
+    codes, uniques = pd.factorize(pd.Series(urls, dtype=object))
+    domains = []
+    for url in uniques:
+        match = _HOST_RE.match(str(url))
+        host = match.group(1).lower() if match else ""
+        # Hosts the pattern can't see (e.g. "https:///path") go through the scalar parser
+        domains.append((host[4:] if host.startswith("www.") else host) if host else get_domain(url))
+    return np.array(domains + [""], dtype=object)[codes].tolist()
+
 def is_url_official(url: str, whitelist_domains: list) -> bool:
     if not url or not whitelist_domains:
         return False
@@ -59,5 +84,5 @@ def get_donut_chart(value, color="#00C896", size=80):
     value = float(value) if value else 0.0
     remaining = max(0, 100 - value)
     fig = go.Figure(data=[go.Pie(values=[value, remaining], hole=0.75, marker_colors=[color, "#F0F2F6"], textinfo="none", hoverinfo="label+percent")])
-    fig.update_layout(showlegend=False, margin=dict(t=0, b=0, l=0, r=0), height=size, width=size, annotations=[dict(text=f"{int(value)}%", x=0.5, y=0.5, font_size=14, showarrow=False, font_weight="bold", font_color="#333")])
+    fig.update_layout(showlegend=False, margin=dict(t=0, b=0, l=0, r=0), height=size, width=size, annotations=[dict(text=f"<b>{int(value)}%</b>", x=0.5, y=0.5, font_size=14, showarrow=False, font_color="#333")])
     return fig
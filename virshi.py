@@ -0,0 +1,131 @@
+"""
+Headless batch CLI over the data and dispatch layers (cron, workers)
+
+    python -m virshi batch scan    --projects ID [ID ...] [--models Perplexity "OpenAI GPT"] [--max-age-hours 168] [--budget 500]
+    python -m virshi batch metrics --projects ID [ID ...] [--workers 8 --executor process] [--output metrics.json]
+    python -m virshi batch export  --projects ID [ID ...] [--format parquet] [--out-dir exports]
+
+Credentials come from SUPABASE_URL / SUPABASE_KEY (or .streamlit/secrets.toml). Results are one JSON document.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+from config import MODEL_MAPPING
+from database import db, get_project, get_scan_results, DatabaseUnavailable
+from metrics import calculate_metrics
+from utils import partition_by_provider
+from export import export_scan_results
+from n8n.webhooks import scan_project, dispatcher
+from notify import CollectingNotifier
+
+# TASKS: one project each; module-level so a process pool can pickle them
+def batch_scan(project_id: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    notifier = CollectingNotifier()
+    result = scan_project(project_id, options["models"], max_age_hours=options["max_age_hours"], budget=options["budget"], notifier=notifier)
+    tickets = result.pop("tickets", {})
+    # All projects share this process's rate-limited dispatcher; wait for it before reporting delivery
+    if tickets and not dispatcher.drain(options["timeout"]):
+        result["timed_out"] = True
+    result["dispatch"] = {model: {"chunks": t.chunks, "sent": t.sent, "failed": t.failed} for model, t in tickets.items()}
+    result["ok"] = result.get("ok", False) and not result.get("timed_out") and all(not t.failed for t in tickets.values())
+    result["messages"] = notifier.as_list()
+    return result
+
+def batch_metrics(project_id: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    project = get_project(project_id)
+    if not project:
+        return {"ok": False, "skipped": "missing project"}
+    brand_name = project.get("brand_name", "")
+    rows = get_scan_results(project_id)
+    return {
+        "brand_name": brand_name,
+        "scans": len(rows),
+        "metrics": calculate_metrics(rows, brand_name),
+        "providers": {provider: calculate_metrics(part, brand_name) for provider, part in sorted(partition_by_provider(rows).items())}
+    }
+
+def batch_export(project_id: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    path = export_scan_results(project_id, options["format"])
+    if not path:
+        return {"ok": False, "skipped": "no scan results"}
+    os.makedirs(options["out_dir"], exist_ok=True)
+    target = os.path.join(options["out_dir"], f"scan_results_{project_id}.{options['format']}")
+    shutil.move(path, target)
+    return {"path": os.path.abspath(target), "bytes": os.path.getsize(target)}
+
+TASKS = {"scan": batch_scan, "metrics": batch_metrics, "export": batch_export}
+
+def _run_task(command: str, project_id: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        result = TASKS[command](project_id, options)
+    except Exception as e:
+        result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    return {"project_id": project_id, "ok": result.pop("ok", True), "elapsed_s": round(time.perf_counter() - started, 3), **result}
+
+def run_batch(command: str, project_ids: List[str], options: Dict[str, Any], workers: int = 4, executor: str = "thread") -> List[Dict[str, Any]]:
+    pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    with pool_class(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(_run_task, command, project_id, options): project_id for project_id in project_ids}
+        results = {futures[future]: future.result() for future in as_completed(futures)}
+    return [results[project_id] for project_id in project_ids]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="virshi", description="Virshi headless tools")
+    commands = parser.add_subparsers(dest="tool", required=True)
+    batch = commands.add_parser("batch", help="run a command for many projects in parallel")
+    batch.add_argument("command", choices=sorted(TASKS))
+    batch.add_argument("--projects", nargs="+", required=True, help="project ids (space or comma separated)")
+    batch.add_argument("--workers", type=int, default=4)
+    batch.add_argument("--executor", choices=["thread", "process"], default="thread")
+    batch.add_argument("--output", default="-", help="JSON file; '-' for stdout")
+    batch.add_argument("--models", nargs="+", default=["Perplexity"], choices=list(MODEL_MAPPING), help="scan: providers")
+    batch.add_argument("--max-age-hours", type=float, help="scan: rescan pairs older than this (default: per-model freshness)")
+    batch.add_argument("--budget", type=int, help="scan: max scans per project")
+    batch.add_argument("--timeout", type=float, default=3600, help="scan: seconds to wait for dispatch")
+    batch.add_argument("--format", choices=["csv", "parquet"], default="csv", help="export: file format")
+    batch.add_argument("--out-dir", default="exports", help="export: target directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "scan" and args.executor == "process":
+        # Provider rate limits are enforced per process; N processes would send N times the allowed rate
+        parser.error("scan uses the shared in-process dispatcher; run it with --executor thread")
+
+    try:
+        db.connect()
+    except DatabaseUnavailable as e:
+        print(f"Database connection failed: {e}", file=sys.stderr)
+        return 2
+
+    project_ids = list(dict.fromkeys(p.strip() for value in args.projects for p in value.split(",") if p.strip()))
+    options = {"models": args.models, "max_age_hours": args.max_age_hours, "budget": args.budget, "timeout": args.timeout,
+               "format": args.format, "out_dir": args.out_dir}
+
+    started_at = datetime.now(timezone.utc).isoformat()
+    results = run_batch(args.command, project_ids, options, args.workers, args.executor)
+    report = {
+        "command": args.command,
+        "started_at": started_at,
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "projects": len(results),
+        "succeeded": sum(1 for r in results if r["ok"]),
+        "results": results
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2, default=str)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    return 0 if report["succeeded"] == report["projects"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())